@@ -0,0 +1,127 @@
+# causas/acciones.py
+"""
+Acciones masivas sobre las causas seleccionadas en 'lista_causas': cambio de
+estado, reasignación del abogado encargado y registro de la misma etapa en
+todas ellas.
+
+Cada acción corre en una sola transacción con unas pocas sentencias por lote
+(UPDATE ... WHERE id IN (...) y bulk_create), sin pasar por Causa.save() ni por
+las señales de causas/signals.py. Por eso aquí se hace, por lote, lo que esas
+señales hacen para una causa: revisión, etapa actual, costas, índice de
+búsqueda, resumen para reportes, indicadores del dashboard y auditoría. Las
+causas se leen sólo como valores (lo que aportan al resumen), sin instanciarlas,
+y el resumen recibe un delta por fila afectada.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import auditoria, busqueda, reportes
+from .kpis import invalidar_kpis
+from .models import Cartera, Causa, EtapaCausa
+
+# Causas por sentencia, para no pasar el límite de parámetros de la base de datos
+LOTE = 500
+
+
+def _lotes(ids):
+    for inicio in range(0, len(ids), LOTE):
+        yield ids[inicio:inicio + LOTE]
+
+
+def _asignar(ids, campo, valor):
+    """
+    Asigna 'valor' al campo en las causas indicadas que lo tengan distinto y
+    devuelve cuántas cambiaron. Todas reciben el mismo valor, así que basta un
+    UPDATE por lote en lugar de bulk_update.
+    """
+    attname = Causa._meta.get_field(campo).attname
+    # El campo es parte de la porción, así que viene en la fila del resumen de cada causa
+    posicion = reportes.CAMPOS_FILA.index(attname)
+    with transaction.atomic():
+        antes = {}
+        for lote in _lotes(list(ids)):
+            antes.update((pk, aporte) for pk, aporte in reportes.leer_aportes(lote, bloquear=True).items()
+                         if aporte[0][posicion] != valor)
+        cambiadas = sorted(antes)
+        for pk in cambiadas:
+            auditoria.registrar(pk, {attname: (antes[pk][0][posicion], valor)})
+
+        # Como en importar_cartera: el UPDATE no aplica auto_now ni sube la revisión solo
+        ahora = timezone.now()
+        for lote in _lotes(cambiadas):
+            Causa.objects.filter(pk__in=lote).update(
+                **{attname: valor}, ultima_actualizacion=timezone.localdate(ahora), revision=F('revision') + 1,
+                fecha_modificacion=ahora,
+            )
+
+        # Cada causa pasa su aporte a la fila con el valor nuevo
+        despues = {}
+        for pk, (fila, costas) in antes.items():
+            fila = list(fila)
+            fila[posicion] = valor
+            despues[pk] = (tuple(fila), costas)
+        reportes.aplicar_diferencias(antes, despues)
+        if cambiadas and campo == 'estado_causa':
+            invalidar_kpis()
+        # El índice de búsqueda no guarda el estado ni el abogado: no hay que reindexar
+    return len(cambiadas)
+
+
+def cambiar_estado(ids, estado):
+    if estado not in Causa.EstadoCausa.values:
+        raise ValueError(f"Estado inválido: '{estado}'.")
+    return _asignar(ids, 'estado_causa', estado)
+
+
+def reasignar(ids, abogado_id):
+    """Cambia el abogado encargado (None lo deja sin asignar)."""
+    return _asignar(ids, 'abogado_encargado', abogado_id)
+
+
+def registrar_etapa(ids, etapa, fecha, descripcion='', costas=0):
+    """
+    Agrega al historial de cada causa un registro con la misma etapa, fecha,
+    descripción y costas. Devuelve cuántos registros se crearon.
+    """
+    with transaction.atomic():
+        antes = {}
+        for lote in _lotes(list(ids)):
+            antes.update(reportes.leer_aportes(lote, bloquear=True))
+        ids = sorted(antes)
+        ahora = timezone.now()
+        registros = EtapaCausa.objects.bulk_create(
+            [EtapaCausa(causa_id=causa_id, etapa=etapa, fecha=fecha, descripcion=descripcion, costas=costas)
+             for causa_id in ids],
+            batch_size=LOTE,
+        )
+
+        despues = {}
+        for inicio in range(0, len(ids), LOTE):
+            lote = ids[inicio:inicio + LOTE]
+            causas = Causa.objects.filter(pk__in=lote)
+            cambios = {'revision': F('revision') + 1, 'fecha_modificacion': ahora}
+            if costas:
+                cambios['total_costas'] = F('total_costas') + costas
+            causas.update(**cambios)
+            # El registro nuevo es el más reciente (el historial se ordena por -fecha, -id)
+            # salvo en las causas que ya tienen una etapa con fecha posterior
+            causas.filter(Q(fecha_ultima_etapa__isnull=True) | Q(fecha_ultima_etapa__lte=fecha)).update(
+                ultima_etapa=etapa, fecha_ultima_etapa=fecha,
+            )
+            despues.update(reportes.leer_aportes(lote))
+            busqueda.indexar_etapas([registro.pk for registro in registros[inicio:inicio + LOTE]])
+
+        # Las costas de cada cartera suben una vez por cada causa suya
+        if costas:
+            # (cartera_id es el primer campo de la fila)
+            for cartera_id, cantidad in Counter(fila[0] for fila, _ in antes.values()).items():
+                if cartera_id is not None:
+                    Cartera.objects.filter(pk=cartera_id).update(total_costas=F('total_costas') + costas * cantidad)
+
+        # Cambian la etapa actual y las costas de las causas afectadas
+        reportes.aplicar_diferencias(antes, despues)
+    return len(registros)
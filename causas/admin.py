@@ -1,22 +1,193 @@
 # causas/admin.py
 
 from django.contrib import admin
-from .models import (Tribunal, Deudor, Causa, 
+from django.db.models import Q
+
+from .models import (Tribunal, Deudor, Causa,
                      Cartera, ArchivoAdjunto, Comentario,
-                     AntecedentesLeasing, AntecedentesCBR, 
+                     AntecedentesLeasing, AntecedentesCBR,
                      TipoEtapa, Etapa, EtapaCausa)
 
 
-# Le decimos a Django que registre nuestros modelos en el sitio de administración.
-# Cada línea crea una sección para gestionar el modelo correspondiente.
-admin.site.register(Tribunal)
-admin.site.register(Deudor)
-admin.site.register(Causa)
-admin.site.register(Cartera)
-admin.site.register(ArchivoAdjunto)
-admin.site.register(Comentario)
-admin.site.register(AntecedentesLeasing)
-admin.site.register(AntecedentesCBR)
-admin.site.register(TipoEtapa)
-admin.site.register(Etapa)
-admin.site.register(EtapaCausa)
\ No newline at end of file
+# Pensado para carteras de cientos de miles de causas:
+# - los listados traen en el mismo JOIN lo que usa cada __str__ (list_select_related)
+#   y se ordenan por -id, sobre la clave primaria;
+# - no se cuenta la tabla completa en cada búsqueda (show_full_result_count);
+# - las claves foráneas a tablas grandes usan autocompletado en lugar de un <select>
+#   con todas las filas;
+# - la búsqueda es por prefijo del rol o del RUT, como un rango sobre su índice
+#   (rol >= 'C-12' AND rol < 'C-13'). Un __startswith sería LIKE 'C-12%' ESCAPE,
+#   que SQLite no resuelve con el índice, y un icontains recorrería la tabla entera.
+
+
+def _por_prefijo(modelo, campo, desde, hasta):
+    """
+    Filas cuyo 'campo' está en [desde, hasta). Un campo de otra tabla ('deudor__rut')
+    se resuelve con una subconsulta sobre la relación (deudor_id IN (...)), para
+    que cada condición de un OR use su propio índice.
+    """
+    relacion, _, resto = campo.partition('__')
+    if not resto:
+        return Q(**{f'{campo}__gte': desde, f'{campo}__lt': hasta})
+    relacionado = modelo._meta.get_field(relacion).related_model
+    return Q(**{f'{relacion}__in': relacionado.objects.filter(
+        _por_prefijo(relacionado, resto, desde, hasta)).values('pk')})
+
+
+class AdminEscalable(admin.ModelAdmin):
+    show_full_result_count = False
+    list_per_page = 50
+    ordering = ['-id']
+
+    def get_search_results(self, request, queryset, search_term):
+        # search_fields son campos de texto que se buscan por prefijo
+        termino = search_term.strip()
+        if not termino:
+            return queryset, False
+        condicion = Q()
+        # Los roles y el dígito verificador 'K' se guardan en mayúsculas
+        for prefijo in {termino, termino.upper()}:
+            siguiente = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+            for campo in self.get_search_fields(request):
+                condicion |= _por_prefijo(self.model, campo, prefijo, siguiente)
+        return queryset.filter(condicion), False
+
+
+# --- CATÁLOGOS ---
+# Tablas pequeñas; tienen search_fields para el autocompletado de las demás.
+
+@admin.register(TipoEtapa)
+class TipoEtapaAdmin(admin.ModelAdmin):
+    search_fields = ['nombre']
+
+
+@admin.register(Etapa)
+class EtapaAdmin(admin.ModelAdmin):
+    list_display = ['nombre', 'tipo_etapa']
+    list_filter = ['tipo_etapa']
+    # Etapa.__str__ usa el tipo de etapa
+    list_select_related = ['tipo_etapa']
+    search_fields = ['nombre']
+
+
+@admin.register(Cartera)
+class CarteraAdmin(admin.ModelAdmin):
+    list_display = ['nombre', 'total_costas']
+    search_fields = ['nombre']
+
+
+@admin.register(Tribunal)
+class TribunalAdmin(admin.ModelAdmin):
+    search_fields = ['nombre']
+
+
+# --- DEUDORES Y CAUSAS ---
+
+@admin.register(Deudor)
+class DeudorAdmin(AdminEscalable):
+    list_display = ['rut', 'nombres', 'apellidos', 'comuna']
+    search_fields = ['rut']
+    search_help_text = "RUT o su comienzo, sin puntos (p. ej. 12345678-9)."
+
+
+class EtapaCausaInline(admin.TabularInline):
+    model = EtapaCausa
+    fields = ['etapa', 'fecha', 'descripcion', 'costas']
+    extra = 0
+    ordering = ['-fecha', '-id']
+
+    def get_queryset(self, request):
+        # Cada fila muestra EtapaCausa.__str__, que usa la etapa y el rol de la causa
+        return super().get_queryset(request).select_related('etapa', 'causa')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        campo = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'etapa':
+            # Las opciones se arman una vez, con el tipo en el mismo JOIN; si no,
+            # cada fila del historial repetiría la consulta (y una más por opción)
+            campo.choices = [('', campo.empty_label),
+                             *((etapa.pk, str(etapa)) for etapa in Etapa.objects.select_related('tipo_etapa'))]
+        return campo
+
+
+class AntecedentesInline(admin.StackedInline):
+    extra = 0
+    max_num = 1
+
+    def get_queryset(self, request):
+        # El título del bloque es el __str__ de los antecedentes, que usa el rol de la causa
+        return super().get_queryset(request).select_related('causa')
+
+
+class AntecedentesLeasingInline(AntecedentesInline):
+    model = AntecedentesLeasing
+
+
+class AntecedentesCBRInline(AntecedentesInline):
+    model = AntecedentesCBR
+
+
+@admin.register(Causa)
+class CausaAdmin(AdminEscalable):
+    list_display = ['rol', 'deudor', 'estado_causa', 'cartera', 'tribunal', 'ultima_etapa', 'abogado_encargado',
+                    'fecha_modificacion']
+    list_select_related = ['deudor', 'cartera', 'tribunal', 'ultima_etapa__tipo_etapa', 'abogado_encargado']
+    # Filtros de pocas opciones; los tribunales y las etapas se buscan desde el listado de la aplicación
+    list_filter = ['estado_causa', 'cartera', 'abogado_encargado']
+    search_fields = ['rol', 'deudor__rut']
+    search_help_text = "Rol o RUT del deudor, o su comienzo (p. ej. C-1234 o 12345678)."
+    autocomplete_fields = ['deudor', 'tribunal', 'abogado_encargado']
+    readonly_fields = ['ultima_etapa', 'fecha_ultima_etapa', 'total_costas', 'fecha_ingreso', 'ultima_actualizacion',
+                       'fecha_modificacion', 'revision']
+    inlines = [EtapaCausaInline, AntecedentesLeasingInline, AntecedentesCBRInline]
+
+    def get_queryset(self, request):
+        # El formulario de edición también muestra la etapa actual con su tipo. Como el
+        # listado no aplica list_select_related a un queryset que ya tiene select_related,
+        # se repiten aquí sus relaciones.
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+
+# --- HISTORIAL Y REGISTROS ASOCIADOS ---
+
+@admin.register(EtapaCausa)
+class EtapaCausaAdmin(AdminEscalable):
+    list_display = ['causa', 'etapa', 'fecha', 'costas']
+    # EtapaCausa.__str__ usa la etapa y el rol de la causa
+    list_select_related = ['causa', 'etapa__tipo_etapa']
+    list_filter = ['etapa__tipo_etapa']
+    search_fields = ['causa__rol']
+    search_help_text = "Rol de la causa, o su comienzo."
+    autocomplete_fields = ['causa', 'etapa']
+
+
+@admin.register(ArchivoAdjunto)
+class ArchivoAdjuntoAdmin(AdminEscalable):
+    list_display = ['nombre_visible', 'etapa_causa', 'estado_extraccion', 'paginas']
+    list_select_related = ['etapa_causa__causa', 'etapa_causa__etapa']
+    list_filter = ['estado_extraccion']
+    search_fields = ['etapa_causa__causa__rol']
+    search_help_text = "Rol de la causa, o su comienzo."
+    raw_id_fields = ['etapa_causa']
+
+
+@admin.register(Comentario)
+class ComentarioAdmin(AdminEscalable):
+    list_display = ['causa', 'autor', 'fecha_creacion']
+    list_select_related = ['causa', 'autor']
+    search_fields = ['causa__rol']
+    search_help_text = "Rol de la causa, o su comienzo."
+    autocomplete_fields = ['causa', 'autor']
+
+
+class AntecedentesAdmin(AdminEscalable):
+    list_display = ['causa']
+    # El __str__ de los antecedentes usa el rol de la causa
+    list_select_related = ['causa']
+    search_fields = ['causa__rol']
+    autocomplete_fields = ['causa']
+    ordering = ['-causa']
+
+
+admin.site.register(AntecedentesLeasing, AntecedentesAdmin)
+admin.site.register(AntecedentesCBR, AntecedentesAdmin)
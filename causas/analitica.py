@@ -0,0 +1,218 @@
+# causas/analitica.py
+"""
+Análisis del historial de etapas: cuánto tiempo pasan las causas en cada
+etapa y tipo de etapa, cuántas cambian de etapa cada mes y qué tribunales
+son más lentos.
+
+El historial se carga de una vez en columnas (arrays de enteros, con las
+fechas como ordinales) ordenadas por causa y fecha. La duración de un registro
+es la diferencia con el registro siguiente de la misma causa; el último de cada
+causa es la etapa en curso. Con NumPy los cálculos son vectoriales sobre esas
+columnas; sin NumPy se hacen con la biblioteca estándar sobre los mismos arrays.
+Los resultados se guardan en caché por cartera.
+"""
+
+import datetime
+from array import array
+from collections import defaultdict, namedtuple
+from itertools import compress
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Etapa, EtapaCausa, TipoEtapa, Tribunal
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Filas leídas por cada ida a la base de datos al cargar el historial
+FILAS_POR_LECTURA = 20000
+
+# Ordinal del 1970-01-01, para convertir a datetime64 de NumPy
+_ORDINAL_EPOCA = datetime.date(1970, 1, 1).toordinal()
+
+Historial = namedtuple('Historial', 'causa etapa tipo tribunal fecha')
+
+
+def cargar_historial(cartera_id=None):
+    """
+    Carga el historial (de una cartera o completo) en columnas 'array' de enteros,
+    ordenadas por causa y fecha. Un tribunal vacío se guarda como 0.
+    """
+    registros = EtapaCausa.objects.order_by('causa_id', 'fecha', 'id')
+    if cartera_id is not None:
+        registros = registros.filter(causa__cartera_id=cartera_id)
+    filas = registros.values_list('causa_id', 'etapa_id', 'etapa__tipo_etapa_id', 'causa__tribunal_id', 'fecha')
+    historial = Historial(*(array('q') for _ in Historial._fields))
+    for causa, etapa, tipo, tribunal, fecha in filas.iterator(chunk_size=FILAS_POR_LECTURA):
+        historial.causa.append(causa)
+        historial.etapa.append(etapa)
+        historial.tipo.append(tipo)
+        historial.tribunal.append(tribunal or 0)
+        historial.fecha.append(fecha.toordinal())
+    return historial
+
+
+# --- CÁLCULO CON NUMPY ---
+
+def _grupos_numpy(claves, valores):
+    """Estadísticas de 'valores' agrupados por 'claves': {clave: (n, promedio, mediana, p90)}."""
+    orden = numpy.lexsort((valores, claves))
+    claves, valores = claves[orden], valores[orden]
+    unicas, inicios, cantidades = numpy.unique(claves, return_index=True, return_counts=True)
+    resultado = {}
+    for clave, inicio, cantidad in zip(unicas.tolist(), inicios.tolist(), cantidades.tolist()):
+        grupo = valores[inicio:inicio + cantidad]
+        mediana, p90 = numpy.percentile(grupo, [50, 90]).tolist()
+        resultado[clave] = (cantidad, float(grupo.mean()), mediana, p90)
+    return resultado
+
+
+def _calcular_numpy(historial):
+    causa, etapa, tipo, tribunal, fecha = (numpy.frombuffer(columna, dtype=numpy.int64) for columna in historial)
+    # misma[i]: el registro i+1 es de la misma causa que el i, así que cierra su etapa
+    misma = causa[1:] == causa[:-1]
+    duracion = (fecha[1:] - fecha[:-1])[misma]
+    ultimos = numpy.append(~misma, True)
+
+    entradas = fecha[1:][misma] - _ORDINAL_EPOCA
+    meses = entradas.astype('datetime64[D]').astype('datetime64[M]').astype(numpy.int64)
+    unicos, conteos = numpy.unique(meses, return_counts=True)
+    en_curso_etapa, en_curso_conteo = numpy.unique(etapa[ultimos], return_counts=True)
+
+    return {
+        'por_etapa': _grupos_numpy(etapa[:-1][misma], duracion),
+        'por_tipo': _grupos_numpy(tipo[:-1][misma], duracion),
+        'por_tribunal': _grupos_numpy(tribunal[:-1][misma], duracion),
+        'en_curso': dict(zip(en_curso_etapa.tolist(), en_curso_conteo.tolist())),
+        'por_mes': {1970 * 12 + mes: cantidad for mes, cantidad in zip(unicos.tolist(), conteos.tolist())},
+    }
+
+
+# --- CÁLCULO SIN NUMPY ---
+
+def _percentil(ordenados, porcentaje):
+    """Percentil con interpolación lineal, igual que numpy.percentile."""
+    posicion = (len(ordenados) - 1) * porcentaje / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicion - inferior)
+
+
+def _grupos_python(claves, valores):
+    grupos = defaultdict(list)
+    for clave, valor in zip(claves, valores):
+        grupos[clave].append(valor)
+    resultado = {}
+    for clave, grupo in sorted(grupos.items()):
+        grupo.sort()
+        resultado[clave] = (len(grupo), sum(grupo) / len(grupo), float(_percentil(grupo, 50)),
+                            float(_percentil(grupo, 90)))
+    return resultado
+
+
+def _calcular_python(historial):
+    causa, etapa, tipo, tribunal, fecha = historial
+    misma = [a == b for a, b in zip(causa, causa[1:])]
+    duracion = [b - a for a, b in compress(zip(fecha, fecha[1:]), misma)]
+    ultimos = [not m for m in misma] + [True] if len(causa) else []
+
+    por_mes = defaultdict(int)
+    for ordinal in compress(fecha[1:], misma):
+        dia = datetime.date.fromordinal(ordinal)
+        por_mes[dia.year * 12 + dia.month - 1] += 1
+    en_curso = defaultdict(int)
+    for clave in compress(etapa, ultimos):
+        en_curso[clave] += 1
+
+    return {
+        'por_etapa': _grupos_python(compress(etapa, misma), duracion),
+        'por_tipo': _grupos_python(compress(tipo, misma), duracion),
+        'por_tribunal': _grupos_python(compress(tribunal, misma), duracion),
+        'en_curso': dict(en_curso),
+        'por_mes': dict(sorted(por_mes.items())),
+    }
+
+
+def calcular(historial, usar_numpy=None):
+    """
+    Devuelve las estadísticas crudas por id: {'por_etapa', 'por_tipo', 'por_tribunal':
+    {id: (n, promedio, mediana, p90)}, 'en_curso': {etapa_id: n}, 'por_mes': {año*12+mes-1: n}}.
+    Las duraciones son en días y sólo cuentan las etapas ya terminadas.
+    """
+    if usar_numpy is None:
+        usar_numpy = numpy is not None
+    if usar_numpy and len(historial.causa):
+        return _calcular_numpy(historial)
+    return _calcular_python(historial)
+
+
+# --- RESULTADOS CON NOMBRES, EN CACHÉ ---
+
+def _filas(estadisticas, nombres, en_curso=None):
+    filas = []
+    for clave, (cantidad, promedio, mediana, p90) in estadisticas.items():
+        fila = {
+            'id': clave or None,
+            'nombre': nombres.get(clave, '(sin asignar)'),
+            'cantidad': cantidad,
+            'promedio': round(promedio, 1),
+            'mediana': round(mediana, 1),
+            'p90': round(p90, 1),
+        }
+        if en_curso is not None:
+            fila['en_curso'] = en_curso.get(clave, 0)
+        filas.append(fila)
+    return filas
+
+
+def analizar(cartera_id=None):
+    """Analiza el historial y arma las tablas del reporte, con nombres y ordenadas."""
+    historial = cargar_historial(cartera_id)
+    crudo = calcular(historial)
+
+    etapas = dict(Etapa.objects.values_list('id', 'nombre'))
+    por_etapa = _filas(crudo['por_etapa'], etapas, crudo['en_curso'])
+    # Las etapas donde hay causas pero ninguna ha salido todavía
+    for etapa_id, cantidad in crudo['en_curso'].items():
+        if etapa_id not in crudo['por_etapa']:
+            por_etapa.append({'id': etapa_id, 'nombre': etapas.get(etapa_id), 'cantidad': 0,
+                              'promedio': None, 'mediana': None, 'p90': None, 'en_curso': cantidad})
+    por_etapa.sort(key=lambda fila: fila['nombre'] or '')
+
+    return {
+        'registros': len(historial.causa),
+        'motor': 'numpy' if numpy is not None else 'python',
+        'por_etapa': por_etapa,
+        'por_tipo': sorted(_filas(crudo['por_tipo'], dict(TipoEtapa.objects.values_list('id', 'nombre'))),
+                           key=lambda fila: fila['nombre']),
+        # Los tribunales más lentos primero
+        'por_tribunal': sorted(_filas(crudo['por_tribunal'], dict(Tribunal.objects.values_list('id', 'nombre'))),
+                               key=lambda fila: (-fila['mediana'], -fila['cantidad'])),
+        'por_mes': [{'mes': f'{mes // 12}-{mes % 12 + 1:02d}', 'transiciones': cantidad}
+                    for mes, cantidad in crudo['por_mes'].items()],
+    }
+
+
+def _clave_cache(cartera_id):
+    return f"causas:analitica:{cartera_id if cartera_id is not None else 'todas'}"
+
+
+def obtener_analisis(cartera_id=None):
+    """
+    Devuelve el análisis desde la caché, calculándolo si no está. Se guarda por un
+    tiempo (CAUSAS_CACHE_ANALITICA_SEGUNDOS) en vez de invalidarse con cada
+    registro nuevo: son tendencias y recalcularlas con cada cambio no vale la pena.
+    """
+    clave = _clave_cache(cartera_id)
+    analisis = cache.get(clave)
+    if analisis is None:
+        analisis = analizar(cartera_id)
+        cache.set(clave, analisis, timeout=getattr(settings, 'CAUSAS_CACHE_ANALITICA_SEGUNDOS', 15 * 60))
+    return analisis
+
+
+def invalidar_analisis(cartera_id=None):
+    cache.delete(_clave_cache(cartera_id))
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CausasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'causas'
+
+    def ready(self):
+        # Registramos los receptores de señales de la app
+        from . import signals  # noqa: F401
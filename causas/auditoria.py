@@ -0,0 +1,130 @@
+# causas/auditoria.py
+"""
+Auditoría por campo de los cambios en las causas (modelo CambioCausa).
+
+Guardar una causa no agrega escrituras: Causa.diferencias() compara en memoria
+los valores leídos con los actuales, y los registros de cambio se encolan al
+confirmarse la transacción. La cola se vacía con un solo bulk_create cuando
+junta CAUSAS_AUDITORIA_LOTE registros, cuando el más antiguo lleva más de
+CAUSAS_AUDITORIA_ESPERA_MAXIMA segundos (se revisa al terminar cada petición,
+en AuditoriaMiddleware), al consultar la línea de tiempo y al cerrar el proceso.
+
+La cola vive en la memoria de cada proceso: si el proceso termina sin pasar por
+atexit (SIGKILL, el OOM killer o un worker que el servidor mata por tiempo), se
+pierden sin aviso los cambios encolados, hasta CAUSAS_AUDITORIA_LOTE registros
+de los últimos CAUSAS_AUDITORIA_ESPERA_MAXIMA segundos. Los cambios en sí ya
+están guardados; sólo falta su rastro. Con CAUSAS_AUDITORIA_LOTE = 1 cada cambio
+se escribe al confirmarse su transacción, sin esa ventana.
+"""
+
+import atexit
+import contextvars
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Causa, CambioCausa
+
+logger = logging.getLogger(__name__)
+
+# Petición en curso, para saber qué usuario hizo el cambio (ver AuditoriaMiddleware)
+peticion_actual = contextvars.ContextVar('peticion_actual', default=None)
+
+_cola = []
+_cola_desde = None
+_candado = threading.Lock()
+
+
+def tamano_lote():
+    return getattr(settings, 'CAUSAS_AUDITORIA_LOTE', 100)
+
+
+def espera_maxima():
+    return getattr(settings, 'CAUSAS_AUDITORIA_ESPERA_MAXIMA', 5)
+
+
+def _texto(valor):
+    if valor is None:
+        return None
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _usuario_id(peticion):
+    usuario = getattr(peticion, 'user', None)
+    return usuario.pk if usuario is not None and usuario.is_authenticated else None
+
+
+def registrar(causa_id, diferencias, usuario_id=None):
+    """
+    Registra las diferencias de una causa ({attname: (anterior, nuevo)}, como las
+    de Causa.diferencias()). Se encolan sólo si la transacción se confirma. Si no
+    se indica el usuario, se toma de la petición en curso.
+    """
+    if not diferencias:
+        return
+    fecha = timezone.now()
+    peticion = peticion_actual.get()
+    nombres = {campo.attname: campo.name for campo in Causa._meta.concrete_fields}
+    registros = [
+        CambioCausa(causa_id=causa_id, usuario_id=usuario_id, campo=nombres[campo], fecha=fecha,
+                    valor_anterior=_texto(anterior), valor_nuevo=_texto(nuevo))
+        for campo, (anterior, nuevo) in diferencias.items()
+    ]
+
+    def al_confirmar():
+        # El usuario se resuelve aquí para no consultar la sesión si la transacción se revierte
+        if usuario_id is None and peticion is not None:
+            usuario = _usuario_id(peticion)
+            for registro in registros:
+                registro.usuario_id = usuario
+        encolar(registros)
+
+    transaction.on_commit(al_confirmar)
+
+
+def encolar(registros):
+    global _cola_desde
+    with _candado:
+        if not _cola:
+            _cola_desde = time.monotonic()
+        _cola.extend(registros)
+        lleno = len(_cola) >= tamano_lote()
+    if lleno:
+        vaciar()
+
+
+def vaciar():
+    """Escribe todo lo encolado con un solo bulk_create. Devuelve cuántos registros escribió."""
+    global _cola, _cola_desde
+    with _candado:
+        lote, _cola, _cola_desde = _cola, [], None
+    if lote:
+        CambioCausa.objects.bulk_create(lote, batch_size=500)
+    return len(lote)
+
+
+def vaciar_si_corresponde():
+    """Vacía la cola si el registro más antiguo ya esperó demasiado."""
+    desde = _cola_desde
+    if desde is not None and time.monotonic() - desde >= espera_maxima():
+        vaciar()
+
+
+def pendientes():
+    return len(_cola)
+
+
+@atexit.register
+def _vaciar_al_salir():
+    cantidad = pendientes()
+    try:
+        vaciar()
+    except Exception:
+        # Al cerrar el intérprete la base de datos puede no estar disponible
+        logger.exception("No se pudieron guardar %s registros de auditoría", cantidad)
@@ -0,0 +1,244 @@
+# causas/busqueda.py
+"""
+Búsqueda de texto completo sobre causas, deudores, etapas, comentarios y el
+texto extraído de los adjuntos.
+
+En SQLite se usa una tabla virtual FTS5 ('causas_busqueda') con una fila por
+causa, por registro del historial, por comentario y por adjunto; las señales de
+causas/signals.py la mantienen al día y el comando 'reconstruir_busqueda' la
+rehace completa. En otros motores se recurre a 'icontains'.
+
+Las columnas causa_id, tipo y objeto_id son UNINDEXED: filtrar por ellas recorre
+la tabla virtual entera. Por eso cada fila lleva como rowid un valor derivado de
+su tipo y objeto (ver 'rowid'), y se borra o reemplaza buscándola por rowid.
+"""
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Causa, Comentario, EtapaCausa
+
+TABLA = 'causas_busqueda'
+
+# Marcadores que usa snippet() para delimitar las coincidencias. Son caracteres
+# de control para poder escapar el texto antes de convertirlos en <mark>.
+INICIO_MARCA, FIN_MARCA = '\x02', '\x03'
+
+# Código de cada tipo en el rowid: objeto_id * len(TIPOS) + TIPOS[tipo]
+TIPOS = {'causa': 0, 'etapa': 1, 'comentario': 2, 'adjunto': 3}
+
+
+def rowid(tipo, objeto_id):
+    """rowid de la fila del índice de un objeto."""
+    return objeto_id * len(TIPOS) + TIPOS[tipo]
+
+
+def _rowid_sql(tipo, columna):
+    return f"{columna} * {len(TIPOS)} + {TIPOS[tipo]}"
+
+
+# SQL para poblar el índice. Cada sentencia recibe una condición WHERE,
+# de modo que sirve tanto para reconstruir todo como para reindexar una fila.
+SQL_CAUSAS = f"""
+    INSERT INTO {TABLA} (rowid, causa_id, tipo, objeto_id, contenido)
+    SELECT {_rowid_sql('causa', 'c.id')}, c.id, 'causa', c.id,
+           c.rol || ' ' || c.operacion || ' ' || d.nombres || ' ' || d.apellidos || ' ' ||
+           d.rut || ' ' || COALESCE(t.nombre, '')
+    FROM causas_causa c
+    JOIN causas_deudor d ON d.id = c.deudor_id
+    LEFT JOIN causas_tribunal t ON t.id = c.tribunal_id
+    WHERE {{condicion}}
+"""
+SQL_ETAPAS = f"""
+    INSERT INTO {TABLA} (rowid, causa_id, tipo, objeto_id, contenido)
+    SELECT {_rowid_sql('etapa', 'r.id')}, r.causa_id, 'etapa', r.id, e.nombre || ' ' || r.descripcion
+    FROM causas_etapacausa r
+    JOIN causas_etapa e ON e.id = r.etapa_id
+    WHERE {{condicion}}
+"""
+SQL_COMENTARIOS = f"""
+    INSERT INTO {TABLA} (rowid, causa_id, tipo, objeto_id, contenido)
+    SELECT {_rowid_sql('comentario', 'm.id')}, m.causa_id, 'comentario', m.id, m.texto
+    FROM causas_comentario m
+    WHERE {{condicion}}
+"""
+SQL_ADJUNTOS = f"""
+    INSERT INTO {TABLA} (rowid, causa_id, tipo, objeto_id, contenido)
+    SELECT {_rowid_sql('adjunto', 'a.id')}, r.causa_id, 'adjunto', a.id, a.nombre_original || ' ' || a.texto_extraido
+    FROM causas_archivoadjunto a
+    JOIN causas_etapacausa r ON r.id = a.etapa_causa_id
+    WHERE {{condicion}}
+"""
+
+# Borra las filas del índice con los rowid indicados (una lista o una subconsulta)
+SQL_BORRAR = f"DELETE FROM {TABLA} WHERE rowid IN ({{rowids}})"
+
+_disponible = {}
+
+
+def poblar_indice(cursor):
+    cursor.execute(f"DELETE FROM {TABLA}")
+    for sql in (SQL_CAUSAS, SQL_ETAPAS, SQL_COMENTARIOS, SQL_ADJUNTOS):
+        cursor.execute(sql.format(condicion='1 = 1'))
+
+
+def fts_disponible():
+    """Indica si la base de datos actual tiene el índice FTS5 creado."""
+    if connection.vendor != 'sqlite':
+        return False
+    nombre = str(connection.settings_dict['NAME'])
+    if nombre not in _disponible:
+        _disponible[nombre] = TABLA in connection.introspection.table_names()
+    return _disponible[nombre]
+
+
+# --- MANTENCIÓN DEL ÍNDICE ---
+
+def _reindexar(rowids, parametros_rowids, sql, condicion, parametros):
+    """Borra por rowid las filas del índice que se van a regenerar y las vuelve a insertar."""
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_BORRAR.format(rowids=rowids), parametros_rowids)
+        cursor.execute(sql.format(condicion=condicion), parametros)
+
+
+def _indexar_varios(tipo, ids, sql, columna):
+    ids = list(ids)
+    if not ids or not fts_disponible():
+        return
+    marcadores = ', '.join(['%s'] * len(ids))
+    _reindexar(marcadores, [rowid(tipo, pk) for pk in ids], sql, f"{columna} IN ({marcadores})", ids)
+
+
+def indexar_causas(ids):
+    """Reindexa las causas indicadas (por ejemplo, tras una importación masiva)."""
+    _indexar_varios('causa', ids, SQL_CAUSAS, 'c.id')
+
+
+def indexar_causas_de_deudor(deudor_id):
+    if fts_disponible():
+        _reindexar(f"SELECT {_rowid_sql('causa', 'id')} FROM causas_causa WHERE deudor_id = %s", [deudor_id],
+                   SQL_CAUSAS, "c.deudor_id = %s", [deudor_id])
+
+
+def indexar_etapa(etapa_causa_id):
+    indexar_etapas([etapa_causa_id])
+
+
+def indexar_etapas(ids):
+    """Reindexa varios registros del historial (por ejemplo, tras una acción masiva)."""
+    _indexar_varios('etapa', ids, SQL_ETAPAS, 'r.id')
+
+
+def indexar_comentario(comentario_id):
+    _indexar_varios('comentario', [comentario_id], SQL_COMENTARIOS, 'm.id')
+
+
+def indexar_adjunto(adjunto_id):
+    _indexar_varios('adjunto', [adjunto_id], SQL_ADJUNTOS, 'a.id')
+
+
+def quitar(tipo, objeto_id):
+    """
+    Quita del índice una causa, una etapa, un comentario o un adjunto. Al borrar
+    una causa, su historial y sus comentarios se quitan con sus propias señales.
+    """
+    if not fts_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_BORRAR.format(rowids='%s'), [rowid(tipo, objeto_id)])
+
+
+def reconstruir_indice():
+    if not fts_disponible():
+        return False
+    with connection.cursor() as cursor:
+        poblar_indice(cursor)
+    return True
+
+
+# --- CONSULTA ---
+
+def _consulta_fts(texto):
+    """
+    Convierte lo que escribe el usuario en una consulta FTS5: cada palabra se
+    busca como prefijo, así "C-12" encuentra "C-1234-2024" y "1234567" un RUT.
+    """
+    terminos = [t.replace('"', '') for t in texto.split()]
+    return ' '.join(f'"{t}"*' for t in terminos if t)
+
+
+def _resaltar(fragmento):
+    fragmento = escape(fragmento)
+    return mark_safe(fragmento.replace(INICIO_MARCA, '<mark>').replace(FIN_MARCA, '</mark>'))
+
+
+def _fragmento_simple(contenido, texto, ancho=60):
+    """Arma un fragmento con la coincidencia resaltada, para el modo sin FTS5."""
+    posicion = contenido.lower().find(texto.lower())
+    if posicion < 0:
+        return _resaltar(contenido[:ancho * 2])
+    inicio = max(posicion - ancho, 0)
+    fin = posicion + len(texto)
+    fragmento = (
+        ('…' if inicio else '') + contenido[inicio:posicion]
+        + INICIO_MARCA + contenido[posicion:fin] + FIN_MARCA
+        + contenido[fin:fin + ancho] + ('…' if fin + ancho < len(contenido) else '')
+    )
+    return _resaltar(fragmento)
+
+
+def buscar(texto, limite=50):
+    """
+    Devuelve hasta 'limite' resultados ordenados por relevancia. Cada resultado
+    es un diccionario con 'causa_id', 'rol', 'tipo' y 'fragmento' (HTML seguro).
+    """
+    texto = (texto or '').strip()
+    if not texto:
+        return []
+    if fts_disponible():
+        return _buscar_fts(texto, limite)
+    return _buscar_icontains(texto, limite)
+
+
+def _buscar_fts(texto, limite):
+    consulta = _consulta_fts(texto)
+    if not consulta:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT b.causa_id, c.rol, b.tipo, "
+            f"snippet({TABLA}, 3, %s, %s, '…', 16) "
+            f"FROM {TABLA} b JOIN causas_causa c ON c.id = b.causa_id "
+            f"WHERE {TABLA} MATCH %s ORDER BY rank LIMIT %s",
+            [INICIO_MARCA, FIN_MARCA, consulta, limite],
+        )
+        filas = cursor.fetchall()
+    return [
+        {'causa_id': causa_id, 'rol': rol, 'tipo': tipo, 'fragmento': _resaltar(fragmento)}
+        for causa_id, rol, tipo, fragmento in filas
+    ]
+
+
+def _buscar_icontains(texto, limite):
+    resultados = []
+    causas = Causa.objects.select_related('deudor').filter(
+        Q(rol__icontains=texto) | Q(operacion__icontains=texto)
+        | Q(deudor__nombres__icontains=texto) | Q(deudor__apellidos__icontains=texto)
+        | Q(deudor__rut__icontains=texto)
+    ).order_by('-id')[:limite]
+    for causa in causas:
+        contenido = f"{causa.rol} {causa.deudor} {causa.deudor.rut}"
+        resultados.append({'causa_id': causa.pk, 'rol': causa.rol, 'tipo': 'causa',
+                           'fragmento': _fragmento_simple(contenido, texto)})
+    etapas = EtapaCausa.objects.select_related('causa').filter(descripcion__icontains=texto)[:limite]
+    for registro in etapas:
+        resultados.append({'causa_id': registro.causa_id, 'rol': registro.causa.rol, 'tipo': 'etapa',
+                           'fragmento': _fragmento_simple(registro.descripcion, texto)})
+    comentarios = Comentario.objects.select_related('causa').filter(texto__icontains=texto)[:limite]
+    for comentario in comentarios:
+        resultados.append({'causa_id': comentario.causa_id, 'rol': comentario.causa.rol, 'tipo': 'comentario',
+                           'fragmento': _fragmento_simple(comentario.texto, texto)})
+    return resultados[:limite]
+
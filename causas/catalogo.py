@@ -0,0 +1,38 @@
+# causas/catalogo.py
+"""
+Versión del catálogo de etapas. Sus nombres aparecen en el <select> del
+historial de detalle_causa y en la API, así que forman parte de los ETag y
+Last-Modified de esas respuestas (ver PETICIONES CONDICIONALES en views.py).
+
+La versión se guarda en caché, para que un 304 no tenga que consultar el
+catálogo, y las señales de TipoEtapa y Etapa la borran con cada cambio.
+"""
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .models import Etapa
+
+CLAVE_VERSION = 'causas:version_catalogo_etapas'
+
+# Acota lo que dura una versión si algún cambio no pasa por las señales
+SEGUNDOS_VERSION = 60 * 60
+
+
+def calcular_version():
+    """(cantidad de etapas, última modificación de una etapa o de su tipo)."""
+    version = Etapa.objects.aggregate(cantidad=Count('id'), etapa=Max('fecha_modificacion'),
+                                      tipo=Max('tipo_etapa__fecha_modificacion'))
+    return version['cantidad'], max(filter(None, [version['etapa'], version['tipo']]), default=None)
+
+
+def version_catalogo():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        version = calcular_version()
+        cache.set(CLAVE_VERSION, version, timeout=SEGUNDOS_VERSION)
+    return version
+
+
+def invalidar_version():
+    cache.delete(CLAVE_VERSION)
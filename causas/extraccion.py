@@ -0,0 +1,148 @@
+# causas/extraccion.py
+"""
+Extracción de texto y número de páginas de los adjuntos PDF y DOCX.
+
+La extracción corre en un pool de procesos, fuera del ciclo de la petición:
+al subir un adjunto se encola su extracción cuando la transacción se confirma,
+y el resultado se guarda en la misma fila de ArchivoAdjunto. El comando
+'extraer_texto_adjuntos' procesa en paralelo los adjuntos pendientes.
+
+Los PDF requieren 'pypdf'; los DOCX se leen con la biblioteca estándar.
+"""
+
+import logging
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Límite de caracteres guardados por adjunto, para no inflar la base de datos
+MAXIMO_CARACTERES = 1_000_000
+
+_NS_WORD = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+class FormatoNoSoportado(Exception):
+    pass
+
+
+def _extraer_pdf(ruta):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise FormatoNoSoportado("Para leer PDF hay que instalar 'pypdf'.")
+    lector = PdfReader(ruta)
+    paginas = [pagina.extract_text() or '' for pagina in lector.pages]
+    return '\n'.join(paginas), len(lector.pages)
+
+
+def _extraer_docx(ruta):
+    with zipfile.ZipFile(ruta) as docx:
+        documento = ElementTree.fromstring(docx.read('word/document.xml'))
+        parrafos = []
+        for parrafo in documento.iter(_NS_WORD + 'p'):
+            parrafos.append(''.join(nodo.text or '' for nodo in parrafo.iter(_NS_WORD + 't')))
+        # Word guarda el número de páginas de la última vez que se abrió
+        paginas = None
+        if 'docProps/app.xml' in docx.namelist():
+            encontrado = re.search(rb'<Pages>(\d+)</Pages>', docx.read('docProps/app.xml'))
+            if encontrado:
+                paginas = int(encontrado.group(1))
+    return '\n'.join(parrafos), paginas
+
+
+EXTRACTORES = {
+    '.pdf': _extraer_pdf,
+    '.docx': _extraer_docx,
+}
+
+
+def extraer(ruta):
+    """
+    Devuelve (texto, páginas) de un archivo. Se ejecuta en los procesos del
+    pool, así que no toca la base de datos.
+    """
+    extractor = EXTRACTORES.get(os.path.splitext(ruta)[1].lower())
+    if extractor is None:
+        raise FormatoNoSoportado(f"No se extrae texto de '{os.path.basename(ruta)}'.")
+    texto, paginas = extractor(ruta)
+    return texto[:MAXIMO_CARACTERES], paginas
+
+
+def guardar_resultado(nombre_archivo, texto=None, paginas=None, estado=None, error=''):
+    """
+    Guarda el resultado en todas las filas que comparten el archivo (los adjuntos
+    se deduplican por contenido) y actualiza el índice de búsqueda.
+    """
+    from . import busqueda
+    from .models import ArchivoAdjunto
+
+    filas = ArchivoAdjunto.objects.filter(archivo=nombre_archivo)
+    filas.update(texto_extraido=texto or '', paginas=paginas, estado_extraccion=estado, error_extraccion=error[:255])
+    for adjunto_id in filas.values_list('id', flat=True):
+        busqueda.indexar_adjunto(adjunto_id)
+
+
+def procesar(nombre_archivo, ejecutar=extraer):
+    """Extrae (con 'ejecutar') y guarda el resultado de un archivo, capturando los errores."""
+    from .models import ArchivoAdjunto
+
+    ruta = ArchivoAdjunto._meta.get_field('archivo').storage.path(nombre_archivo)
+    try:
+        texto, paginas = ejecutar(ruta)
+    except FormatoNoSoportado as error:
+        guardar_resultado(nombre_archivo, estado=ArchivoAdjunto.EstadoExtraccion.NO_SOPORTADO, error=str(error))
+    except Exception as error:
+        logger.exception("Error al extraer el texto de %s", nombre_archivo)
+        guardar_resultado(nombre_archivo, estado=ArchivoAdjunto.EstadoExtraccion.ERROR, error=str(error))
+    else:
+        guardar_resultado(nombre_archivo, texto, paginas, ArchivoAdjunto.EstadoExtraccion.LISTO)
+
+
+# --- EXTRACCIÓN EN SEGUNDO PLANO ---
+
+_pool = None
+
+
+def _obtener_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=getattr(settings, 'CAUSAS_PROCESOS_EXTRACCION', 2))
+    return _pool
+
+
+def _al_terminar(nombre_archivo, futuro):
+    # Corre en un hilo del proceso web: abre y cierra su propia conexión
+    close_old_connections()
+    try:
+        procesar(nombre_archivo, ejecutar=lambda ruta: futuro.result())
+    finally:
+        close_old_connections()
+
+
+def programar_extraccion(adjunto):
+    """
+    Encola la extracción de un adjunto recién subido. Si otro adjunto con el mismo
+    contenido ya fue procesado, copia su resultado sin volver a extraer.
+    """
+    from .models import ArchivoAdjunto
+
+    nombre = adjunto.archivo.name
+    procesado = (ArchivoAdjunto.objects.filter(archivo=nombre)
+                 .exclude(estado_extraccion=ArchivoAdjunto.EstadoExtraccion.PENDIENTE)
+                 .exclude(pk=adjunto.pk).first())
+    if procesado is not None:
+        guardar_resultado(nombre, procesado.texto_extraido, procesado.paginas,
+                          procesado.estado_extraccion, procesado.error_extraccion)
+        return
+    if not getattr(settings, 'CAUSAS_EXTRAER_EN_SEGUNDO_PLANO', True):
+        return
+    ruta = adjunto.archivo.storage.path(nombre)
+    futuro = _obtener_pool().submit(extraer, ruta)
+    futuro.add_done_callback(lambda f: _al_terminar(nombre, f))
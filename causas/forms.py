@@ -1,6 +1,6 @@
 # causas/forms.py
 from django import forms
-from .models import ArchivoAdjunto, Comentario, EtapaCausa 
+from .models import ArchivoAdjunto, Comentario, Etapa, EtapaCausa 
 
 class ArchivoAdjuntoForm(forms.ModelForm):
     class Meta:
@@ -31,4 +31,10 @@ class EtapaCausaForm(forms.ModelForm):
             'fecha': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'descripcion': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Añade una descripción...'}),
             'costas': forms.NumberInput(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Etapa.__str__ usa el tipo de etapa: lo traemos en la misma consulta
+        # para no hacer una consulta extra por cada opción del <select>.
+        self.fields['etapa'].queryset = Etapa.objects.select_related('tipo_etapa')
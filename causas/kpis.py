@@ -0,0 +1,36 @@
+# causas/kpis.py
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Causa
+
+# Clave de caché donde guardamos la "foto" de los indicadores del dashboard
+CLAVE_KPIS = 'causas:kpis_dashboard'
+
+
+def calcular_kpis():
+    """
+    Calcula el total de causas y el conteo por estado en una sola consulta,
+    usando agregados condicionales en lugar de un COUNT por estado.
+    """
+    conteos = {
+        estado.value: Count('id', filter=Q(estado_causa=estado.value))
+        for estado in Causa.EstadoCausa
+    }
+    return Causa.objects.aggregate(total=Count('id'), **conteos)
+
+
+def obtener_kpis():
+    """Devuelve los indicadores desde la caché, calculándolos sólo si no están."""
+    kpis = cache.get(CLAVE_KPIS)
+    if kpis is None:
+        kpis = calcular_kpis()
+        # Las señales de Causa la invalidan; el plazo sólo acota una foto que se les escape
+        cache.set(CLAVE_KPIS, kpis, timeout=getattr(settings, 'CAUSAS_CACHE_KPIS_SEGUNDOS', 5 * 60))
+    return kpis
+
+
+def invalidar_kpis():
+    cache.delete(CLAVE_KPIS)
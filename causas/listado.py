@@ -0,0 +1,121 @@
+# causas/listado.py
+"""
+Filtros del listado de causas y su exportación a CSV o XLSX. Los usan el
+listado HTML, el endpoint JSON de DataTables, la descarga directa y la tarea
+de exportación en segundo plano (causas/tareas.py).
+"""
+
+import csv
+
+from django.utils import timezone
+
+from .models import Causa
+
+# Columnas del archivo exportado: (encabezado, campo de values_list)
+COLUMNAS_EXPORTACION = [
+    ('Rol', 'rol'),
+    ('Operación', 'operacion'),
+    ('Estado', 'estado_causa'),
+    ('Cartera', 'cartera__nombre'),
+    ('RUT Deudor', 'deudor__rut'),
+    ('Nombres Deudor', 'deudor__nombres'),
+    ('Apellidos Deudor', 'deudor__apellidos'),
+    ('Tribunal', 'tribunal__nombre'),
+    ('Etapa Actual', 'ultima_etapa__nombre'),
+    ('Fecha Etapa Actual', 'fecha_ultima_etapa'),
+    ('Abogado Encargado', 'abogado_encargado__username'),
+    ('Total Costas', 'total_costas'),
+]
+
+
+class FormatoNoDisponible(Exception):
+    pass
+
+
+def filtrar_causas(parametros):
+    """
+    Aplica los filtros 'estado', 'cartera_id' y 'etapa_id' (de request.GET o de
+    un diccionario con las mismas claves) sobre las causas.
+    """
+    estado_filtro = parametros.get('estado', None)
+    cartera_filtro_id = parametros.get('cartera_id', None)
+    etapa_filtro_id = parametros.get('etapa_id', None)
+
+    # Un id que no es un número (?cartera_id=x) no corresponde a ninguna fila: el
+    # listado queda vacío en lugar de fallar al convertirlo en la consulta
+    for valor in (cartera_filtro_id, etapa_filtro_id):
+        if valor and not str(valor).isdigit():
+            return Causa.objects.none()
+
+    listado = Causa.objects.all()
+    if estado_filtro:
+        listado = listado.filter(estado_causa=estado_filtro)
+    if cartera_filtro_id:
+        listado = listado.filter(cartera__id=cartera_filtro_id)
+    if etapa_filtro_id:
+        listado = listado.filter(ultima_etapa_id=etapa_filtro_id)
+    return listado
+
+
+def pagina_causas(listado, orden, inicio, largo):
+    """
+    Las filas [inicio, inicio + largo) del listado en el orden pedido, con lo que
+    muestra cada una. La etapa actual está desnormalizada en la causa, así que
+    viene en el mismo JOIN.
+    """
+    return listado.select_related('deudor', 'tribunal', 'ultima_etapa').order_by(*orden)[inicio:inicio + largo]
+
+
+def nombre_exportacion():
+    return f"causas_{timezone.localdate():%Y%m%d}"
+
+
+class _Eco:
+    """Pseudo-archivo que devuelve lo que se le escribe, para usar csv.writer en streaming."""
+    def write(self, valor):
+        return valor
+
+
+def filas_exportacion(listado):
+    """
+    Recorre el listado por bloques con .iterator(), trayendo sólo las columnas
+    necesarias (con sus relaciones en el mismo JOIN), para que la memoria no
+    dependa del tamaño de la exportación.
+    """
+    estados = dict(Causa.EstadoCausa.choices)
+    campos = [campo for _, campo in COLUMNAS_EXPORTACION]
+    posicion_estado = campos.index('estado_causa')
+    for fila in listado.order_by('-id').values_list(*campos).iterator(chunk_size=2000):
+        fila = list(fila)
+        fila[posicion_estado] = estados.get(fila[posicion_estado], fila[posicion_estado])
+        yield fila
+
+
+def lineas_csv(listado, al_avanzar=None):
+    """
+    Genera el CSV línea por línea. Si se indica, llama a al_avanzar(filas) cada
+    1000 filas, para informar el progreso.
+    """
+    escritor = csv.writer(_Eco())
+    # BOM para que Excel reconozca el archivo como UTF-8
+    yield '\ufeff' + escritor.writerow([encabezado for encabezado, _ in COLUMNAS_EXPORTACION])
+    for numero, fila in enumerate(filas_exportacion(listado), start=1):
+        yield escritor.writerow(fila)
+        if al_avanzar and numero % 1000 == 0:
+            al_avanzar(numero)
+
+
+def escribir_xlsx(archivo, listado):
+    """Escribe el listado como libro Excel en 'archivo' (abierto en modo binario)."""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise FormatoNoDisponible("La exportación a Excel requiere 'openpyxl'.")
+    # El modo write_only escribe fila por fila en un archivo temporal,
+    # sin armar la hoja completa en memoria.
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Causas')
+    hoja.append([encabezado for encabezado, _ in COLUMNAS_EXPORTACION])
+    for fila in filas_exportacion(listado):
+        hoja.append(fila)
+    libro.save(archivo)
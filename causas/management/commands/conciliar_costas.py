@@ -0,0 +1,72 @@
+# causas/management/commands/conciliar_costas.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from causas.models import Cartera, Causa, EtapaCausa
+from causas.reportes import reconstruir_resumen
+
+
+def _suma_etapas():
+    suma = (EtapaCausa.objects.filter(causa=OuterRef('pk')).order_by()
+            .values('causa').annotate(suma=Sum('costas')).values('suma'))
+    return Coalesce(Subquery(suma), 0, output_field=DecimalField())
+
+
+def _suma_causas():
+    suma = (Causa.objects.filter(cartera=OuterRef('pk')).order_by()
+            .values('cartera').annotate(suma=Sum('total_costas')).values('suma'))
+    return Coalesce(Subquery(suma), 0, output_field=DecimalField())
+
+
+class Command(BaseCommand):
+    help = ("Compara las costas acumuladas de causas y carteras con la suma de su historial "
+            "y, con --reparar, corrige las diferencias.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true', help="Corrige los totales que no cuadran")
+        parser.add_argument('--lote', type=int, default=5000, help="Causas revisadas por consulta (por defecto 5000)")
+
+    def handle(self, *args, **options):
+        lote = max(options['lote'], 1)
+        descuadradas = 0
+        # Recorremos por rangos de id para no bloquear la tabla completa
+        desde = 0
+        ultimo_id = Causa.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        while desde < ultimo_id:
+            hasta = desde + lote
+            with transaction.atomic():
+                rango = Causa.objects.filter(id__gt=desde, id__lte=hasta)
+                diferencias = list(
+                    rango.annotate(suma=_suma_etapas()).exclude(total_costas=F('suma'))
+                    .values_list('id', 'rol', 'total_costas', 'suma')
+                )
+                for causa_id, rol, total, suma in diferencias:
+                    self.stdout.write(f"Causa {rol}: acumulado {total}, historial {suma}")
+                if diferencias and options['reparar']:
+                    rango.filter(id__in=[fila[0] for fila in diferencias]).update(total_costas=_suma_etapas())
+            descuadradas += len(diferencias)
+            desde = hasta
+
+        # Las carteras son pocas: se revisan en una sola consulta
+        carteras = list(Cartera.objects.annotate(suma=_suma_causas()).values_list('id', 'nombre', 'total_costas', 'suma'))
+        carteras = [fila for fila in carteras if fila[2] != fila[3]]
+        for cartera_id, nombre, total, suma in carteras:
+            self.stdout.write(f"Cartera {nombre}: acumulado {total}, causas {suma}")
+        if carteras and options['reparar']:
+            Cartera.objects.filter(id__in=[fila[0] for fila in carteras]).update(total_costas=_suma_causas())
+
+        if (descuadradas or carteras) and options['reparar']:
+            # Las costas del resumen salen de las causas: lo rehacemos con los totales corregidos
+            reconstruir_resumen()
+
+        if not descuadradas and not carteras:
+            self.stdout.write(self.style.SUCCESS("Las costas acumuladas cuadran con el historial."))
+        elif options['reparar']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Corregidas {descuadradas} causas y {len(carteras)} carteras."))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{descuadradas} causas y {len(carteras)} carteras no cuadran. Use --reparar para corregirlas."))
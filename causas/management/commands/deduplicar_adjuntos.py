@@ -0,0 +1,33 @@
+# causas/management/commands/deduplicar_adjuntos.py
+
+import os
+
+from django.core.management.base import BaseCommand
+
+from causas.models import ArchivoAdjunto
+
+
+class Command(BaseCommand):
+    help = ("Mueve los adjuntos subidos antes del almacenamiento por contenido a su archivo "
+            "deduplicado (por hash SHA-256) y borra las copias que queden sin uso.")
+
+    def handle(self, *args, **options):
+        almacenamiento = ArchivoAdjunto._meta.get_field('archivo').storage
+        movidos = faltantes = 0
+        # Los nombres ya deduplicados tienen la forma 'adjuntos_causas/ab/cd/<hash>.ext'
+        antiguos = ArchivoAdjunto.objects.exclude(archivo__regex=r'/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}')
+        for adjunto in antiguos.only('id', 'archivo', 'nombre_original').iterator(chunk_size=500):
+            anterior = adjunto.archivo.name
+            if not almacenamiento.exists(anterior):
+                faltantes += 1
+                self.stderr.write(f"Adjunto {adjunto.pk}: no existe '{anterior}'.")
+                continue
+            with almacenamiento.open(anterior) as contenido:
+                nuevo = almacenamiento.save(anterior, contenido)
+            ArchivoAdjunto.objects.filter(pk=adjunto.pk).update(
+                archivo=nuevo, nombre_original=adjunto.nombre_original or os.path.basename(anterior),
+            )
+            # La fila ya cuenta como referencia del archivo nuevo; la del antiguo se descuenta
+            almacenamiento.liberar(anterior)
+            movidos += 1
+        self.stdout.write(self.style.SUCCESS(f"{movidos} adjuntos deduplicados, {faltantes} sin archivo en disco."))
@@ -0,0 +1,44 @@
+# causas/management/commands/extraer_texto_adjuntos.py
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from causas.extraccion import extraer, procesar
+from causas.models import ArchivoAdjunto
+
+
+class Command(BaseCommand):
+    help = "Extrae en paralelo el texto y el número de páginas de los adjuntos pendientes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=None,
+                            help="Procesos en paralelo (por defecto, uno por CPU)")
+        parser.add_argument('--reintentar', action='store_true',
+                            help="Vuelve a procesar también los adjuntos con error o formato no soportado")
+
+    def handle(self, *args, **options):
+        Estado = ArchivoAdjunto.EstadoExtraccion
+        estados = [Estado.PENDIENTE]
+        if options['reintentar']:
+            estados += [Estado.ERROR, Estado.NO_SOPORTADO]
+        # Los adjuntos comparten archivo: se extrae una vez por contenido
+        nombres = list(ArchivoAdjunto.objects.filter(estado_extraccion__in=estados)
+                       .order_by().values_list('archivo', flat=True).distinct())
+        if not nombres:
+            self.stdout.write("No hay adjuntos pendientes.")
+            return
+
+        almacenamiento = ArchivoAdjunto._meta.get_field('archivo').storage
+        with ProcessPoolExecutor(max_workers=options['procesos']) as pool:
+            futuros = {pool.submit(extraer, almacenamiento.path(nombre)): nombre for nombre in nombres}
+            for hechos, futuro in enumerate(as_completed(futuros), start=1):
+                # Los procesos sólo leen archivos; los resultados se guardan desde aquí
+                procesar(futuros[futuro], ejecutar=lambda ruta: futuro.result())
+                if hechos % 100 == 0 or hechos == len(futuros):
+                    self.stdout.write(f"{hechos}/{len(futuros)} archivos procesados")
+
+        resumen = ArchivoAdjunto.objects.filter(archivo__in=nombres).values_list('estado_extraccion', flat=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo: {sum(1 for e in resumen if e == Estado.LISTO)} adjuntos con texto extraído."
+        ))
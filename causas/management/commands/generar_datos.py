@@ -0,0 +1,222 @@
+# causas/management/commands/generar_datos.py
+
+import datetime
+import random
+import time
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from causas import busqueda
+from causas.kpis import invalidar_kpis
+from causas.models import (ArchivoAdjunto, Cartera, Causa, Comentario, Deudor, Etapa, EtapaCausa, TipoEtapa,
+                           Tribunal)
+from causas.reportes import reconstruir_resumen
+from causas.storage import almacenamiento_adjuntos
+
+# Historial típico de un juicio ejecutivo: (tipo de etapa, etapas en orden)
+ETAPAS_TIPICAS = [
+    ('Discusión', ['Demanda', 'Notificación', 'Excepciones', 'Contestación']),
+    ('Prueba', ['Término Probatorio', 'Audiencia de Prueba']),
+    ('Sentencia', ['Sentencia', 'Apelación']),
+    ('Apremio', ['Embargo', 'Tasación', 'Remate', 'Liquidación']),
+]
+
+# Proporción aproximada de cada estado en una cartera real
+PESOS_ESTADOS = {
+    Causa.EstadoCausa.ACTIVO: 60,
+    Causa.EstadoCausa.SUSPENDIDO: 15,
+    Causa.EstadoCausa.ARCHIVADO: 15,
+    Causa.EstadoCausa.RECUPERADO: 10,
+}
+
+NOMBRES = ['María', 'José', 'Juan', 'Ana', 'Luis', 'Carmen', 'Pedro', 'Rosa', 'Jorge', 'Patricia', 'Carlos',
+           'Claudia', 'Francisco', 'Paula', 'Manuel', 'Camila']
+APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez',
+             'Sepúlveda', 'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres']
+COMUNAS = ['Santiago', 'Providencia', 'Maipú', 'Puente Alto', 'La Florida', 'Valparaíso', 'Concepción',
+           'Temuco', 'Rancagua', 'Antofagasta']
+
+
+def _digito_verificador(numero):
+    suma, factor = 0, 2
+    for digito in reversed(str(numero)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    resto = 11 - suma % 11
+    return {11: '0', 10: 'K'}.get(resto, str(resto))
+
+
+class Command(BaseCommand):
+    help = ("Llena la base de datos con una cartera sintética realista (causas, deudores, historial, "
+            "comentarios y adjuntos) usando inserciones masivas, para medir el rendimiento a escala. "
+            "Las causas generadas llevan el prefijo de --prefijo en el rol.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--causas', type=int, default=1000, help="Causas a generar (por defecto 1000)")
+        parser.add_argument('--etapas', type=float, default=10,
+                            help="Registros de historial por causa, en promedio (por defecto 10)")
+        parser.add_argument('--comentarios', type=float, default=3,
+                            help="Comentarios por causa, en promedio (por defecto 3)")
+        parser.add_argument('--adjuntos', type=float, default=0.5,
+                            help="Adjuntos por registro del historial, en promedio (por defecto 0,5)")
+        parser.add_argument('--carteras', type=int, default=5, help="Carteras (por defecto 5)")
+        parser.add_argument('--tribunales', type=int, default=40, help="Tribunales (por defecto 40)")
+        parser.add_argument('--abogados', type=int, default=10, help="Abogados (por defecto 10)")
+        parser.add_argument('--lote', type=int, default=2000, help="Causas por transacción (por defecto 2000)")
+        parser.add_argument('--semilla', type=int, default=None, help="Semilla, para repetir la misma cartera")
+        parser.add_argument('--prefijo', default='SINT', help="Prefijo del rol de las causas (por defecto SINT)")
+
+    def handle(self, *args, **options):
+        self.azar = random.Random(options['semilla'])
+        prefijo = options['prefijo']
+        inicio = time.perf_counter()
+
+        self.etapas = self._etapas()
+        carteras = self._crear(Cartera, [f"Cartera {prefijo} {n + 1}" for n in range(options['carteras'])])
+        tribunales = self._crear(Tribunal,
+                                 [f"{n + 1}º Juzgado Civil {prefijo}" for n in range(options['tribunales'])])
+        abogados = self._abogados(prefijo, options['abogados'])
+        self.archivo = almacenamiento_adjuntos.save(
+            'adjuntos_causas/sintetico.pdf', ContentFile(b'%PDF-1.4\n% Documento sintetico\n%%EOF\n'),
+        )
+
+        # Continuamos la numeración si ya se generaron causas con este prefijo; los
+        # RUT sintéticos parten después de los deudores existentes
+        desde = Causa.objects.filter(rol__startswith=f"{prefijo}-").count()
+        self.base_rut = 50_000_000 + Deudor.objects.count() - desde
+        total = max(options['causas'], 0)
+        lote = max(options['lote'], 1)
+        costas_por_cartera = defaultdict(int)
+        contadores = defaultdict(int)
+        for numero in range(desde, desde + total, lote):
+            cantidad = min(lote, desde + total - numero)
+            with transaction.atomic():
+                self._generar_lote(numero, cantidad, prefijo, options, carteras, tribunales, abogados,
+                                   costas_por_cartera, contadores)
+            self.stdout.write(f"{numero - desde + cantidad}/{total} causas...")
+
+        # Sólo las filas creadas mantienen el archivo sintético (se borra si no hubo ninguna)
+        almacenamiento_adjuntos.liberar(self.archivo)
+
+        # Los totales derivados se calcularon al generar; lo que queda se rehace de una vez
+        for cartera_id, costas in costas_por_cartera.items():
+            Cartera.objects.filter(pk=cartera_id).update(total_costas=F('total_costas') + costas)
+        self.stdout.write("Reconstruyendo el resumen de reportes y el índice de búsqueda...")
+        reconstruir_resumen()
+        busqueda.reconstruir_indice()
+        invalidar_kpis()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generadas {total} causas, {contadores['etapas']} registros de historial, "
+            f"{contadores['comentarios']} comentarios y {contadores['adjuntos']} adjuntos "
+            f"en {time.perf_counter() - inicio:.1f} s."
+        ))
+
+    def _etapas(self):
+        etapas = list(Etapa.objects.order_by('id'))
+        if len(etapas) >= 4:
+            return etapas
+        for nombre_tipo, nombres in ETAPAS_TIPICAS:
+            tipo, _ = TipoEtapa.objects.get_or_create(nombre=nombre_tipo)
+            for nombre in nombres:
+                Etapa.objects.get_or_create(nombre=nombre, defaults={'tipo_etapa': tipo})
+        return list(Etapa.objects.order_by('id'))
+
+    def _crear(self, modelo, nombres):
+        modelo.objects.bulk_create([modelo(nombre=nombre) for nombre in nombres], ignore_conflicts=True)
+        return list(modelo.objects.filter(nombre__in=nombres).values_list('id', flat=True))
+
+    def _abogados(self, prefijo, cantidad):
+        usuarios = get_user_model()
+        nombres = [f"{prefijo.lower()}-abogado-{n + 1}" for n in range(max(cantidad, 1))]
+        existentes = set(usuarios.objects.filter(username__in=nombres).values_list('username', flat=True))
+        usuarios.objects.bulk_create([usuarios(username=nombre, password=make_password(None))
+                                      for nombre in nombres if nombre not in existentes])
+        return list(usuarios.objects.filter(username__in=nombres).values_list('id', flat=True))
+
+    def _cantidad(self, promedio):
+        """Una cantidad al azar con el promedio indicado (uniforme entre 0 y el doble)."""
+        valor = self.azar.uniform(0, 2 * promedio)
+        # Redondeo al azar, para respetar también los promedios menores que 0,5
+        return int(valor) + (self.azar.random() < valor - int(valor))
+
+    def _generar_lote(self, numero, cantidad, prefijo, options, carteras, tribunales, abogados,
+                      costas_por_cartera, contadores):
+        azar = self.azar
+        estados, pesos = list(PESOS_ESTADOS), list(PESOS_ESTADOS.values())
+        hoy = datetime.date.today()
+
+        deudores = Deudor.objects.bulk_create([
+            Deudor(
+                nombres=f"{azar.choice(NOMBRES)} {azar.choice(NOMBRES)}",
+                apellidos=f"{azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}",
+                rut=f"{self.base_rut + n}-{_digito_verificador(self.base_rut + n)}",
+                comuna=azar.choice(COMUNAS),
+            )
+            for n in range(numero, numero + cantidad)
+        ])
+
+        # El historial se arma en memoria antes de insertar las causas, para
+        # guardarlas ya con su etapa actual y sus costas (los campos derivados)
+        causas, historiales = [], []
+        for n, deudor in zip(range(numero, numero + cantidad), deudores):
+            asignacion = hoy - datetime.timedelta(days=azar.randint(30, 5 * 365))
+            causa = Causa(
+                deudor=deudor, rol=f"{prefijo}-C-{n + 1}-{asignacion.year}",
+                operacion=str(azar.randint(10**9, 10**10 - 1)),
+                tribunal_id=azar.choice(tribunales), cartera_id=azar.choice(carteras),
+                abogado_encargado_id=azar.choice(abogados),
+                estado_causa=azar.choices(estados, pesos)[0], fecha_asignacion=asignacion,
+            )
+            historial, fecha = [], asignacion
+            for paso in range(self._cantidad(options['etapas'])):
+                fecha = min(fecha + datetime.timedelta(days=azar.randint(1, 60)), hoy)
+                historial.append(EtapaCausa(
+                    etapa=self.etapas[paso] if paso < len(self.etapas) else azar.choice(self.etapas),
+                    fecha=fecha, descripcion=f"Resolución {paso + 1}",
+                    costas=azar.choice([0, 0, 0, 15000, 25000, 50000, 120000]),
+                ))
+            if historial:
+                causa.ultima_etapa = historial[-1].etapa
+                causa.fecha_ultima_etapa = historial[-1].fecha
+                causa.total_costas = sum(registro.costas for registro in historial)
+                costas_por_cartera[causa.cartera_id] += causa.total_costas
+            causas.append(causa)
+            historiales.append(historial)
+        Causa.objects.bulk_create(causas)
+
+        registros = []
+        for causa, historial in zip(causas, historiales):
+            for registro in historial:
+                registro.causa = causa
+                registros.append(registro)
+        EtapaCausa.objects.bulk_create(registros, batch_size=5000)
+
+        adjuntos = [
+            ArchivoAdjunto(etapa_causa=registro, archivo=self.archivo, nombre_original=f"escrito_{registro.pk}.pdf",
+                           estado_extraccion=ArchivoAdjunto.EstadoExtraccion.LISTO, paginas=1,
+                           texto_extraido=registro.descripcion)
+            for registro in registros
+            for _ in range(self._cantidad(options['adjuntos']))
+        ]
+        ArchivoAdjunto.objects.bulk_create(adjuntos, batch_size=5000)
+        # bulk_create no pasa por el almacenamiento: las referencias se cuentan aquí
+        almacenamiento_adjuntos.sumar_referencias(self.archivo, len(adjuntos))
+
+        comentarios = [
+            Comentario(causa=causa, autor_id=causa.abogado_encargado_id,
+                       texto=f"Revisar {azar.choice(['notificación', 'embargo', 'plazos', 'liquidación'])}.")
+            for causa in causas
+            for _ in range(self._cantidad(options['comentarios']))
+        ]
+        Comentario.objects.bulk_create(comentarios, batch_size=5000)
+
+        contadores['etapas'] += len(registros)
+        contadores['adjuntos'] += len(adjuntos)
+        contadores['comentarios'] += len(comentarios)
@@ -0,0 +1,236 @@
+# causas/management/commands/importar_cartera.py
+
+import csv
+import datetime
+import time
+from collections import defaultdict
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from causas import auditoria, busqueda, reportes
+from causas.kpis import invalidar_kpis
+from causas.models import Cartera, Causa, Deudor, Tribunal
+
+# Columnas que se leen del archivo. Sólo 'rut' y 'rol' son obligatorias.
+CAMPOS_DEUDOR = ['nombres', 'apellidos', 'direccion', 'comuna']
+# 'total_costas' no se importa: se calcula desde el historial de etapas.
+CAMPOS_CAUSA = ['operacion', 'estado_causa', 'demandante', 'arbitro', 'fecha_asignacion']
+
+
+def _leer_csv(ruta):
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        # Detectamos si el separador es coma o punto y coma (Excel en español)
+        muestra = archivo.read(4096)
+        archivo.seek(0)
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;')
+        for fila in csv.DictReader(archivo, dialect=dialecto):
+            yield fila
+
+
+def _leer_xlsx(ruta):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise CommandError("Para importar archivos .xlsx hay que instalar 'openpyxl'.")
+    # read_only recorre la hoja en streaming sin cargarla completa en memoria
+    libro = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezados = [str(celda).strip() if celda is not None else '' for celda in next(filas, [])]
+        for valores in filas:
+            yield dict(zip(encabezados, valores))
+    finally:
+        libro.close()
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    return str(valor).strip()
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime.datetime):
+        return valor.date()
+    if isinstance(valor, datetime.date):
+        return valor
+    texto = _texto(valor)
+    if not texto:
+        return None
+    for formato in ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y'):
+        try:
+            return datetime.datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"fecha inválida '{texto}'")
+
+
+class Command(BaseCommand):
+    help = ("Importa una cartera desde un archivo CSV o XLSX, creando o actualizando deudores (por RUT), "
+            "causas (por rol) y tribunales en lotes.")
+
+    # Si se asigna (lo hace la tarea 'importar_cartera'), se llama con las filas procesadas tras cada lote
+    al_avanzar = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo .csv o .xlsx")
+        parser.add_argument('--cartera', help="Nombre de la cartera a la que se asignan las causas (se crea si no existe)")
+        parser.add_argument('--lote', type=int, default=1000, help="Filas por transacción (por defecto 1000)")
+        parser.add_argument('--reanudar', action='store_true',
+                            help="Continúa desde el último lote confirmado, según el archivo de control")
+
+    def handle(self, *args, **options):
+        ruta = Path(options['archivo'])
+        if not ruta.exists():
+            raise CommandError(f"No existe el archivo '{ruta}'.")
+        if ruta.suffix.lower() == '.xlsx':
+            filas = _leer_xlsx(ruta)
+        elif ruta.suffix.lower() == '.csv':
+            filas = _leer_csv(ruta)
+        else:
+            raise CommandError("Sólo se aceptan archivos .csv o .xlsx.")
+
+        self.cartera = None
+        if options['cartera']:
+            self.cartera, _ = Cartera.objects.get_or_create(nombre=options['cartera'])
+        self.tribunales = dict(Tribunal.objects.values_list('nombre', 'id'))
+        self.errores = 0
+
+        # El archivo de control guarda cuántas filas ya quedaron confirmadas
+        control = ruta.with_name(ruta.name + '.checkpoint')
+        procesadas = 0
+        if options['reanudar'] and control.exists():
+            procesadas = int(control.read_text() or 0)
+            self.stdout.write(f"Reanudando desde la fila {procesadas + 1}.")
+            filas = islice(filas, procesadas, None)
+
+        inicio = time.monotonic()
+        lote_size = max(options['lote'], 1)
+        while True:
+            lote = list(islice(filas, lote_size))
+            if not lote:
+                break
+            with transaction.atomic():
+                self.importar_lote(lote, primera_fila=procesadas + 2)
+            procesadas += len(lote)
+            control.write_text(str(procesadas))
+            if self.al_avanzar:
+                self.al_avanzar(procesadas)
+            segundos = time.monotonic() - inicio
+            self.stdout.write(f"{procesadas} filas procesadas ({procesadas / max(segundos, 1e-6):.0f} filas/s)")
+
+        # Las operaciones masivas no disparan señales: invalidamos a mano
+        invalidar_kpis()
+        control.unlink(missing_ok=True)
+        mensaje = f"Importación terminada: {procesadas} filas en {time.monotonic() - inicio:.1f} s."
+        if self.errores:
+            mensaje += f" {self.errores} filas con errores fueron omitidas."
+        self.stdout.write(self.style.SUCCESS(mensaje))
+
+    def importar_lote(self, lote, primera_fila):
+        # 1. Validamos y normalizamos. Si un RUT o rol se repite en el lote, gana la última fila.
+        deudores, causas = {}, {}
+        for numero, fila in enumerate(lote, start=primera_fila):
+            fila = {(clave or '').strip().lower(): valor for clave, valor in fila.items()}
+            try:
+                rut, rol = _texto(fila.get('rut')), _texto(fila.get('rol'))
+                if not rut or not rol:
+                    raise ValueError("faltan 'rut' o 'rol'")
+                estado = _texto(fila.get('estado_causa')).upper() or Causa.EstadoCausa.ACTIVO
+                if estado not in Causa.EstadoCausa.values:
+                    raise ValueError(f"estado inválido '{estado}'")
+                causas[rol] = {
+                    'rut': rut,
+                    'tribunal': _texto(fila.get('tribunal')),
+                    'operacion': _texto(fila.get('operacion')),
+                    'estado_causa': estado,
+                    'demandante': _texto(fila.get('demandante')),
+                    'arbitro': _texto(fila.get('arbitro')),
+                    'fecha_asignacion': _fecha(fila.get('fecha_asignacion')),
+                }
+                deudores[rut] = {campo: _texto(fila.get(campo)) for campo in CAMPOS_DEUDOR}
+            except ValueError as error:
+                self.errores += 1
+                self.stderr.write(f"Fila {numero}: {error}")
+
+        # 2. Tribunales nuevos, en un solo INSERT
+        nuevos = {datos['tribunal'] for datos in causas.values()} - set(self.tribunales) - {''}
+        if nuevos:
+            Tribunal.objects.bulk_create([Tribunal(nombre=nombre) for nombre in nuevos], ignore_conflicts=True)
+            self.tribunales.update(Tribunal.objects.filter(nombre__in=nuevos).values_list('nombre', 'id'))
+
+        # 3. Deudores: actualizamos los existentes y creamos el resto
+        existentes_deudores = {deudor.rut: deudor for deudor in Deudor.objects.filter(rut__in=deudores)}
+        por_crear, por_actualizar = [], []
+        for rut, datos in deudores.items():
+            deudor = existentes_deudores.get(rut)
+            if deudor is None:
+                por_crear.append(Deudor(rut=rut, **datos))
+            else:
+                for campo, valor in datos.items():
+                    setattr(deudor, campo, valor)
+                por_actualizar.append(deudor)
+        Deudor.objects.bulk_create(por_crear)
+        Deudor.objects.bulk_update(por_actualizar, CAMPOS_DEUDOR)
+        ids_deudores = dict(Deudor.objects.filter(rut__in=deudores).values_list('rut', 'id'))
+
+        # 4. Causas, igual que los deudores
+        existentes = {causa.rol: causa for causa in Causa.objects.filter(rol__in=causas)}
+        ahora = timezone.now()
+        hoy = timezone.localdate(ahora)
+        por_crear, por_actualizar = [], []
+        for rol, datos in causas.items():
+            valores = {campo: datos[campo] for campo in CAMPOS_CAUSA}
+            valores['deudor_id'] = ids_deudores[datos['rut']]
+            valores['tribunal_id'] = self.tribunales.get(datos['tribunal'])
+            if self.cartera:
+                valores['cartera_id'] = self.cartera.pk
+            causa = existentes.get(rol)
+            if causa is None:
+                por_crear.append(Causa(rol=rol, **valores))
+            else:
+                for campo, valor in valores.items():
+                    setattr(causa, campo, valor)
+                auditoria.registrar(causa.pk, causa.diferencias())
+                # bulk_update no aplica auto_now ni pasa por Causa.save()
+                causa.ultima_actualizacion = hoy
+                causa.revision = F('revision') + 1
+                causa.fecha_modificacion = ahora
+                por_actualizar.append(causa)
+        Causa.objects.bulk_create(por_crear)
+        if self.cartera:
+            self.mover_costas(por_actualizar)
+        campos = CAMPOS_CAUSA + ['deudor', 'tribunal', 'ultima_actualizacion', 'revision', 'fecha_modificacion'] + (['cartera'] if self.cartera else [])
+        Causa.objects.bulk_update(por_actualizar, campos)
+
+        # 5. Índice de búsqueda: las causas del lote y las de los deudores modificados
+        ids_lote = list(Causa.objects.filter(rol__in=causas).values_list('id', flat=True))
+        busqueda.indexar_causas(Causa.objects.filter(
+            Q(id__in=ids_lote) | Q(deudor__rut__in=existentes_deudores)
+        ).values_list('id', flat=True))
+
+        # 6. Resumen para reportes: las porciones que dejan las causas actualizadas y las nuevas
+        for causa in existentes.values():
+            reportes.marcar_porcion(causa.porcion_guardada)
+        reportes.marcar_causas(ids_lote)
+
+    def mover_costas(self, causas):
+        """
+        bulk_update no pasa por Causa.save(), que lleva las costas de una causa a
+        su nueva cartera: aquí se hace lo mismo, con un delta por cartera de origen.
+        """
+        salientes = defaultdict(int)
+        for causa in causas:
+            anterior = causa.porcion_guardada[0] if causa.porcion_guardada else None
+            if anterior != self.cartera.pk and causa.total_costas:
+                salientes[anterior] += causa.total_costas
+        for cartera_id, costas in salientes.items():
+            Cartera.objects.filter(pk=cartera_id).update(total_costas=F('total_costas') - costas)
+        if salientes:
+            Cartera.objects.filter(pk=self.cartera.pk).update(
+                total_costas=F('total_costas') + sum(salientes.values()))
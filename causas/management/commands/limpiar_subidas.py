@@ -0,0 +1,26 @@
+# causas/management/commands/limpiar_subidas.py
+
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from causas.models import SubidaParcial
+from causas.subidas import descartar
+
+
+class Command(BaseCommand):
+    help = "Elimina las subidas por partes abandonadas y sus archivos temporales."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=48,
+                            help="Antigüedad de la última parte recibida (por defecto 48 horas)")
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - datetime.timedelta(hours=options['horas'])
+        abandonadas = SubidaParcial.objects.filter(actualizada__lt=limite)
+        total = 0
+        for subida in abandonadas.iterator():
+            descartar(subida)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f"{total} subidas abandonadas eliminadas."))
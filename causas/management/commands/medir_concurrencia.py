@@ -0,0 +1,129 @@
+# causas/management/commands/medir_concurrencia.py
+
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection, connections, transaction
+
+
+def _quitar_ajustes():
+    # La configuración anterior de SQLite: sin WAL ni espera ampliada, una conexión por petición
+    configuracion = connections['default'].settings_dict
+    configuracion['OPTIONS'] = {}
+    configuracion['CONN_MAX_AGE'] = 0
+
+
+def _preparar_proceso(sin_ajustes):
+    # Con 'spawn' o 'forkserver' el proceso hijo arranca sin Django configurado
+    django.setup()
+    if sin_ajustes:
+        _quitar_ajustes()
+
+
+def _escribir(causa_id, usuario_id, cantidad):
+    """
+    Corre en cada proceso: 'cantidad' transacciones que agregan un comentario
+    (con sus señales: índice de búsqueda y revisión de la causa). Cada una se
+    trata como una petición, abriendo y cerrando la conexión según CONN_MAX_AGE.
+    """
+    from causas.models import Comentario
+
+    latencias, errores = [], 0
+    for numero in range(cantidad):
+        inicio = time.perf_counter()
+        close_old_connections()
+        try:
+            with transaction.atomic():
+                Comentario.objects.create(causa_id=causa_id, autor_id=usuario_id, texto=f"Medición {numero}")
+        except OperationalError as error:
+            # Sólo se cuentan los bloqueos ("database is locked" en SQLite, "lock timeout"
+            # en PostgreSQL); cualquier otro error es un problema de la medición
+            if 'lock' not in str(error).lower():
+                raise
+            errores += 1
+        finally:
+            close_old_connections()
+        latencias.append(time.perf_counter() - inicio)
+    connections.close_all()
+    return latencias, errores
+
+
+class Command(BaseCommand):
+    help = ("Mide escrituras concurrentes contra la base de datos del perfil activo (CAUSAS_BASE_DATOS): "
+            "muchos procesos agregan comentarios a la vez y se informa el rendimiento, las latencias y los "
+            "errores por bloqueo. Los datos de la medición se borran al terminar; conviene apuntar a una copia "
+            "de la base (CAUSAS_SQLITE_ARCHIVO o CAUSAS_PG_NOMBRE).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=8, help="Escritores en paralelo (por defecto 8)")
+        parser.add_argument('--escrituras', type=int, default=200,
+                            help="Transacciones por proceso (por defecto 200)")
+        parser.add_argument('--sin-ajustes', action='store_true',
+                            help="Sólo SQLite: repite la medición con la configuración anterior (sin WAL, "
+                                 "espera de 5 s y una conexión por petición), para comparar")
+
+    def handle(self, *args, **options):
+        from django.contrib.auth.models import User
+
+        from causas.models import Causa, Deudor
+
+        procesos = max(options['procesos'], 1)
+        escrituras = max(options['escrituras'], 2)
+        sin_ajustes = options['sin_ajustes'] and connection.vendor == 'sqlite'
+        if sin_ajustes:
+            _quitar_ajustes()
+            connection.close()
+            # El modo WAL queda guardado en el archivo: hay que volver al diario clásico
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=DELETE')
+
+        # Una causa por proceso, para que compitan por la tabla y no por la misma fila
+        marca = f"MEDICION-{os.getpid()}"
+        usuario = User.objects.create_user(marca.lower())
+        deudor = Deudor.objects.create(nombres='Medición', apellidos='Concurrencia', rut=marca)
+        causas = Causa.objects.bulk_create([
+            Causa(deudor=deudor, rol=f"{marca}-{numero}", estado_causa=Causa.EstadoCausa.ACTIVO)
+            for numero in range(procesos)
+        ])
+        # Los procesos hijos no deben heredar las conexiones abiertas del padre
+        connections.close_all()
+
+        try:
+            inicio = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=procesos, initializer=_preparar_proceso,
+                                     initargs=(sin_ajustes,)) as pool:
+                resultados = list(pool.map(
+                    _escribir, [causa.pk for causa in causas], [usuario.pk] * procesos,
+                    [escrituras] * procesos,
+                ))
+            duracion = time.perf_counter() - inicio
+        finally:
+            Causa.objects.filter(pk__in=[causa.pk for causa in causas]).delete()
+            deudor.delete()
+            usuario.delete()
+
+        latencias = sorted(latencia for parcial, _ in resultados for latencia in parcial)
+        errores = sum(cantidad for _, cantidad in resultados)
+        percentiles = statistics.quantiles(latencias, n=100, method='inclusive')
+
+        configuracion = connection.settings_dict
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                detalle = f"journal_mode={cursor.fetchone()[0]}"
+        else:
+            detalle = f"pool={configuracion['OPTIONS'].get('pool', False)}"
+        perfil = 'sqlite sin ajustes' if sin_ajustes else settings.PERFIL_BASE_DATOS
+        self.stdout.write(f"Perfil: {perfil} ({connection.vendor}, {detalle}, "
+                          f"CONN_MAX_AGE={configuracion['CONN_MAX_AGE']})")
+        self.stdout.write(f"{procesos} procesos x {escrituras} escrituras = {len(latencias)} "
+                          f"en {duracion:.2f} s ({(len(latencias) - errores) / duracion:.0f} confirmadas/s)")
+        self.stdout.write(f"Latencia: p50 {percentiles[49] * 1000:.1f} ms, p95 {percentiles[94] * 1000:.1f} ms, "
+                          f"p99 {percentiles[98] * 1000:.1f} ms, máxima {latencias[-1] * 1000:.1f} ms")
+        estilo = self.style.ERROR if errores else self.style.SUCCESS
+        self.stdout.write(estilo(f"Errores por bloqueo: {errores}"))
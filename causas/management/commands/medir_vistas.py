@@ -0,0 +1,140 @@
+# causas/management/commands/medir_vistas.py
+
+import json
+import os
+import re
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from causas import auditoria
+from causas.models import CambioCausa, Causa
+
+ESCENARIOS = ['dashboard', 'lista_causas', 'lista_causas_datos', 'detalle_causa', 'crear_causa', 'editar_causa']
+
+# Consultas de la petición, según la cabecera Server-Timing de MetricasMiddleware
+CONSULTAS = re.compile(r'desc="(\d+) consultas"')
+
+
+class Command(BaseCommand):
+    help = ("Mide las vistas principales con el cliente de pruebas de Django sobre la base de datos actual "
+            "(conviene llenarla antes con 'generar_datos'): latencias p50/p95/p99 y consultas por petición. "
+            "Con --guardar deja los resultados como línea base; si no, falla cuando un escenario supera "
+            "la línea base guardada o cuando no hay línea base.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=30, help="Peticiones medidas por escenario (30)")
+        parser.add_argument('--calentamiento', type=int, default=3,
+                            help="Peticiones previas sin medir, por escenario (3)")
+        parser.add_argument('--escenarios', nargs='+', choices=ESCENARIOS, default=ESCENARIOS)
+        parser.add_argument('--en-frio', action='store_true',
+                            help="Vacía la caché antes de cada petición (indicadores y pestañas de detalle)")
+        parser.add_argument('--linea-base', default=str(Path(settings.BASE_DIR) / 'linea_base_vistas.json'),
+                            help="Archivo JSON con la línea base (por defecto linea_base_vistas.json)")
+        parser.add_argument('--guardar', action='store_true', help="Guarda los resultados como nueva línea base")
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help="Aumento del p95 aceptado sobre la línea base (0.25 = 25%%)")
+
+    def handle(self, *args, **options):
+        causas = list(Causa.objects.order_by('?').values_list('id', 'deudor_id', 'tribunal_id', 'cartera_id')[:100])
+        if not causas:
+            raise CommandError("No hay causas que medir: genere una cartera con 'python manage.py generar_datos'.")
+
+        marca = f"MEDICION-{os.getpid()}"
+        usuario = get_user_model().objects.create_superuser(marca.lower(), password=None)
+        _, deudor_id, tribunal_id, cartera_id = causas[0]
+        editable = Causa.objects.create(rol=f"{marca}-E", deudor_id=deudor_id, tribunal_id=tribunal_id,
+                                        cartera_id=cartera_id, estado_causa=Causa.EstadoCausa.ACTIVO)
+        cliente = Client()
+        cliente.force_login(usuario)
+
+        def formulario(numero, **valores):
+            return {'rol': f"{marca}-{numero}", 'operacion': str(numero), 'estado_causa': Causa.EstadoCausa.ACTIVO,
+                    'deudor': deudor_id, 'tribunal': tribunal_id or '', 'cartera': cartera_id or '', **valores}
+
+        peticiones = {
+            'dashboard': lambda n: cliente.get(reverse('dashboard')),
+            'lista_causas': lambda n: cliente.get(reverse('lista_causas')),
+            'lista_causas_datos': lambda n: cliente.get(reverse('lista_causas_datos'), {
+                'draw': n, 'start': (n * 25) % 1000, 'length': 25, 'order[0][column]': 1, 'order[0][dir]': 'asc',
+            }),
+            'detalle_causa': lambda n: cliente.get(reverse('detalle_causa', args=[causas[n % len(causas)][0]])),
+            'crear_causa': lambda n: cliente.post(reverse('crear_causa'), formulario(n)),
+            'editar_causa': lambda n: cliente.post(reverse('editar_causa', args=[editable.pk]),
+                                                   formulario(n, rol=editable.rol, update_causa='')),
+        }
+
+        resultados = {}
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], CAUSAS_SERVER_TIMING=True):
+                for escenario in options['escenarios']:
+                    resultados[escenario] = self._medir(escenario, peticiones[escenario], options)
+        finally:
+            # La auditoría de las ediciones se escribe antes de borrar lo creado por la medición
+            auditoria.vaciar()
+            creadas = list(Causa.objects.filter(rol__startswith=f"{marca}-").values_list('id', flat=True))
+            CambioCausa.objects.filter(causa_id__in=creadas).delete()
+            Causa.objects.filter(pk__in=creadas).delete()
+            usuario.delete()
+
+        self.stdout.write(f"{'Escenario':<20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'máx ms':>8} {'consultas':>10}")
+        for escenario, datos in resultados.items():
+            self.stdout.write(f"{escenario:<20} {datos['p50']:>8.1f} {datos['p95']:>8.1f} {datos['p99']:>8.1f} "
+                              f"{datos['max']:>8.1f} {datos['consultas']:>10}")
+
+        total_causas = Causa.objects.count()
+        ruta = Path(options['linea_base'])
+        if options['guardar']:
+            ruta.write_text(json.dumps({'causas': total_causas, 'escenarios': resultados}, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Línea base guardada en {ruta}."))
+            return
+        if not ruta.exists():
+            # Sin línea base no hay con qué comparar: que la verificación no pase en silencio
+            raise CommandError(f"No hay línea base en {ruta}: use --guardar para crearla.")
+        self._comparar(json.loads(ruta.read_text()), resultados, total_causas, options['tolerancia'])
+
+    def _medir(self, escenario, peticion, options):
+        latencias, consultas = [], []
+        for numero in range(options['calentamiento'] + max(options['repeticiones'], 2)):
+            if options['en_frio']:
+                cache.clear()
+            inicio = time.perf_counter()
+            respuesta = peticion(numero)
+            duracion = time.perf_counter() - inicio
+            if respuesta.status_code >= 400:
+                raise CommandError(f"'{escenario}' respondió {respuesta.status_code}.")
+            if numero < options['calentamiento']:
+                continue
+            latencias.append(duracion * 1000)
+            encontrado = CONSULTAS.search(respuesta.get('Server-Timing', ''))
+            consultas.append(int(encontrado.group(1)) if encontrado else 0)
+        percentiles = statistics.quantiles(latencias, n=100, method='inclusive')
+        return {
+            'p50': round(percentiles[49], 2), 'p95': round(percentiles[94], 2), 'p99': round(percentiles[98], 2),
+            'max': round(max(latencias), 2), 'consultas': max(consultas),
+        }
+
+    def _comparar(self, linea_base, resultados, total_causas, tolerancia):
+        if linea_base.get('causas') != total_causas:
+            self.stdout.write(self.style.WARNING(
+                f"La línea base se midió con {linea_base.get('causas')} causas y ahora hay {total_causas}."
+            ))
+        regresiones = []
+        for escenario, datos in resultados.items():
+            base = linea_base['escenarios'].get(escenario)
+            if base is None:
+                continue
+            if datos['consultas'] > base['consultas']:
+                regresiones.append(f"{escenario}: {datos['consultas']} consultas (línea base {base['consultas']})")
+            if datos['p95'] > base['p95'] * (1 + tolerancia):
+                regresiones.append(f"{escenario}: p95 {datos['p95']:.1f} ms (línea base {base['p95']:.1f} ms)")
+        if regresiones:
+            raise CommandError("Regresiones respecto de la línea base:\n  " + "\n  ".join(regresiones))
+        self.stdout.write(self.style.SUCCESS("Sin regresiones respecto de la línea base."))
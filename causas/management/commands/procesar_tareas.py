@@ -0,0 +1,90 @@
+# causas/management/commands/procesar_tareas.py
+
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _preparar_proceso():
+    # Con 'spawn' o 'forkserver' el proceso hijo arranca sin Django configurado
+    django.setup()
+
+
+def _ejecutar(tarea_id):
+    """
+    Corre en un hilo o proceso del pool. causas.tareas se importa aquí para que
+    los procesos hijos puedan cargar este módulo antes de configurar Django.
+    """
+    from causas import tareas
+
+    try:
+        return tareas.ejecutar(tarea_id)
+    finally:
+        # Cada hilo abre su propia conexión: la cerramos al terminar la tarea
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ("Ejecuta las tareas en segundo plano encoladas en la base de datos, en un pool de "
+            "hilos (o de procesos), con reintentos y reporte de avance.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=2, help="Tareas simultáneas (por defecto 2)")
+        parser.add_argument('--procesos', action='store_true',
+                            help="Usa un pool de procesos en vez de hilos (para tareas que ocupan CPU)")
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help="Segundos entre revisiones de la cola cuando no hay trabajo (por defecto 2)")
+        parser.add_argument('--una-vez', action='store_true',
+                            help="Termina cuando no quedan tareas listas para ejecutar")
+
+    def handle(self, *args, **options):
+        from causas import tareas
+
+        capacidad = max(options['hilos'], 1)
+        trabajador = f"{socket.gethostname()}:{os.getpid()}"
+        if options['procesos']:
+            # Los procesos hijos no deben heredar las conexiones abiertas del padre
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=capacidad, initializer=_preparar_proceso)
+        else:
+            pool = ThreadPoolExecutor(max_workers=capacidad, thread_name_prefix='tarea')
+
+        en_curso = {}
+        ejecutadas = fallidas = 0
+        self.stdout.write(f"Trabajador {trabajador} con {capacidad} {'procesos' if options['procesos'] else 'hilos'}.")
+        try:
+            while True:
+                recuperadas = tareas.recuperar_abandonadas()
+                if recuperadas:
+                    self.stdout.write(f"{recuperadas} tareas abandonadas devueltas a la cola.")
+                tareas.latir(trabajador)
+                for tarea_id in tareas.tomar(capacidad - len(en_curso), trabajador):
+                    en_curso[pool.submit(_ejecutar, tarea_id)] = tarea_id
+
+                if not en_curso:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                # Esperamos a que termine alguna (o al próximo latido) antes de tomar más
+                terminadas, _ = wait(en_curso, timeout=options['intervalo'], return_when=FIRST_COMPLETED)
+                for futuro in terminadas:
+                    tarea_id = en_curso.pop(futuro)
+                    if futuro.result():
+                        ejecutadas += 1
+                        self.stdout.write(f"Tarea {tarea_id} lista.")
+                    else:
+                        fallidas += 1
+                        self.stderr.write(f"Tarea {tarea_id} falló.")
+        except KeyboardInterrupt:
+            self.stdout.write("Interrumpido: se esperan las tareas en curso.")
+        finally:
+            pool.shutdown(wait=True)
+
+        self.stdout.write(self.style.SUCCESS(f"Tareas ejecutadas: {ejecutadas}, con error: {fallidas}."))
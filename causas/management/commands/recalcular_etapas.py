@@ -0,0 +1,27 @@
+# causas/management/commands/recalcular_etapas.py
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Now
+
+from causas.models import Causa, EtapaCausa
+from causas.reportes import reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = "Reconstruye la etapa actual desnormalizada de todas las causas a partir de su historial."
+
+    def handle(self, *args, **options):
+        # Una sola sentencia UPDATE con subconsultas correlacionadas,
+        # en lugar de recorrer las causas una por una en Python.
+        ultimo = EtapaCausa.objects.filter(causa=OuterRef('pk')).order_by('-fecha', '-id')
+        actualizadas = Causa.objects.update(
+            ultima_etapa=Subquery(ultimo.values('etapa')[:1]),
+            fecha_ultima_etapa=Subquery(ultimo.values('fecha')[:1]),
+            # Como actualizar_ultima_etapa: la página de la causa en caché y sus ETag dejan de valer
+            revision=F('revision') + 1,
+            fecha_modificacion=Now(),
+        )
+        # El resumen se agrupa por etapa actual: lo rehacemos completo
+        reconstruir_resumen()
+        self.stdout.write(self.style.SUCCESS(f"Etapa actual recalculada para {actualizadas} causas."))
@@ -0,0 +1,14 @@
+# causas/management/commands/reconstruir_busqueda.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from causas.busqueda import reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = "Reconstruye desde cero el índice FTS5 de búsqueda de texto completo."
+
+    def handle(self, *args, **options):
+        if not reconstruir_indice():
+            raise CommandError("Esta base de datos no tiene índice FTS5; la búsqueda usa 'icontains'.")
+        self.stdout.write(self.style.SUCCESS("Índice de búsqueda reconstruido."))
@@ -0,0 +1,13 @@
+# causas/management/commands/reconstruir_resumen.py
+
+from django.core.management.base import BaseCommand
+
+from causas.reportes import reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = "Reconstruye desde cero la tabla de resumen de causas que usan los reportes."
+
+    def handle(self, *args, **options):
+        filas = reconstruir_resumen()
+        self.stdout.write(self.style.SUCCESS(f"Resumen reconstruido: {filas} filas."))
@@ -0,0 +1,110 @@
+# causas/management/commands/verificar_planes.py
+
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from causas import paginacion, reportes
+from causas.kpis import calcular_kpis
+from causas.listado import filtrar_causas, pagina_causas
+from causas.models import Cartera, Causa, EtapaCausa
+from causas.views import (consulta_api_causas, consulta_api_comentarios, consulta_api_etapas,
+                          consulta_detalle_causa, precargar_pestanas)
+
+# Marcas de recorrido completo de una tabla en el plan de cada motor.
+# En SQLite, "SCAN tabla" sin "USING ... INDEX" lee la tabla entera;
+# "SCAN tabla USING COVERING INDEX" recorre sólo el índice y se acepta.
+RECORRIDO_COMPLETO = {
+    'sqlite': re.compile(r'\bSCAN (?P<tabla>\w+)(?!.*USING (COVERING )?INDEX)'),
+    'postgresql': re.compile(r'Seq Scan on (?P<tabla>\w+)'),
+}
+
+
+# Cada función ejecuta las consultas de una vista con las mismas funciones que usa
+# la vista (causas/listado.py, causas/paginacion.py, causas/reportes.py y las
+# consultas de causas/views.py), sobre una causa y una cartera de la base si las hay.
+
+def _consultas_lista_causas(causa_id, cartera_id):
+    listado = filtrar_causas({'estado': Causa.EstadoCausa.ACTIVO, 'cartera_id': str(cartera_id)})
+    listado.count()
+    list(pagina_causas(listado, ['-id'], 0, 25))
+
+
+def _consultas_detalle_causa(causa_id, cartera_id):
+    causa = consulta_detalle_causa().filter(pk=causa_id).first() or Causa(pk=causa_id)
+    precargar_pestanas(causa)
+
+
+def _consultas_api(causa_id, cartera_id):
+    causas = consulta_api_causas({'estado': Causa.EstadoCausa.ACTIVO, 'cartera_id': str(cartera_id)})
+    paginacion.paginar(causas, 'causas', ['id'])
+    # Una página siguiente, que continúa desde un cursor
+    paginacion.paginar(causas, 'causas', ['id'], paginacion.firmar_cursor('causas', [causa_id]))
+    paginacion.paginar(consulta_api_etapas(causa_id), f'etapas.{causa_id}', ['fecha', 'id'])
+    paginacion.paginar(consulta_api_comentarios(causa_id), f'comentarios.{causa_id}', ['fecha_creacion', 'id'])
+
+
+def _consultas_dashboard(causa_id, cartera_id):
+    calcular_kpis()
+
+
+def _consultas_reporte(causa_id, cartera_id):
+    reportes.consultar(['tipo_etapa'], {'estado': Causa.EstadoCausa.ACTIVO, 'cartera': str(cartera_id)})
+
+
+# Vista -> función que ejecuta las mismas consultas que esa vista
+VISTAS = {
+    'lista_causas_datos': _consultas_lista_causas,
+    'detalle_causa': _consultas_detalle_causa,
+    'api': _consultas_api,
+    'dashboard_view': _consultas_dashboard,
+    'reporte_causas': _consultas_reporte,
+}
+
+
+def recorridos_completos(vistas=VISTAS):
+    """
+    Ejecuta las consultas de cada vista, corre EXPLAIN sobre cada una y devuelve
+    una lista de (vista, tabla, sql) con las que recorren una tabla completa.
+    """
+    patron = RECORRIDO_COMPLETO.get(connection.vendor)
+    if patron is None:
+        raise CommandError(f"No sé interpretar los planes de '{connection.vendor}'.")
+    prefijo = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+
+    # El plan no depende de que las filas existan: con la base vacía sirve el id 1.
+    # Con historial, el detalle y la API también precargan los adjuntos de sus etapas.
+    causa_id = (EtapaCausa.objects.values_list('causa_id', flat=True).first()
+                or Causa.objects.values_list('pk', flat=True).first() or 1)
+    cartera_id = Cartera.objects.values_list('pk', flat=True).first() or 1
+
+    problemas = []
+    for vista, ejecutar in vistas.items():
+        with CaptureQueriesContext(connection) as capturadas:
+            ejecutar(causa_id, cartera_id)
+        for consulta in capturadas.captured_queries:
+            sql = consulta['sql']
+            with connection.cursor() as cursor:
+                cursor.execute(prefijo + sql)
+                plan = '\n'.join(str(fila[-1]) for fila in cursor.fetchall())
+            for linea in plan.splitlines():
+                encontrado = patron.search(linea)
+                if encontrado:
+                    problemas.append((vista, encontrado.group('tabla'), sql))
+    return problemas
+
+
+class Command(BaseCommand):
+    help = ("Ejecuta EXPLAIN sobre las consultas del listado, el detalle, la API, el dashboard y el reporte "
+            "de causas, armadas con las mismas funciones que esas vistas, y falla si alguna recorre una "
+            "tabla completa.")
+
+    def handle(self, *args, **options):
+        problemas = recorridos_completos()
+        for vista, tabla, sql in problemas:
+            self.stderr.write(f"[{vista}] recorrido completo de '{tabla}':\n    {sql}")
+        if problemas:
+            raise CommandError(f"{len(problemas)} consulta(s) sin índice.")
+        self.stdout.write(self.style.SUCCESS("Todas las consultas usan índices."))
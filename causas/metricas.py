@@ -0,0 +1,170 @@
+# causas/metricas.py
+"""
+Métricas de rendimiento por petición, sin depender de DEBUG.
+
+MetricasMiddleware (causas/middleware.py) mide cada petición: consultas SQL y
+su tiempo (con connection.execute_wrapper), tiempo de plantillas (con el
+backend PlantillasMedidas, configurado en TEMPLATES) y tamaño de la respuesta.
+Los envía en la cabecera Server-Timing y los acumula en histogramas por nombre
+de URL, que la vista 'metricas' expone en el formato de texto de Prometheus.
+
+Los histogramas viven en la memoria de cada proceso: con varios trabajadores,
+Prometheus ve los de aquel que atienda la petición (o hay que consultarlos por
+separado). En respuestas en streaming se mide hasta que la vista devuelve.
+"""
+
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+# Medición de la petición en curso (None fuera de MetricasMiddleware)
+medicion_actual = contextvars.ContextVar('medicion_actual', default=None)
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+BUCKETS_BYTES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# nombre -> (buckets, descripción)
+HISTOGRAMAS = {
+    'causas_peticion_segundos': (BUCKETS_SEGUNDOS, "Duración de la petición"),
+    'causas_peticion_consultas': (BUCKETS_CONSULTAS, "Consultas SQL por petición"),
+    'causas_peticion_sql_segundos': (BUCKETS_SEGUNDOS, "Tiempo en consultas SQL por petición"),
+    'causas_peticion_plantillas_segundos': (BUCKETS_SEGUNDOS, "Tiempo renderizando plantillas por petición"),
+    'causas_respuesta_bytes': (BUCKETS_BYTES, "Tamaño de la respuesta"),
+}
+
+
+class Medicion:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.sql = 0.0
+        self.plantillas = 0.0
+        self._profundidad = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Envoltorio de connection.execute_wrapper: cuenta y cronometra cada consulta
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.sql += time.perf_counter() - inicio
+
+    def medir_conexiones(self):
+        """Contexto que mide las consultas de todas las conexiones de este hilo."""
+        pila = ExitStack()
+        for conexion in connections.all():
+            pila.enter_context(conexion.execute_wrapper(self))
+        return pila
+
+    @property
+    def duracion(self):
+        return time.perf_counter() - self.inicio
+
+
+# --- PLANTILLAS ---
+
+class PlantillaMedida(Template):
+    def render(self, context=None, request=None):
+        medicion = medicion_actual.get()
+        if medicion is None:
+            return super().render(context, request)
+        # Una plantilla renderizada dentro de otra ya cuenta en el tiempo de la de afuera
+        medicion._profundidad += 1
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicion._profundidad -= 1
+            if not medicion._profundidad:
+                medicion.plantillas += time.perf_counter() - inicio
+
+
+class PlantillasMedidas(DjangoTemplates):
+    """El backend de plantillas de Django, midiendo el tiempo de render de cada petición."""
+
+    def from_string(self, template_code):
+        return PlantillaMedida(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return PlantillaMedida(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# --- HISTOGRAMAS ---
+
+_candado = threading.Lock()
+# (histograma, vista) -> [conteos por bucket (+ el de +Inf), suma]
+_histogramas = {}
+# (vista, código de estado) -> peticiones
+_peticiones = {}
+
+
+def observar(histograma, vista, valor):
+    buckets = HISTOGRAMAS[histograma][0]
+    with _candado:
+        datos = _histogramas.setdefault((histograma, vista), [[0] * (len(buckets) + 1), 0])
+        datos[0][bisect_left(buckets, valor)] += 1
+        datos[1] += valor
+
+
+def registrar(vista, estado, medicion, tamano):
+    with _candado:
+        _peticiones[(vista, estado)] = _peticiones.get((vista, estado), 0) + 1
+    observar('causas_peticion_segundos', vista, medicion.duracion)
+    observar('causas_peticion_consultas', vista, medicion.consultas)
+    observar('causas_peticion_sql_segundos', vista, medicion.sql)
+    observar('causas_peticion_plantillas_segundos', vista, medicion.plantillas)
+    if tamano is not None:
+        observar('causas_respuesta_bytes', vista, tamano)
+
+
+def reiniciar():
+    with _candado:
+        _histogramas.clear()
+        _peticiones.clear()
+
+
+def _etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exportar():
+    """Las métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+    with _candado:
+        histogramas = {clave: ([*conteos], suma) for clave, (conteos, suma) in _histogramas.items()}
+        peticiones = dict(_peticiones)
+
+    lineas = [
+        "# HELP causas_peticiones_total Peticiones atendidas, por vista y código de estado.",
+        "# TYPE causas_peticiones_total counter",
+    ]
+    for (vista, estado), cantidad in sorted(peticiones.items()):
+        lineas.append(f'causas_peticiones_total{{vista="{_etiqueta(vista)}",estado="{estado}"}} {cantidad}')
+
+    for nombre, (buckets, descripcion) in HISTOGRAMAS.items():
+        lineas += [f"# HELP {nombre} {descripcion}, por vista.", f"# TYPE {nombre} histogram"]
+        for (histograma, vista), (conteos, suma) in sorted(histogramas.items()):
+            if histograma != nombre:
+                continue
+            vista = _etiqueta(vista)
+            acumulado = 0
+            for limite, conteo in zip([*map(_numero, buckets), '+Inf'], conteos):
+                acumulado += conteo
+                lineas.append(f'{nombre}_bucket{{vista="{vista}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{nombre}_sum{{vista="{vista}"}} {_numero(suma)}')
+            lineas.append(f'{nombre}_count{{vista="{vista}"}} {acumulado}')
+    return '\n'.join(lineas) + '\n'
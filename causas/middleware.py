@@ -0,0 +1,65 @@
+# causas/middleware.py
+
+from django.conf import settings
+
+from . import auditoria, metricas
+
+
+class MetricasMiddleware:
+    """
+    Mide cada petición (consultas SQL, tiempo de SQL y de plantillas, tamaño de
+    la respuesta), lo informa en la cabecera Server-Timing y lo acumula en los
+    histogramas de causas/metricas.py. Va primero, para medir la petición completa.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = metricas.Medicion()
+        token = metricas.medicion_actual.set(medicion)
+        try:
+            with medicion.medir_conexiones():
+                respuesta = self.get_response(request)
+        finally:
+            metricas.medicion_actual.reset(token)
+
+        if respuesta.has_header('Content-Length'):
+            tamano = int(respuesta['Content-Length'])
+        elif not respuesta.streaming:
+            tamano = len(respuesta.content)
+        else:
+            tamano = None
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.view_name if coincidencia else '(sin ruta)'
+        metricas.registrar(vista, respuesta.status_code, medicion, tamano)
+
+        if getattr(settings, 'CAUSAS_SERVER_TIMING', True):
+            partes = [
+                f'sql;dur={medicion.sql * 1000:.1f};desc="{medicion.consultas} consultas"',
+                f'plantillas;dur={medicion.plantillas * 1000:.1f}',
+                f'total;dur={medicion.duracion * 1000:.1f}',
+            ]
+            if tamano is not None:
+                partes.append(f'respuesta;desc="{tamano} bytes"')
+            respuesta['Server-Timing'] = ', '.join(partes)
+        return respuesta
+
+
+class AuditoriaMiddleware:
+    """
+    Deja la petición a mano de causas/auditoria.py, para registrar qué usuario
+    hizo cada cambio, y al terminar vacía la cola de auditoría si ya esperó
+    demasiado. Va después de AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = auditoria.peticion_actual.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            auditoria.peticion_actual.reset(token)
+            auditoria.vaciar_si_corresponde()
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_ultima_etapa(apps, schema_editor):
+    Causa = apps.get_model('causas', 'Causa')
+    EtapaCausa = apps.get_model('causas', 'EtapaCausa')
+    ultimo = EtapaCausa.objects.filter(causa=models.OuterRef('pk')).order_by('-fecha', '-id')
+    Causa.objects.update(
+        ultima_etapa=models.Subquery(ultimo.values('etapa')[:1]),
+        fecha_ultima_etapa=models.Subquery(ultimo.values('fecha')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0010_etapa_tipoetapa_remove_etapajuicio_causa_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='causa',
+            name='fecha_ultima_etapa',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True, verbose_name='Fecha Etapa Actual'),
+        ),
+        migrations.AddField(
+            model_name='causa',
+            name='ultima_etapa',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='causas_actuales', to='causas.etapa', verbose_name='Etapa Actual'),
+        ),
+        migrations.RunPython(poblar_ultima_etapa, migrations.RunPython.noop),
+    ]
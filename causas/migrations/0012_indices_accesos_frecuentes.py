@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0011_causa_ultima_etapa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivoadjunto',
+            index=models.Index(fields=['etapa_causa', 'id'], name='adjunto_etapa_causa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='causa',
+            index=models.Index(fields=['estado_causa', 'cartera', '-id'], name='causa_estado_cartera_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comentario',
+            index=models.Index(fields=['causa', '-fecha_creacion'], name='comentario_causa_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='etapacausa',
+            index=models.Index(fields=['causa', '-fecha'], name='etapacausa_causa_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Tabla virtual FTS5 para la búsqueda de texto completo (ver causas/busqueda.py).
+# Sólo se crea en SQLite y si la biblioteca fue compilada con FTS5; en otros
+# motores la búsqueda usa 'icontains' y esta migración no hace nada.
+
+from django.db import migrations, OperationalError
+
+# Copia de las consultas de causas/busqueda.py tal como eran al crear la tabla:
+# una migración no debe depender de código que cambia con el esquema.
+SQL_CAUSAS = """
+    INSERT INTO causas_busqueda (causa_id, tipo, objeto_id, contenido)
+    SELECT c.id, 'causa', c.id,
+           c.rol || ' ' || c.operacion || ' ' || d.nombres || ' ' || d.apellidos || ' ' ||
+           d.rut || ' ' || COALESCE(t.nombre, '')
+    FROM causas_causa c
+    JOIN causas_deudor d ON d.id = c.deudor_id
+    LEFT JOIN causas_tribunal t ON t.id = c.tribunal_id
+"""
+SQL_ETAPAS = """
+    INSERT INTO causas_busqueda (causa_id, tipo, objeto_id, contenido)
+    SELECT r.causa_id, 'etapa', r.id, e.nombre || ' ' || r.descripcion
+    FROM causas_etapacausa r
+    JOIN causas_etapa e ON e.id = r.etapa_id
+"""
+SQL_COMENTARIOS = """
+    INSERT INTO causas_busqueda (causa_id, tipo, objeto_id, contenido)
+    SELECT m.causa_id, 'comentario', m.id, m.texto
+    FROM causas_comentario m
+"""
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE causas_busqueda USING fts5("
+                "causa_id UNINDEXED, tipo UNINDEXED, objeto_id UNINDEXED, contenido, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite sin FTS5: la búsqueda queda en modo 'icontains'
+            return
+        for sql in (SQL_CAUSAS, SQL_ETAPAS, SQL_COMENTARIOS):
+            cursor.execute(sql)
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS causas_busqueda")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0012_indices_accesos_frecuentes'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:46
+
+import causas.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0013_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='nombre_original',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='archivoadjunto',
+            name='archivo',
+            field=models.FileField(db_index=True, storage=causas.storage.AlmacenamientoDeduplicado(), upload_to='adjuntos_causas/'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0014_adjuntos_deduplicados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='error_extraccion',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='estado_extraccion',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('LISTO', 'Listo'), ('NO_SOPORTADO', 'Formato no soportado'), ('ERROR', 'Error')], db_index=True, default='PENDIENTE', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='paginas',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='texto_extraido',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:49
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0015_texto_extraido_adjuntos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaParcial',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nombre', models.CharField(max_length=255)),
+                ('descripcion', models.CharField(blank=True, max_length=255)),
+                ('tamano', models.PositiveBigIntegerField(verbose_name='Tamaño total (bytes)')),
+                ('recibido', models.PositiveBigIntegerField(default=0, verbose_name='Bytes recibidos')),
+                ('siguiente_parte', models.PositiveIntegerField(default=0)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('actualizada', models.DateTimeField(auto_now=True, db_index=True)),
+                ('etapa_causa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas_parciales', to='causas.etapacausa')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
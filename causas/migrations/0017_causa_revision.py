@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0016_subida_parcial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='causa',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
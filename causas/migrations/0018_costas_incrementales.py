@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:53
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def poblar_costas(apps, schema_editor):
+    Causa = apps.get_model('causas', 'Causa')
+    Cartera = apps.get_model('causas', 'Cartera')
+    EtapaCausa = apps.get_model('causas', 'EtapaCausa')
+    suma_etapas = (EtapaCausa.objects.filter(causa=models.OuterRef('pk')).order_by()
+                   .values('causa').annotate(suma=models.Sum('costas')).values('suma'))
+    Causa.objects.update(total_costas=Coalesce(models.Subquery(suma_etapas), 0, output_field=models.DecimalField()))
+    suma_causas = (Causa.objects.filter(cartera=models.OuterRef('pk')).order_by()
+                   .values('cartera').annotate(suma=models.Sum('total_costas')).values('suma'))
+    Cartera.objects.update(total_costas=Coalesce(models.Subquery(suma_causas), 0, output_field=models.DecimalField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0017_causa_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartera',
+            name='total_costas',
+            field=models.DecimalField(decimal_places=0, default=0, editable=False, max_digits=14, verbose_name='Total Costas'),
+        ),
+        migrations.AlterField(
+            model_name='causa',
+            name='total_costas',
+            field=models.DecimalField(decimal_places=0, default=0, editable=False, max_digits=10, verbose_name='Total Costas'),
+        ),
+        migrations.RunPython(poblar_costas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def poblar_resumen(apps, schema_editor):
+    Causa = apps.get_model('causas', 'Causa')
+    ResumenCausas = apps.get_model('causas', 'ResumenCausas')
+    grupos = (Causa.objects.order_by()
+              .values('cartera_id', 'estado_causa', 'tribunal_id', 'abogado_encargado_id',
+                      'ultima_etapa_id', 'ultima_etapa__tipo_etapa_id')
+              .annotate(cantidad=models.Count('id'), costas=models.Sum('total_costas')))
+    ResumenCausas.objects.bulk_create([
+        ResumenCausas(
+            cartera_id=grupo['cartera_id'], estado_causa=grupo['estado_causa'],
+            tribunal_id=grupo['tribunal_id'], abogado_encargado_id=grupo['abogado_encargado_id'],
+            etapa_id=grupo['ultima_etapa_id'], tipo_etapa_id=grupo['ultima_etapa__tipo_etapa_id'],
+            cantidad=grupo['cantidad'], total_costas=grupo['costas'] or 0,
+        )
+        for grupo in grupos
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0018_costas_incrementales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCausas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado_causa', models.CharField(choices=[('RECUPERADO', 'Recuperado'), ('ACTIVO', 'Activo'), ('SUSPENDIDO', 'Suspendido'), ('ARCHIVADO', 'Archivado')], max_length=50)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('total_costas', models.DecimalField(decimal_places=0, default=0, max_digits=14)),
+                ('abogado_encargado', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('cartera', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='causas.cartera')),
+                ('etapa', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='causas.etapa')),
+                ('tipo_etapa', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='causas.tipoetapa')),
+                ('tribunal', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='causas.tribunal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado_causa', 'cartera'], name='resumen_estado_cartera_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
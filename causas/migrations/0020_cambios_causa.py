@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0019_resumen_causas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioCausa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('campo', models.CharField(max_length=100)),
+                ('valor_anterior', models.TextField(blank=True, null=True)),
+                ('valor_nuevo', models.TextField(blank=True, null=True)),
+                ('fecha', models.DateTimeField()),
+                ('causa', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='cambios', to='causas.causa')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-fecha', '-id'],
+                'indexes': [models.Index(fields=['causa', '-fecha'], name='cambiocausa_causa_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:22
+
+import datetime
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fecha_desde_ultima_actualizacion(apps, schema_editor):
+    # Al agregar la columna todas las causas quedan con la hora de la migración;
+    # su mejor aproximación es el comienzo del día en que se guardaron por última vez
+    Causa = apps.get_model('causas', 'Causa')
+    fechas = Causa.objects.order_by().values_list('ultima_actualizacion', flat=True).distinct()
+    for fecha in list(fechas.exclude(ultima_actualizacion=None)):
+        momento = datetime.datetime.combine(fecha, datetime.time.min)
+        if settings.USE_TZ:
+            momento = django.utils.timezone.make_aware(momento)
+        Causa.objects.filter(ultima_actualizacion=fecha).update(fecha_modificacion=momento)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0021_tareas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='causa',
+            name='fecha_modificacion',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Fecha de Última Modificación'),
+        ),
+        migrations.RunPython(fecha_desde_ultima_actualizacion, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0022_fecha_modificacion_causa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resumencausas',
+            name='abogado_encargado',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='resumencausas',
+            name='cartera',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='causas.cartera'),
+        ),
+        migrations.AlterField(
+            model_name='resumencausas',
+            name='etapa',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='causas.etapa'),
+        ),
+        migrations.AlterField(
+            model_name='resumencausas',
+            name='tipo_etapa',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='causas.tipoetapa'),
+        ),
+        migrations.AlterField(
+            model_name='resumencausas',
+            name='tribunal',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='causas.tribunal'),
+        ),
+    ]
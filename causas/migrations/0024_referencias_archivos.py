@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+
+def contar_referencias(apps, schema_editor):
+    ArchivoAdjunto = apps.get_model('causas', 'ArchivoAdjunto')
+    ArchivoAlmacenado = apps.get_model('causas', 'ArchivoAlmacenado')
+    conteos = (ArchivoAdjunto.objects.exclude(archivo='').order_by()
+               .values('archivo').annotate(referencias=models.Count('id')))
+    ArchivoAlmacenado.objects.bulk_create(
+        (ArchivoAlmacenado(nombre=fila['archivo'], referencias=fila['referencias']) for fila in conteos.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0023_resumen_sin_cascada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoAlmacenado',
+            fields=[
+                ('nombre', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('referencias', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(contar_referencias, migrations.RunPython.noop),
+    ]
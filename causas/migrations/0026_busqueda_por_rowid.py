@@ -0,0 +1,57 @@
+# Repuebla el índice de búsqueda con un rowid derivado del tipo y del objeto de
+# cada fila (objeto_id * 4 + código del tipo), para que causas/busqueda.py borre
+# y reemplace filas buscándolas por rowid en lugar de recorrer la tabla virtual.
+
+from django.db import migrations
+
+# Copia de las consultas de causas/busqueda.py tal como eran en esta migración
+SQL_POBLAR = [
+    """
+    INSERT INTO causas_busqueda (rowid, causa_id, tipo, objeto_id, contenido)
+    SELECT c.id * 4 + 0, c.id, 'causa', c.id,
+           c.rol || ' ' || c.operacion || ' ' || d.nombres || ' ' || d.apellidos || ' ' ||
+           d.rut || ' ' || COALESCE(t.nombre, '')
+    FROM causas_causa c
+    JOIN causas_deudor d ON d.id = c.deudor_id
+    LEFT JOIN causas_tribunal t ON t.id = c.tribunal_id
+    """,
+    """
+    INSERT INTO causas_busqueda (rowid, causa_id, tipo, objeto_id, contenido)
+    SELECT r.id * 4 + 1, r.causa_id, 'etapa', r.id, e.nombre || ' ' || r.descripcion
+    FROM causas_etapacausa r
+    JOIN causas_etapa e ON e.id = r.etapa_id
+    """,
+    """
+    INSERT INTO causas_busqueda (rowid, causa_id, tipo, objeto_id, contenido)
+    SELECT m.id * 4 + 2, m.causa_id, 'comentario', m.id, m.texto
+    FROM causas_comentario m
+    """,
+    """
+    INSERT INTO causas_busqueda (rowid, causa_id, tipo, objeto_id, contenido)
+    SELECT a.id * 4 + 3, r.causa_id, 'adjunto', a.id, a.nombre_original || ' ' || a.texto_extraido
+    FROM causas_archivoadjunto a
+    JOIN causas_etapacausa r ON r.id = a.etapa_causa_id
+    """,
+]
+
+
+def repoblar_indice(apps, schema_editor):
+    conexion = schema_editor.connection
+    if conexion.vendor != 'sqlite' or 'causas_busqueda' not in conexion.introspection.table_names():
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute("DELETE FROM causas_busqueda")
+        for sql in SQL_POBLAR:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('causas', '0025_version_catalogo_etapas'),
+    ]
+
+    operations = [
+        # Al revertir, los rowid derivados siguen siendo válidos
+        migrations.RunPython(repoblar_indice, migrations.RunPython.noop),
+    ]
@@ -1,23 +1,36 @@
 # causas/models.py
 
-from django.db import models
+import os
+import time
+import uuid
+
+from django.db import models, transaction
+from django.utils import timezone
 from django.conf import settings # Para referenciar al modelo User de Django
 
+from .storage import almacenamiento_adjuntos
+
 # --- MODELOS DE CATEGORIZACIÓN ---
+# 'fecha_modificacion' da la versión del catálogo para los ETag de detalle_causa y la API
 class TipoEtapa(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
+    fecha_modificacion = models.DateTimeField(auto_now=True)
     def __str__(self):
         return self.nombre
 
 class Etapa(models.Model):
     tipo_etapa = models.ForeignKey(TipoEtapa, on_delete=models.CASCADE)
     nombre = models.CharField(max_length=100, unique=True)
+    fecha_modificacion = models.DateTimeField(auto_now=True)
     def __str__(self):
         return f"{self.tipo_etapa.nombre} - {self.nombre}"
 
 # Modelo para las Carteras de Clientes
 class Cartera(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
+    # Suma de las costas de sus causas, mantenida con deltas (ver Causa.sumar_costas)
+    total_costas = models.DecimalField(max_digits=14, decimal_places=0, default=0, editable=False,
+                                       verbose_name="Total Costas")
 
     def __str__(self):
         return self.nombre
@@ -56,7 +69,9 @@ class Causa(models.Model):
     operacion = models.CharField(max_length=100, blank=True, verbose_name="Operación")
     estado_causa = models.CharField(max_length=50, choices=EstadoCausa.choices, verbose_name="Estado de la Causa")
     arbitro = models.CharField(max_length=200, blank=True, verbose_name="Juez Árbitro")
-    total_costas = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name="Total Costas")
+    # Suma de las costas de su historial (EtapaCausa), mantenida con deltas atómicos
+    total_costas = models.DecimalField(max_digits=10, decimal_places=0, default=0, editable=False,
+                                       verbose_name="Total Costas")
     demandante = models.CharField(max_length=200, blank=True, verbose_name="Demandante")
     ubicacion_expediente = models.CharField(max_length=100, blank=True, verbose_name="Ubicación Expediente")
     rol_juez_arbitro = models.CharField(max_length=50, blank=True, verbose_name="Rol Juez Árbitro")
@@ -69,14 +84,155 @@ class Causa(models.Model):
     fecha_ingreso = models.DateField(auto_now_add=True, verbose_name="Fecha de Ingreso al Sistema")
     ultima_actualizacion = models.DateField(auto_now=True, verbose_name="Última Actualización")
 
+    # Copia desnormalizada de la etapa más reciente del historial (EtapaCausa).
+    # La mantienen las señales de causas/signals.py y se puede reconstruir
+    # con 'python manage.py recalcular_etapas'.
+    ultima_etapa = models.ForeignKey(Etapa, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                     related_name='causas_actuales', verbose_name="Etapa Actual")
+    fecha_ultima_etapa = models.DateField(null=True, blank=True, editable=False, db_index=True,
+                                          verbose_name="Fecha Etapa Actual")
+
+    # Contador que sube con cada cambio de la causa o de sus registros asociados
+    # (etapas, adjuntos, comentarios, antecedentes). Las pestañas de detalle_causa
+    # se guardan en caché bajo esta revisión.
+    revision = models.PositiveIntegerField(default=0, editable=False)
+    # Momento exacto del último cambio, que sube junto con la revisión. A diferencia
+    # de 'ultima_actualizacion' (sólo el día, y sólo al guardar la causa) sirve para
+    # las cabeceras Last-Modified y ETag de detalle_causa y de la API.
+    fecha_modificacion = models.DateTimeField(default=timezone.now, editable=False,
+                                              verbose_name="Fecha de Última Modificación")
+
+    # Campos que sólo se modifican con update() desde el historial. Un save() normal
+    # no los escribe, para no pisar con valores viejos lo que otro proceso actualizó.
+    CAMPOS_DERIVADOS = ['total_costas', 'ultima_etapa', 'fecha_ultima_etapa', 'revision', 'fecha_modificacion']
+
+    # Campos que definen la "porción" de la cartera en la tabla de resumen (ResumenCausas)
+    CAMPOS_PORCION = ['cartera_id', 'estado_causa', 'tribunal_id', 'abogado_encargado_id']
+
+    # Campos que no se auditan: los derivados y las fechas que pone Django
+    CAMPOS_SIN_AUDITORIA = CAMPOS_DERIVADOS + ['fecha_ingreso', 'ultima_actualizacion']
+
+    @classmethod
+    def campos_guardados(cls):
+        return [campo.attname for campo in cls._meta.concrete_fields
+                if not campo.primary_key and campo.name not in cls.CAMPOS_SIN_AUDITORIA]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Recordamos los valores leídos para saber qué cambió al guardar: para mover
+        # las costas si cambia la cartera, recalcular el resumen y auditar los cambios.
+        instancia._recordar_valores()
+        return instancia
+
+    def _recordar_valores(self, campos=None):
+        # Sólo los campos cargados: leer uno diferido haría una consulta
+        campos = self.campos_guardados() if campos is None else campos
+        guardado = getattr(self, '_guardado', {})
+        guardado.update({campo: self.__dict__[campo] for campo in campos if campo in self.__dict__})
+        self._guardado = guardado
+
+    def diferencias(self, campos=None):
+        """
+        Campos modificados en memoria desde que se leyó o guardó (o sólo los de
+        'campos', nombres o attnames): {attname: (anterior, nuevo)}.
+        """
+        guardado = getattr(self, '_guardado', {})
+        if campos is not None:
+            campos = {self._meta.get_field(campo).attname for campo in campos}
+        return {
+            campo: (anterior, self.__dict__[campo])
+            for campo, anterior in guardado.items()
+            if (campos is None or campo in campos)
+            and campo in self.__dict__ and self.__dict__[campo] != anterior
+        }
+
+    @property
+    def porcion(self):
+        return tuple(getattr(self, campo) for campo in self.CAMPOS_PORCION)
+
+    @property
+    def porcion_guardada(self):
+        """La porción del resumen en que estaba la causa al leerla, o None si no se conoce."""
+        guardado = getattr(self, '_guardado', {})
+        if all(campo in guardado for campo in self.CAMPOS_PORCION):
+            return tuple(guardado[campo] for campo in self.CAMPOS_PORCION)
+        return None
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            self._recordar_valores()
+            return
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.attname for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CAMPOS_DERIVADOS
+            ]
+        guardados = [self._meta.get_field(campo).attname for campo in kwargs['update_fields']]
+        cartera_anterior = getattr(self, '_guardado', {}).get('cartera_id', self.cartera_id)
+        # Incremento atómico en la base de datos, para no perder los aumentos
+        # que hayan hecho otros procesos desde que se leyó la causa
+        self.revision = models.F('revision') + 1
+        self.fecha_modificacion = timezone.now()
+        kwargs['update_fields'] = {*kwargs['update_fields'], 'revision', 'fecha_modificacion'}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=self.CAMPOS_DERIVADOS)
+
+        # Si la causa cambió de cartera, sus costas pasan a la nueva
+        if cartera_anterior != self.cartera_id and self.total_costas:
+            Cartera.objects.filter(pk=cartera_anterior).update(total_costas=models.F('total_costas') - self.total_costas)
+            Cartera.objects.filter(pk=self.cartera_id).update(total_costas=models.F('total_costas') + self.total_costas)
+        self._recordar_valores(set(guardados) & set(self.campos_guardados()))
+
+    @classmethod
+    def sumar_costas(cls, causa_id, delta):
+        """Suma 'delta' a las costas de la causa y de su cartera, sin leerlas antes."""
+        if not delta:
+            return
+        cls.objects.filter(pk=causa_id).update(total_costas=models.F('total_costas') + delta)
+        Cartera.objects.filter(causa__pk=causa_id).update(total_costas=models.F('total_costas') + delta)
+
+    @classmethod
+    def recalcular_costas(cls, causa_id):
+        """Recalcula las costas de una causa desde su historial y ajusta su cartera."""
+        with transaction.atomic():
+            actual = cls.objects.select_for_update().values_list('total_costas', flat=True).get(pk=causa_id)
+            suma = EtapaCausa.objects.filter(causa_id=causa_id).aggregate(suma=models.Sum('costas'))['suma'] or 0
+            cls.sumar_costas(causa_id, suma - actual)
+
+    @classmethod
+    def marcar_cambio(cls, **filtro):
+        """Sube la revisión (y la fecha de modificación) de las causas que cumplen el filtro (p. ej. pk=...)."""
+        cls.objects.filter(**filtro).update(revision=models.F('revision') + 1, fecha_modificacion=timezone.now())
+
     @property
     def etapa_actual(self):
         """Devuelve la etapa más reciente registrada en el historial."""
-        ultimo_registro = self.etapas.order_by('-fecha').first()
-        if ultimo_registro:
-            return ultimo_registro.etapa.nombre
+        if self.ultima_etapa_id:
+            return self.ultima_etapa.nombre
         return "Sin Etapas Registradas"
 
+    def actualizar_ultima_etapa(self):
+        """Recalcula la etapa actual a partir del historial y la guarda."""
+        ultimo_registro = self.etapas.order_by('-fecha', '-id').first()
+        self.ultima_etapa_id = ultimo_registro.etapa_id if ultimo_registro else None
+        self.fecha_ultima_etapa = ultimo_registro.fecha if ultimo_registro else None
+        # Usamos update() para no disparar las señales ni tocar 'ultima_actualizacion'.
+        # El historial cambió, así que en la misma sentencia subimos la revisión.
+        Causa.objects.filter(pk=self.pk).update(
+            ultima_etapa_id=self.ultima_etapa_id,
+            fecha_ultima_etapa=self.fecha_ultima_etapa,
+            revision=models.F('revision') + 1,
+            fecha_modificacion=timezone.now(),
+        )
+
+    class Meta:
+        indexes = [
+            # Listado filtrado por estado y cartera, de las más nuevas a las más antiguas
+            models.Index(fields=['estado_causa', 'cartera', '-id'], name='causa_estado_cartera_idx'),
+        ]
+
     def __str__(self):  
         return self.rol
 
@@ -87,22 +243,104 @@ class EtapaCausa(models.Model):
     descripcion = models.TextField(blank=True)
     costas = models.DecimalField(max_digits=10, decimal_places=0, default=0)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Valores guardados, para calcular el delta de costas al editar
+        if 'causa_id' in instancia.__dict__ and 'costas' in instancia.__dict__:
+            instancia._costas_guardadas = (instancia.causa_id, instancia.costas)
+        return instancia
+
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            # Historial de una causa, de la etapa más reciente a la más antigua
+            models.Index(fields=['causa', '-fecha'], name='etapacausa_causa_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.etapa.nombre} - {self.causa.rol}"
 
 
+class ArchivoAlmacenado(models.Model):
+    """
+    Un archivo en disco del almacenamiento por contenido (causas/storage.py) y
+    cuántas filas de ArchivoAdjunto lo usan. Se borra con su última referencia.
+    """
+    nombre = models.CharField(max_length=255, primary_key=True)
+    referencias = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre} ({self.referencias})"
+
+
 class ArchivoAdjunto(models.Model):
+    class EstadoExtraccion(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', 'Pendiente'
+        LISTO = 'LISTO', 'Listo'
+        NO_SOPORTADO = 'NO_SOPORTADO', 'Formato no soportado'
+        ERROR = 'ERROR', 'Error'
+
     # Ahora un archivo se asocia a un evento específico en el historial
     etapa_causa = models.ForeignKey(EtapaCausa, on_delete=models.CASCADE, related_name='archivos', null=True, blank=True)
-    archivo = models.FileField(upload_to='adjuntos_causas/')
+    # El archivo se guarda una sola vez por contenido (ver causas/storage.py);
+    # varias filas pueden compartirlo, por eso el nombre está indexado.
+    archivo = models.FileField(upload_to='adjuntos_causas/', storage=almacenamiento_adjuntos, db_index=True)
+    nombre_original = models.CharField(max_length=255, blank=True, editable=False)
     descripcion = models.CharField(max_length=255, blank=True)
+
+    # Resultado de la extracción de texto en segundo plano (ver causas/extraccion.py)
+    texto_extraido = models.TextField(blank=True, editable=False)
+    paginas = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    estado_extraccion = models.CharField(max_length=20, choices=EstadoExtraccion.choices,
+                                         default=EstadoExtraccion.PENDIENTE, editable=False, db_index=True)
+    error_extraccion = models.CharField(max_length=255, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Adjuntos de un registro del historial, en orden de subida
+            models.Index(fields=['etapa_causa', 'id'], name='adjunto_etapa_causa_idx'),
+        ]
     
+    def save(self, *args, **kwargs):
+        # Guardamos el nombre con que se subió, porque en disco queda con su hash
+        if self.archivo and not self.archivo._committed:
+            self.nombre_original = os.path.basename(self.archivo.name)
+        super().save(*args, **kwargs)
+
+    @property
+    def nombre_visible(self):
+        return self.nombre_original or os.path.basename(self.archivo.name)
+
     def __str__(self):
         return f"Archivo para {self.etapa_causa}"
     
+class SubidaParcial(models.Model):
+    """
+    Subida por partes de un archivo grande. El cliente envía partes numeradas que
+    se van agregando a un archivo temporal; si la conexión se corta, consulta
+    cuántos bytes llegaron y continúa desde la parte siguiente. Al completarla
+    se crea el ArchivoAdjunto de la etapa indicada.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    etapa_causa = models.ForeignKey(EtapaCausa, on_delete=models.CASCADE, related_name='subidas_parciales')
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    nombre = models.CharField(max_length=255)
+    descripcion = models.CharField(max_length=255, blank=True)
+    tamano = models.PositiveBigIntegerField(verbose_name="Tamaño total (bytes)")
+    recibido = models.PositiveBigIntegerField(default=0, verbose_name="Bytes recibidos")
+    siguiente_parte = models.PositiveIntegerField(default=0)
+    creada = models.DateTimeField(auto_now_add=True)
+    actualizada = models.DateTimeField(auto_now=True, db_index=True)
+
+    @property
+    def ruta_temporal(self):
+        return os.path.join(settings.MEDIA_ROOT, 'subidas_parciales', f'{self.pk}.parte')
+
+    def __str__(self):
+        return f"Subida de {self.nombre} ({self.recibido}/{self.tamano} bytes)"
+
+
 class Comentario(models.Model):
     causa = models.ForeignKey('Causa', on_delete=models.CASCADE, related_name='comentarios')
     autor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -111,6 +349,10 @@ class Comentario(models.Model):
 
     class Meta:
         ordering = ['-fecha_creacion'] # Ordenar del más nuevo al más antiguo
+        indexes = [
+            # Bitácora de una causa, del comentario más nuevo al más antiguo
+            models.Index(fields=['causa', '-fecha_creacion'], name='comentario_causa_fecha_idx'),
+        ]
 
     def __str__(self):
         return f'Comentario de {self.autor} en {self.causa.rol}'
@@ -151,4 +393,134 @@ class AntecedentesCBR(models.Model):
     fecha_escritura_cesion = models.DateField(null=True, blank=True, verbose_name="Fecha Escritura Cesión")
 
     def __str__(self):
-        return f"Antecedentes CBR para Causa {self.causa.rol}"
\ No newline at end of file
+        return f"Antecedentes CBR para Causa {self.causa.rol}"
+
+
+# --- REPORTES ---
+class ResumenCausas(models.Model):
+    """
+    Tabla de resumen materializada: cantidad de causas y costas por cartera,
+    estado, etapa actual, tribunal y abogado. Las señales recalculan sólo las
+    porciones que cambian (ver causas/reportes.py) y el comando
+    'reconstruir_resumen' la rehace completa.
+    """
+    # Sin restricción ni cascada: al borrar una cartera, tribunal, etapa o usuario las
+    # causas quedan en NULL sin pasar por sus señales, así que las filas tampoco se
+    # borran solas; las señales de esos modelos recalculan las porciones afectadas.
+    cartera = models.ForeignKey(Cartera, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                                related_name='+')
+    estado_causa = models.CharField(max_length=50, choices=Causa.EstadoCausa.choices)
+    tipo_etapa = models.ForeignKey(TipoEtapa, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                                   related_name='+')
+    etapa = models.ForeignKey(Etapa, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    tribunal = models.ForeignKey(Tribunal, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                                 related_name='+')
+    abogado_encargado = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False,
+                                          null=True, related_name='+')
+    cantidad = models.PositiveIntegerField(default=0)
+    total_costas = models.DecimalField(max_digits=14, decimal_places=0, default=0)
+
+    class Meta:
+        indexes = [
+            # Recalcular una porción y filtrar el reporte por estado y cartera
+            models.Index(fields=['estado_causa', 'cartera'], name='resumen_estado_cartera_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cartera} / {self.estado_causa} / {self.etapa}: {self.cantidad}"
+
+
+# --- AUDITORÍA ---
+class CambioCausa(models.Model):
+    """
+    Cambio de un campo de una causa: quién, cuándo, y el valor anterior y el nuevo
+    (como texto; las claves foráneas guardan el id). Se escriben en lotes desde
+    causas/auditoria.py. Sin restricción de clave foránea, para que el historial
+    se conserve aunque se elimine la causa.
+    """
+    causa = models.ForeignKey(Causa, on_delete=models.DO_NOTHING, db_constraint=False, related_name='cambios')
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='+')
+    campo = models.CharField(max_length=100)
+    valor_anterior = models.TextField(null=True, blank=True)
+    valor_nuevo = models.TextField(null=True, blank=True)
+    fecha = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-fecha', '-id']
+        indexes = [
+            # Línea de tiempo de una causa, del cambio más reciente al más antiguo
+            models.Index(fields=['causa', '-fecha'], name='cambiocausa_causa_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.campo} de {self.causa_id}: {self.valor_anterior} → {self.valor_nuevo}"
+
+
+# --- TAREAS EN SEGUNDO PLANO ---
+class Tarea(models.Model):
+    """
+    Trabajo largo (exportación, importación, reconstrucción de índices, etc.) que
+    se encola aquí y ejecuta el comando 'procesar_tareas'. La interfaz consulta
+    su avance en el endpoint JSON 'estado_tarea'. Ver causas/tareas.py.
+    """
+    class Estado(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', 'Pendiente'
+        EN_CURSO = 'EN_CURSO', 'En curso'
+        LISTA = 'LISTA', 'Lista'
+        ERROR = 'ERROR', 'Error'
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.PENDIENTE)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='tareas')
+    progreso = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    mensaje = models.CharField(max_length=255, blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    # Proceso que la está ejecutando y última señal de vida, para recuperar las abandonadas
+    trabajador = models.CharField(max_length=100, blank=True)
+    latido = models.DateTimeField(null=True, blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+    ejecutar_desde = models.DateTimeField(default=timezone.now)
+    iniciada = models.DateTimeField(null=True, blank=True)
+    terminada = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Siguiente tarea pendiente que ya se puede ejecutar
+            models.Index(fields=['estado', 'ejecutar_desde'], name='tarea_pendiente_idx'),
+        ]
+
+    @property
+    def porcentaje(self):
+        if self.estado == self.Estado.LISTA:
+            return 100
+        if not self.total:
+            return None
+        return min(100, self.progreso * 100 // self.total)
+
+    def avanzar(self, progreso, total=None, mensaje=None, forzar=False):
+        """
+        Informa el avance. Para no escribir con cada fila procesada, guarda como
+        máximo dos veces por segundo (o siempre, con 'forzar').
+        """
+        self.progreso = progreso
+        if total is not None:
+            self.total = total
+        if mensaje is not None:
+            self.mensaje = mensaje[:255]
+        ahora = time.monotonic()
+        if not forzar and ahora - getattr(self, '_ultimo_avance', 0) < 0.5:
+            return
+        self._ultimo_avance = ahora
+        Tarea.objects.filter(pk=self.pk).update(
+            progreso=self.progreso, total=self.total, mensaje=self.mensaje, latido=timezone.now(),
+        )
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.get_estado_display()})"
@@ -0,0 +1,80 @@
+# causas/paginacion.py
+"""
+Paginación por cursor (keyset) para los endpoints JSON de causas/api/.
+
+En lugar de OFFSET, cada página continúa desde la última fila de la anterior:
+WHERE (fecha, id) < (fecha_última, id_última) ORDER BY fecha DESC, id DESC.
+Con el índice del orden, la base de datos salta directo a esa posición, así
+que una página cuesta lo mismo al principio que en la fila un millón, y las
+filas insertadas o borradas mientras tanto no hacen saltar ni repetir otras.
+
+El cursor es opaco para el cliente: los valores de la última fila firmados con
+django.core.signing, para que no se puedan armar a mano ni usar en otra lista.
+"""
+
+from django.core import signing
+from django.db.models import Q
+
+
+class CursorInvalido(Exception):
+    pass
+
+
+def _codificar(orden, fila):
+    valores = []
+    for campo in orden:
+        valor = getattr(fila, campo)
+        valores.append(valor.isoformat() if hasattr(valor, 'isoformat') else valor)
+    return valores
+
+
+def firmar_cursor(lista, valores):
+    return signing.dumps(valores, salt=f'causas.cursor.{lista}', compress=True)
+
+
+def leer_cursor(lista, cursor, modelo, orden):
+    """Los valores de la última fila vista, convertidos al tipo de cada campo."""
+    try:
+        valores = signing.loads(cursor, salt=f'causas.cursor.{lista}')
+    except signing.BadSignature as error:
+        raise CursorInvalido("El cursor no es válido.") from error
+    if not isinstance(valores, list) or len(valores) != len(orden):
+        raise CursorInvalido("El cursor no es válido.")
+    return [modelo._meta.get_field(campo).to_python(valor) for campo, valor in zip(orden, valores)]
+
+
+def _despues_de(orden, valores):
+    """
+    Filas posteriores a 'valores' en el orden descendente de los campos 'orden':
+    (a < x) OR (a = x AND b < y) OR ... sobre el último campo, que debe ser único.
+    """
+    condicion = Q()
+    for posicion, campo in enumerate(orden):
+        iguales = {anterior: valor for anterior, valor in zip(orden[:posicion], valores)}
+        condicion |= Q(**iguales, **{f'{campo}__lt': valores[posicion]})
+    return condicion
+
+
+def consulta_pagina(queryset, lista, orden, cursor=None, largo=25):
+    """
+    La consulta de la página que sigue a 'cursor' (o la primera), con 'orden'
+    descendente y una fila de más, que indica si hay otra página sin contar el
+    total. Lanza CursorInvalido si el cursor no es de esta lista.
+    """
+    if cursor:
+        queryset = queryset.filter(_despues_de(orden, leer_cursor(lista, cursor, queryset.model, orden)))
+    return queryset.order_by(*(f'-{campo}' for campo in orden))[:largo + 1]
+
+
+def paginar(queryset, lista, orden, cursor=None, largo=25):
+    """
+    Devuelve (filas, cursor_siguiente) de la página que sigue a 'cursor' (o la
+    primera), con 'orden' descendente; el último campo de 'orden' desempata y
+    debe ser único (el id). cursor_siguiente es None en la última página.
+    Lanza CursorInvalido si el cursor no es de esta lista.
+    """
+    filas = list(consulta_pagina(queryset, lista, orden, cursor, largo))
+    if len(filas) <= largo:
+        return filas, None
+    filas = filas[:largo]
+    return filas, firmar_cursor(lista, _codificar(orden, filas[-1]))
@@ -0,0 +1,204 @@
+# causas/reportes.py
+"""
+Mantención y consulta de la tabla de resumen ResumenCausas.
+
+Cada causa suma 1 y sus costas a la fila de su cartera, estado, tribunal,
+abogado y etapa actual. Cuando cambia una causa (al guardarla o al cambiar su
+historial) las señales restan ese aporte de la fila anterior y lo suman a la
+nueva con deltas F(), sin recorrer otras causas; las acciones masivas de
+causas/acciones.py hacen lo mismo, juntando antes los deltas de cada fila.
+
+Las importaciones y los borrados de causas o de sus relaciones marcan en
+cambio "porciones": todas las filas de una misma cartera, estado,
+tribunal y abogado. Después del commit se recalculan sólo las porciones marcadas
+con un GROUP BY acotado por índice, y 'reconstruir_resumen' rehace la tabla
+completa. Así los reportes leen únicamente la tabla de resumen.
+"""
+
+import threading
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Causa, Etapa, ResumenCausas
+
+# Porciones y causas marcadas en esta hebra, pendientes de recalcular
+_pendientes = threading.local()
+
+# Porciones recalculadas por consulta
+PORCIONES_POR_CONSULTA = 200
+
+# Dimensiones del reporte. La clave es el parámetro GET con que se agrupa
+# (?por=cartera) o se filtra (?cartera=3); el valor, (campo, campo del nombre, etiqueta).
+DIMENSIONES = {
+    'cartera': ('cartera_id', 'cartera__nombre', 'Cartera'),
+    'estado': ('estado_causa', 'estado_causa', 'Estado'),
+    'tipo_etapa': ('tipo_etapa_id', 'tipo_etapa__nombre', 'Tipo de etapa'),
+    'etapa': ('etapa_id', 'etapa__nombre', 'Etapa'),
+    'tribunal': ('tribunal_id', 'tribunal__nombre', 'Tribunal'),
+    'abogado': ('abogado_encargado_id', 'abogado_encargado__username', 'Abogado'),
+}
+
+# Valor de filtro para las filas sin cartera, tribunal, etapa o abogado
+SIN_VALOR = 'ninguno'
+
+# Fila del resumen a la que aporta una causa: su porción y su etapa actual
+CAMPOS_FILA = ['cartera_id', 'estado_causa', 'tribunal_id', 'abogado_encargado_id', 'etapa_id']
+
+
+def _estado():
+    if not hasattr(_pendientes, 'porciones'):
+        _pendientes.porciones, _pendientes.causas = set(), set()
+    return _pendientes
+
+
+# --- MANTENCIÓN POR CAUSA ---
+
+def leer_aportes(ids, bloquear=False):
+    """
+    Lo que aporta cada causa al resumen según la base de datos:
+    {causa_id: (fila, costas)}, con la fila en el orden de CAMPOS_FILA.
+    Con 'bloquear', las causas quedan bloqueadas hasta el fin de la transacción.
+    """
+    causas = Causa.objects.filter(pk__in=ids)
+    if bloquear:
+        causas = causas.select_for_update()
+    return {
+        pk: (tuple(fila), costas)
+        for pk, *fila, costas in causas.values_list('pk', *Causa.CAMPOS_PORCION, 'ultima_etapa_id', 'total_costas')
+    }
+
+
+def aplicar_diferencias(antes, despues):
+    """
+    Lleva al resumen el cambio de aporte de las causas entre 'antes' y 'despues'
+    (como los devuelve leer_aportes; una causa que falta no aporta nada). Los
+    aportes se suman antes por fila, así que cada fila afectada se actualiza una
+    vez aunque cambien miles de causas.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for aportes, signo in ((antes, -1), (despues, 1)):
+        for fila, costas in aportes.values():
+            deltas[fila][0] += signo
+            deltas[fila][1] += signo * costas
+    for fila, (cantidad, costas) in deltas.items():
+        if cantidad or costas:
+            _sumar(fila, cantidad, costas)
+
+
+def _sumar(fila, cantidad, costas):
+    filtro = dict(zip(CAMPOS_FILA, fila))
+    with transaction.atomic():
+        # Al restar se elige una fila que alcance, por si dos procesos crearon la misma
+        pk = (ResumenCausas.objects.select_for_update().filter(**filtro, cantidad__gte=max(-cantidad, 0))
+              .values_list('pk', flat=True).first())
+        if pk is None:
+            # Sin fila de la que restar el resumen ya estaba desfasado; 'reconstruir_resumen' lo corrige
+            if cantidad > 0:
+                tipo_etapa_id = filtro['etapa_id'] and (Etapa.objects.filter(pk=filtro['etapa_id'])
+                                                        .values_list('tipo_etapa_id', flat=True).first())
+                ResumenCausas.objects.create(**filtro, tipo_etapa_id=tipo_etapa_id,
+                                             cantidad=cantidad, total_costas=costas)
+            return
+        ResumenCausas.objects.filter(pk=pk).update(cantidad=F('cantidad') + cantidad,
+                                                   total_costas=F('total_costas') + costas)
+        if cantidad < 0:
+            ResumenCausas.objects.filter(pk=pk, cantidad=0).delete()
+
+
+# --- MANTENCIÓN POR PORCIONES ---
+
+def marcar_porcion(porcion):
+    """Marca una porción (cartera_id, estado, tribunal_id, abogado_id) para recalcularla."""
+    _estado().porciones.add(tuple(porcion))
+    transaction.on_commit(aplicar_pendientes)
+
+
+def marcar_causas(ids):
+    """Marca la porción actual de las causas indicadas, que se resuelve al aplicar."""
+    _estado().causas.update(ids)
+    transaction.on_commit(aplicar_pendientes)
+
+
+def aplicar_pendientes():
+    """
+    Recalcula las porciones marcadas. Cada marca registra su on_commit, pero la
+    primera llamada se lleva todo lo pendiente y las demás no hacen nada.
+    """
+    estado = _estado()
+    porciones, causas = estado.porciones, estado.causas
+    estado.porciones, estado.causas = set(), set()
+    if causas:
+        porciones.update(Causa.objects.filter(pk__in=causas).values_list(*Causa.CAMPOS_PORCION).distinct())
+    if porciones:
+        recalcular_porciones(porciones)
+
+
+def _filtro_porcion(porcion):
+    # filter(campo=None) se traduce a IS NULL
+    return Q(**dict(zip(Causa.CAMPOS_PORCION, porcion)))
+
+
+def _filas_resumen(causas):
+    """Agrupa un queryset de causas en filas de ResumenCausas (sin guardar)."""
+    grupos = (causas.order_by()
+              .values(*Causa.CAMPOS_PORCION, 'ultima_etapa_id', 'ultima_etapa__tipo_etapa_id')
+              .annotate(cantidad=Count('id'), costas=Sum('total_costas')))
+    return [
+        ResumenCausas(
+            cartera_id=grupo['cartera_id'], estado_causa=grupo['estado_causa'],
+            tribunal_id=grupo['tribunal_id'], abogado_encargado_id=grupo['abogado_encargado_id'],
+            etapa_id=grupo['ultima_etapa_id'], tipo_etapa_id=grupo['ultima_etapa__tipo_etapa_id'],
+            cantidad=grupo['cantidad'], total_costas=grupo['costas'] or 0,
+        )
+        for grupo in grupos
+    ]
+
+
+def recalcular_porciones(porciones):
+    porciones = list(porciones)
+    for inicio in range(0, len(porciones), PORCIONES_POR_CONSULTA):
+        filtro = reduce(or_, map(_filtro_porcion, porciones[inicio:inicio + PORCIONES_POR_CONSULTA]))
+        with transaction.atomic():
+            ResumenCausas.objects.filter(filtro).delete()
+            ResumenCausas.objects.bulk_create(_filas_resumen(Causa.objects.filter(filtro)))
+
+
+def reconstruir_resumen():
+    """Rehace la tabla completa. Devuelve el número de filas generadas."""
+    with transaction.atomic():
+        ResumenCausas.objects.all().delete()
+        filas = ResumenCausas.objects.bulk_create(_filas_resumen(Causa.objects.all()), batch_size=1000)
+    return len(filas)
+
+
+# --- CONSULTA ---
+
+def consultar(agrupar_por, filtros):
+    """
+    Devuelve el reporte agrupado por las dimensiones de 'agrupar_por' y filtrado
+    por 'filtros' ({dimensión: valor}; SIN_VALOR filtra las filas vacías). Cada
+    fila trae 'cantidad', 'costas' y 'valores': [(dimensión, id, nombre), ...].
+    """
+    resumen = ResumenCausas.objects.all()
+    for dimension, valor in filtros.items():
+        resumen = resumen.filter(**{DIMENSIONES[dimension][0]: None if valor == SIN_VALOR else valor})
+    campos = []
+    for dimension in agrupar_por:
+        campo, nombre, _ = DIMENSIONES[dimension]
+        campos += [campo] if campo == nombre else [campo, nombre]
+    filas = (resumen.values(*campos)
+             .annotate(cantidad=Sum('cantidad'), costas=Sum('total_costas'))
+             .order_by('-cantidad', *campos))
+    return [
+        {
+            'cantidad': fila['cantidad'],
+            'costas': fila['costas'],
+            'valores': [(dimension, fila[DIMENSIONES[dimension][0]], fila[DIMENSIONES[dimension][1]])
+                        for dimension in agrupar_por],
+        }
+        for fila in filas
+    ]
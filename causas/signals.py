@@ -0,0 +1,264 @@
+# causas/signals.py
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import auditoria, busqueda, extraccion, reportes
+from .catalogo import invalidar_version
+from .kpis import invalidar_kpis
+from .models import (AntecedentesCBR, AntecedentesLeasing, ArchivoAdjunto, Cartera, Causa, Comentario,
+                     Deudor, Etapa, EtapaCausa, TipoEtapa, Tribunal)
+
+
+# --- RESUMEN PARA REPORTES: APORTE ANTES DEL CAMBIO ---
+# Va primero, antes de que se recalculen la etapa actual y las costas de la
+# causa; 'aplicar_resumen_por_etapa' (después de las costas) lleva la diferencia.
+@receiver(post_save, sender=EtapaCausa)
+@receiver(post_delete, sender=EtapaCausa)
+def anotar_resumen_por_etapa(sender, instance, **kwargs):
+    causa_anterior, _ = getattr(instance, '_costas_guardadas', (None, None))
+    instance._causas_resumen = {instance.causa_id, causa_anterior} - {None}
+    instance._aportes_resumen = reportes.leer_aportes(instance._causas_resumen)
+
+
+# --- ETAPA ACTUAL DESNORMALIZADA ---
+# Cada vez que cambia el historial de una causa, recalculamos su etapa actual
+# para que los listados no tengan que consultarlo fila por fila.
+# (actualizar_ultima_etapa también sube la revisión de la causa.)
+@receiver(post_save, sender=EtapaCausa)
+@receiver(post_delete, sender=EtapaCausa)
+def actualizar_etapa_actual(sender, instance, **kwargs):
+    causa = Causa(pk=instance.causa_id)
+    causa.actualizar_ultima_etapa()
+
+
+# --- RESUMEN PARA REPORTES ---
+# Al guardar una causa se mueve su aporte (1 y sus costas) de la fila que deja a
+# la nueva, si cambió de cartera, estado, tribunal o abogado. Al borrarla se
+# recalcula su porción después del commit, porque el borrado en cascada de su
+# historial ya movió su aporte y la instancia no lo refleja.
+@receiver(post_save, sender=Causa)
+def actualizar_resumen_por_causa(sender, instance, created, **kwargs):
+    if created:
+        reportes.aplicar_diferencias({}, {instance.pk: (
+            (*instance.porcion, instance.ultima_etapa_id), instance.total_costas)})
+        return
+    anterior = instance.porcion_guardada
+    if anterior is None:
+        reportes.marcar_porcion(instance.porcion)
+    elif anterior != instance.porcion:
+        despues = reportes.leer_aportes({instance.pk})
+        fila, costas = despues[instance.pk]
+        reportes.aplicar_diferencias({instance.pk: ((*anterior, fila[-1]), costas)}, despues)
+
+
+@receiver(post_delete, sender=Causa)
+def marcar_resumen_por_causa(sender, instance, **kwargs):
+    reportes.marcar_porcion(instance.porcion)
+
+
+# Al borrar una cartera, tribunal, etapa o usuario, Django deja en NULL la clave de
+# sus causas con un update(), sin señales de Causa. Antes del borrado anotamos
+# las porciones de esas causas y después marcamos cada una junto con la porción
+# a la que pasan (la etapa no es parte de la porción: basta con recalcularla).
+CAMPO_DE_CAUSA = {
+    Cartera: 'cartera_id',
+    Tribunal: 'tribunal_id',
+    Etapa: 'ultima_etapa_id',
+    get_user_model(): 'abogado_encargado_id',
+}
+
+
+@receiver(pre_delete, sender=Cartera)
+@receiver(pre_delete, sender=Tribunal)
+@receiver(pre_delete, sender=Etapa)
+@receiver(pre_delete, sender=get_user_model())
+def anotar_porciones_afectadas(sender, instance, **kwargs):
+    campo = CAMPO_DE_CAUSA[sender]
+    instance._porciones_afectadas = set(
+        Causa.objects.filter(**{campo: instance.pk}).values_list(*Causa.CAMPOS_PORCION).distinct()
+    )
+
+
+@receiver(post_delete, sender=Cartera)
+@receiver(post_delete, sender=Tribunal)
+@receiver(post_delete, sender=Etapa)
+@receiver(post_delete, sender=get_user_model())
+def marcar_porciones_afectadas(sender, instance, **kwargs):
+    campo = CAMPO_DE_CAUSA[sender]
+    for porcion in getattr(instance, '_porciones_afectadas', ()):
+        reportes.marcar_porcion(porcion)
+        if campo in Causa.CAMPOS_PORCION:
+            porcion = list(porcion)
+            porcion[Causa.CAMPOS_PORCION.index(campo)] = None
+            reportes.marcar_porcion(porcion)
+
+
+# --- AUDITORÍA ---
+# Sólo los campos guardados que cambiaron, comparados en memoria (ver causas/auditoria.py).
+@receiver(post_save, sender=Causa)
+def auditar_causa(sender, instance, created, update_fields, **kwargs):
+    if not created:
+        auditoria.registrar(instance.pk, instance.diferencias(update_fields))
+
+
+# --- INDICADORES DEL DASHBOARD ---
+# Cualquier alta, edición o baja de una causa puede cambiar los conteos por estado.
+@receiver(post_save, sender=Causa)
+@receiver(post_delete, sender=Causa)
+def invalidar_kpis_dashboard(sender, **kwargs):
+    invalidar_kpis()
+
+
+# --- VERSIÓN DEL CATÁLOGO DE ETAPAS ---
+# Forma parte de los ETag de detalle_causa y la API (ver causas/catalogo.py).
+@receiver(post_save, sender=TipoEtapa)
+@receiver(post_delete, sender=TipoEtapa)
+@receiver(post_save, sender=Etapa)
+@receiver(post_delete, sender=Etapa)
+def invalidar_version_catalogo(sender, **kwargs):
+    invalidar_version()
+
+
+# --- COSTAS ---
+# Las costas de cada etapa se suman a su causa y a la cartera con deltas F(),
+# sin recalcular la suma del historial. 'conciliar_costas' corrige desvíos.
+@receiver(post_save, sender=EtapaCausa)
+def sumar_costas_etapa(sender, instance, created, **kwargs):
+    causa_anterior, costas_anteriores = getattr(instance, '_costas_guardadas', (None, None))
+    if created:
+        Causa.sumar_costas(instance.causa_id, instance.costas)
+    elif costas_anteriores is None:
+        # Se editó una etapa cargada sin sus costas: no conocemos el delta
+        Causa.recalcular_costas(instance.causa_id)
+    elif causa_anterior != instance.causa_id:
+        Causa.sumar_costas(causa_anterior, -costas_anteriores)
+        Causa.sumar_costas(instance.causa_id, instance.costas)
+    else:
+        Causa.sumar_costas(instance.causa_id, instance.costas - costas_anteriores)
+    instance._costas_guardadas = (instance.causa_id, instance.costas)
+
+
+@receiver(post_delete, sender=EtapaCausa)
+def restar_costas_etapa(sender, instance, **kwargs):
+    causa_id, costas = getattr(instance, '_costas_guardadas', (instance.causa_id, instance.costas))
+    Causa.sumar_costas(causa_id, -costas)
+
+
+# Cierra 'anotar_resumen_por_etapa': la etapa actual y las costas ya están al día
+@receiver(post_save, sender=EtapaCausa)
+@receiver(post_delete, sender=EtapaCausa)
+def aplicar_resumen_por_etapa(sender, instance, **kwargs):
+    antes = instance.__dict__.pop('_aportes_resumen', {})
+    causas = instance.__dict__.pop('_causas_resumen', set())
+    reportes.aplicar_diferencias(antes, reportes.leer_aportes(causas))
+
+
+# --- ÍNDICE DE BÚSQUEDA ---
+# Mantiene al día la tabla FTS5 de causas/busqueda.py (no hace nada sin FTS5).
+@receiver(post_save, sender=Causa)
+def indexar_causa(sender, instance, **kwargs):
+    busqueda.indexar_causas([instance.pk])
+
+
+@receiver(post_save, sender=Deudor)
+def indexar_deudor(sender, instance, created, **kwargs):
+    # Un deudor nuevo todavía no tiene causas que reindexar
+    if not created:
+        busqueda.indexar_causas_de_deudor(instance.pk)
+
+
+@receiver(post_save, sender=EtapaCausa)
+def indexar_etapa(sender, instance, **kwargs):
+    busqueda.indexar_etapa(instance.pk)
+
+
+@receiver(post_save, sender=Comentario)
+def indexar_comentario(sender, instance, **kwargs):
+    busqueda.indexar_comentario(instance.pk)
+
+
+@receiver(post_delete, sender=Causa)
+def quitar_causa_del_indice(sender, instance, **kwargs):
+    busqueda.quitar('causa', instance.pk)
+
+
+@receiver(post_delete, sender=EtapaCausa)
+def quitar_etapa_del_indice(sender, instance, **kwargs):
+    busqueda.quitar('etapa', instance.pk)
+
+
+@receiver(post_delete, sender=Comentario)
+def quitar_comentario_del_indice(sender, instance, **kwargs):
+    busqueda.quitar('comentario', instance.pk)
+
+
+# --- ARCHIVOS ADJUNTOS COMPARTIDOS ---
+# Varios adjuntos pueden apuntar al mismo archivo en disco (causas/storage.py),
+# que lleva la cuenta de sus referencias: al borrar una fila se descuenta la suya
+# y el archivo se borra, después del commit, cuando ya no queda ninguna.
+@receiver(post_delete, sender=ArchivoAdjunto)
+def liberar_archivo_adjunto(sender, instance, **kwargs):
+    instance.archivo.storage.liberar(instance.archivo.name)
+
+
+# --- EXTRACCIÓN DE TEXTO DE ADJUNTOS ---
+@receiver(post_save, sender=ArchivoAdjunto)
+def encolar_extraccion(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: extraccion.programar_extraccion(instance))
+
+
+@receiver(post_delete, sender=ArchivoAdjunto)
+def quitar_adjunto_del_indice(sender, instance, **kwargs):
+    busqueda.quitar('adjunto', instance.pk)
+
+
+# --- REVISIÓN DE LA CAUSA ---
+# Los cambios en registros asociados suben la revisión de su causa, lo que
+# invalida las pestañas de detalle_causa guardadas en caché.
+@receiver(post_save, sender=Comentario)
+@receiver(post_delete, sender=Comentario)
+@receiver(post_save, sender=AntecedentesLeasing)
+@receiver(post_delete, sender=AntecedentesLeasing)
+@receiver(post_save, sender=AntecedentesCBR)
+@receiver(post_delete, sender=AntecedentesCBR)
+def marcar_cambio_en_causa(sender, instance, **kwargs):
+    Causa.marcar_cambio(pk=instance.causa_id)
+
+
+@receiver(post_save, sender=ArchivoAdjunto)
+@receiver(post_delete, sender=ArchivoAdjunto)
+def marcar_cambio_por_adjunto(sender, instance, **kwargs):
+    if instance.etapa_causa_id:
+        Causa.marcar_cambio(etapas__id=instance.etapa_causa_id)
+
+
+# La ficha muestra el nombre del tribunal y de la cartera, y las pestañas en
+# caché el del abogado y el de los autores de la bitácora. Un guardado que
+# sólo toca otros campos (el último ingreso de un usuario) no cambia las causas.
+def _cambia_nombre(update_fields, campos):
+    return update_fields is None or bool(set(update_fields) & campos)
+
+
+@receiver(post_save, sender=Tribunal)
+@receiver(post_save, sender=Cartera)
+def marcar_cambio_por_nombre(sender, instance, created, update_fields, **kwargs):
+    if not created and _cambia_nombre(update_fields, {'nombre'}):
+        Causa.marcar_cambio(**{CAMPO_DE_CAUSA[sender]: instance.pk})
+
+
+@receiver(post_save, sender=get_user_model())
+def marcar_cambio_por_usuario(sender, instance, created, update_fields, **kwargs):
+    if not created and _cambia_nombre(update_fields, {'username', 'first_name', 'last_name'}):
+        Causa.marcar_cambio(abogado_encargado_id=instance.pk)
+        Causa.marcar_cambio(comentarios__autor_id=instance.pk)
+
+
+@receiver(post_save, sender=Deudor)
+def marcar_cambio_por_deudor(sender, instance, created, **kwargs):
+    # El resumen de la causa muestra los datos del deudor
+    if not created:
+        Causa.marcar_cambio(deudor_id=instance.pk)
@@ -0,0 +1,103 @@
+# causas/storage.py
+
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class AlmacenamientoDeduplicado(FileSystemStorage):
+    """
+    Almacenamiento direccionado por contenido para los archivos adjuntos.
+
+    Cada archivo se guarda con el nombre de su hash SHA-256
+    (p. ej. 'adjuntos_causas/3f/a2/3fa2….pdf'), de modo que un mismo contrato
+    o poder subido en varias causas ocupa un solo archivo en disco y todas las
+    filas de ArchivoAdjunto apuntan a él.
+
+    Cada archivo tiene una fila de ArchivoAlmacenado con sus referencias: guardar
+    suma una y liberar() resta una (la señal de borrado de ArchivoAdjunto). Las dos
+    operaciones bloquean esa fila, y el archivo se borra sólo si la cuenta quedó en
+    cero, así que un guardado y un borrado simultáneos no pueden dejar una fila
+    apuntando a un archivo que ya no existe.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre final lo decide el hash en _save(); no hay que evitar choques
+        return name
+
+    def _save(self, name, content):
+        # 1. Calculamos el hash leyendo el archivo por bloques
+        hasher = hashlib.sha256()
+        for bloque in content.chunks():
+            hasher.update(bloque)
+        digest = hasher.hexdigest()
+        carpeta = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        nombre = os.path.join(carpeta, digest[:2], digest[2:4], digest + extension).replace('\\', '/')
+
+        # 2. Si el contenido ya existe, un duplicado no escribe nada en disco
+        if not self.exists(nombre):
+            self._escribir(nombre, content)
+
+        # 3. Contamos la referencia con la fila bloqueada. Si entre el paso anterior
+        #    y el bloqueo otro proceso liberó la última referencia y borró el
+        #    archivo, lo volvemos a escribir.
+        from .models import ArchivoAlmacenado
+        with transaction.atomic():
+            ArchivoAlmacenado.objects.select_for_update().get_or_create(nombre=nombre)
+            ArchivoAlmacenado.objects.filter(pk=nombre).update(referencias=F('referencias') + 1)
+            if not self.exists(nombre):
+                self._escribir(nombre, content)
+        return nombre
+
+    def _escribir(self, nombre, content):
+        # Escribimos a un temporal en la misma carpeta y lo renombramos,
+        # para que nunca quede a la vista un archivo a medio escribir
+        ruta = self.path(nombre)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.parcial')
+        try:
+            with os.fdopen(descriptor, 'wb') as destino:
+                for bloque in content.chunks():
+                    destino.write(bloque)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporal, self.file_permissions_mode)
+            os.replace(temporal, ruta)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+    def sumar_referencias(self, nombre, cantidad):
+        """Cuenta 'cantidad' filas más que apuntan a un archivo ya guardado (p. ej. con bulk_create)."""
+        from .models import ArchivoAlmacenado
+        with transaction.atomic():
+            ArchivoAlmacenado.objects.select_for_update().get_or_create(nombre=nombre)
+            ArchivoAlmacenado.objects.filter(pk=nombre).update(referencias=F('referencias') + cantidad)
+
+    def liberar(self, nombre):
+        """
+        Descuenta una referencia al archivo. Si era la última, se borra después
+        del commit, para no perderlo si la transacción se revierte.
+        """
+        if not nombre:
+            return
+        from .models import ArchivoAlmacenado
+        ArchivoAlmacenado.objects.filter(pk=nombre, referencias__gt=0).update(referencias=F('referencias') - 1)
+        transaction.on_commit(lambda: self.borrar_si_no_se_usa(nombre))
+
+    def borrar_si_no_se_usa(self, nombre):
+        from .models import ArchivoAlmacenado
+        with transaction.atomic():
+            registro = ArchivoAlmacenado.objects.select_for_update().filter(pk=nombre, referencias=0).first()
+            if registro is not None:
+                self.delete(nombre)
+                registro.delete()
+
+almacenamiento_adjuntos = AlmacenamientoDeduplicado()
@@ -0,0 +1,146 @@
+# causas/subidas.py
+"""
+Subidas reanudables por partes para expedientes grandes (ver SubidaParcial).
+
+Cada parte se copia por bloques desde el cuerpo de la petición a un archivo
+propio, sin cargarla completa en memoria y fuera de toda transacción. Luego,
+en una transacción corta, se agrega al archivo de la subida, truncado antes al
+número de bytes confirmados: una parte que quedó a medias por un corte se
+reescribe limpia al reintentarla.
+"""
+
+import glob
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivoAdjunto, SubidaParcial
+
+BLOQUE_LECTURA = 64 * 1024
+
+
+class ErrorSubida(Exception):
+    """Error del cliente: la vista lo devuelve como JSON con el código indicado."""
+
+    def __init__(self, mensaje, estado=400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def tamano_maximo_parte():
+    return getattr(settings, 'CAUSAS_TAMANO_MAXIMO_PARTE', 16 * 1024 * 1024)
+
+
+def estado_subida(subida):
+    return {
+        'id': str(subida.pk),
+        'nombre': subida.nombre,
+        'tamano': subida.tamano,
+        'recibido': subida.recibido,
+        'siguiente_parte': subida.siguiente_parte,
+    }
+
+
+def _recibir_parte(subida, origen, limite):
+    """
+    Copia la parte desde 'origen' a un archivo temporal propio, fuera de toda
+    transacción: la transferencia por la red puede tardar y no debe retener el
+    bloqueo de escritura de la base de datos. Devuelve (ruta, bytes escritos).
+    """
+    carpeta = os.path.dirname(subida.ruta_temporal)
+    os.makedirs(carpeta, exist_ok=True)
+    descriptor, ruta = tempfile.mkstemp(dir=carpeta, prefix=f'{subida.pk}.', suffix='.recibiendo')
+    escritos = 0
+    try:
+        with os.fdopen(descriptor, 'wb') as destino:
+            while True:
+                bloque = origen.read(BLOQUE_LECTURA)
+                if not bloque:
+                    break
+                escritos += len(bloque)
+                if escritos > limite:
+                    raise ErrorSubida("La parte excede el tamaño permitido o el tamaño declarado.", estado=413)
+                destino.write(bloque)
+        if escritos == 0:
+            raise ErrorSubida("La parte llegó vacía.")
+    except BaseException:
+        os.remove(ruta)
+        raise
+    return ruta, escritos
+
+
+def agregar_parte(subida_id, numero, origen):
+    """
+    Agrega la parte 'numero' leyendo de 'origen' (un objeto con .read()).
+    Si la parte ya se había recibido, no hace nada: los reintentos son seguros.
+    """
+    subida = SubidaParcial.objects.get(pk=subida_id)
+    if numero < subida.siguiente_parte:
+        return subida
+    if numero > subida.siguiente_parte:
+        raise ErrorSubida(f"Se esperaba la parte {subida.siguiente_parte}.", estado=409)
+
+    recibido = subida.recibido
+    parte, escritos = _recibir_parte(subida, origen, min(tamano_maximo_parte(), subida.tamano - recibido))
+    try:
+        # Transacción corta: sólo se agrega una copia local al archivo de la subida,
+        # si nadie agregó esta parte mientras se recibía (comparar y asignar)
+        with transaction.atomic():
+            subida = SubidaParcial.objects.select_for_update().get(pk=subida_id)
+            if numero < subida.siguiente_parte:
+                return subida
+            if numero > subida.siguiente_parte or subida.recibido != recibido:
+                raise ErrorSubida(f"Se esperaba la parte {subida.siguiente_parte}.", estado=409)
+            with open(subida.ruta_temporal, 'ab') as destino, open(parte, 'rb') as copia:
+                # Descartamos lo que haya quedado de un intento anterior interrumpido
+                destino.truncate(recibido)
+                shutil.copyfileobj(copia, destino, BLOQUE_LECTURA)
+            SubidaParcial.objects.filter(pk=subida_id, siguiente_parte=numero, recibido=recibido).update(
+                recibido=recibido + escritos, siguiente_parte=numero + 1, actualizada=timezone.now(),
+            )
+    finally:
+        os.remove(parte)
+    subida.refresh_from_db()
+    return subida
+
+
+def completar(subida_id):
+    """Arma el ArchivoAdjunto con el archivo completo y elimina la subida."""
+    subida = SubidaParcial.objects.get(pk=subida_id)
+    if subida.recibido != subida.tamano:
+        raise ErrorSubida(f"Faltan {subida.tamano - subida.recibido} bytes por recibir.", estado=409)
+    ruta = subida.ruta_temporal
+    with open(ruta, 'rb') as archivo:
+        # El hash y la copia al almacenamiento (cientos de MB, quizás) van antes de
+        # la transacción; en ella sólo se crea la fila y se borra la subida
+        adjunto = ArchivoAdjunto(etapa_causa_id=subida.etapa_causa_id, descripcion=subida.descripcion,
+                                 nombre_original=os.path.basename(subida.nombre))
+        adjunto.archivo.save(subida.nombre, File(archivo), save=False)
+        try:
+            with transaction.atomic():
+                subida = SubidaParcial.objects.select_for_update().filter(pk=subida_id).first()
+                if subida is None:
+                    raise ErrorSubida("La subida ya se completó o se canceló.", estado=409)
+                adjunto.save()
+                subida.delete()
+        except BaseException:
+            # Guardar el archivo contó una referencia que ninguna fila va a usar
+            adjunto.archivo.storage.liberar(adjunto.archivo.name)
+            raise
+    os.remove(ruta)
+    return adjunto
+
+
+def descartar(subida):
+    """Elimina una subida, su archivo temporal y las partes que un corte haya dejado a medio recibir."""
+    ruta = subida.ruta_temporal
+    partes = glob.glob(os.path.join(os.path.dirname(ruta), f'{subida.pk}.*.recibiendo'))
+    subida.delete()
+    for archivo in [ruta, *partes]:
+        if os.path.exists(archivo):
+            os.remove(archivo)
@@ -0,0 +1,191 @@
+# causas/tareas.py
+"""
+Cola de tareas en segundo plano sobre la base de datos, sin broker externo.
+
+Las vistas encolan una Tarea y responden de inmediato; el comando
+'procesar_tareas' las toma y las ejecuta en un pool de hilos o de procesos, y
+la interfaz consulta el avance en el endpoint JSON 'estado_tarea'.
+
+Para tomar una tarea sin bloqueos se usa un UPDATE condicional (estado
+PENDIENTE -> EN_CURSO): si dos trabajadores compiten, sólo a uno le afecta una
+fila. Una tarea que falla se reintenta con espera exponencial hasta
+'max_intentos'. Los trabajadores renuevan el 'latido' de sus tareas; las que
+se quedan sin latido (el proceso murió) vuelven a la cola.
+"""
+
+import logging
+import os
+import traceback
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+# Tipos de tarea registrados: nombre -> (función, sólo para el personal)
+TIPOS = {}
+
+
+def tipo_de_tarea(nombre, solo_personal=True):
+    """
+    Registra una función como tipo de tarea. La función recibe la Tarea y sus
+    parámetros, informa su avance con tarea.avanzar() y devuelve el resultado
+    (algo serializable a JSON).
+    """
+    def registrar(funcion):
+        TIPOS[nombre] = (funcion, solo_personal)
+        return funcion
+    return registrar
+
+
+def espera_reintento(intentos):
+    base = getattr(settings, 'CAUSAS_TAREAS_ESPERA_REINTENTO', 30)
+    return timedelta(seconds=base * 2 ** max(intentos - 1, 0))
+
+
+def directorio_tarea(tarea):
+    """Directorio donde una tarea deja sus archivos de resultado."""
+    return os.path.join(settings.MEDIA_ROOT, 'tareas', str(tarea.pk))
+
+
+# --- COLA ---
+
+def encolar(tipo, usuario=None, max_intentos=3, **parametros):
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de tarea desconocido: '{tipo}'.")
+    return Tarea.objects.create(tipo=tipo, usuario=usuario, parametros=parametros, max_intentos=max_intentos)
+
+
+def tomar(cantidad, trabajador):
+    """Marca como EN_CURSO hasta 'cantidad' tareas pendientes y devuelve sus ids."""
+    if cantidad <= 0:
+        return []
+    ahora = timezone.now()
+    candidatas = (Tarea.objects.filter(estado=Tarea.Estado.PENDIENTE, ejecutar_desde__lte=ahora)
+                  .order_by('ejecutar_desde', 'id').values_list('id', flat=True)[:cantidad * 2])
+    tomadas = []
+    for tarea_id in candidatas:
+        if len(tomadas) == cantidad:
+            break
+        # Sólo uno de los trabajadores que compiten por la tarea cambia la fila
+        if Tarea.objects.filter(pk=tarea_id, estado=Tarea.Estado.PENDIENTE).update(
+            estado=Tarea.Estado.EN_CURSO, trabajador=trabajador, iniciada=ahora, latido=ahora,
+            intentos=F('intentos') + 1,
+        ):
+            tomadas.append(tarea_id)
+    return tomadas
+
+
+def latir(trabajador):
+    """Renueva el latido de las tareas en curso de un trabajador."""
+    Tarea.objects.filter(trabajador=trabajador, estado=Tarea.Estado.EN_CURSO).update(latido=timezone.now())
+
+
+def recuperar_abandonadas():
+    """Devuelve a la cola (o da por fallidas) las tareas en curso que se quedaron sin latido."""
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'CAUSAS_TAREAS_SIN_LATIDO_SEGUNDOS', 300))
+    abandonadas = Tarea.objects.filter(estado=Tarea.Estado.EN_CURSO, latido__lt=limite)
+    mensaje = "El trabajador que la ejecutaba dejó de responder."
+    fallidas = abandonadas.filter(intentos__gte=F('max_intentos')).update(
+        estado=Tarea.Estado.ERROR, error=mensaje, terminada=timezone.now())
+    reencoladas = abandonadas.update(estado=Tarea.Estado.PENDIENTE, error=mensaje, trabajador='')
+    return reencoladas + fallidas
+
+
+def ejecutar(tarea_id):
+    """
+    Ejecuta una tarea ya tomada y guarda su resultado. Los errores no se propagan:
+    quedan en la tarea, que se reintenta más tarde si le quedan intentos.
+    """
+    tarea = Tarea.objects.get(pk=tarea_id)
+    funcion, _ = TIPOS[tarea.tipo]
+    try:
+        resultado = funcion(tarea, **tarea.parametros)
+    except Exception:
+        logger.exception("Falló la tarea %s", tarea)
+        cambios = {'error': traceback.format_exc()[-4000:], 'trabajador': ''}
+        if tarea.intentos < tarea.max_intentos:
+            cambios.update(estado=Tarea.Estado.PENDIENTE,
+                           ejecutar_desde=timezone.now() + espera_reintento(tarea.intentos))
+        else:
+            cambios.update(estado=Tarea.Estado.ERROR, terminada=timezone.now())
+        Tarea.objects.filter(pk=tarea.pk).update(**cambios)
+        return False
+    Tarea.objects.filter(pk=tarea.pk).update(
+        estado=Tarea.Estado.LISTA, resultado=resultado, progreso=tarea.total or tarea.progreso,
+        total=tarea.total, error='', terminada=timezone.now(),
+    )
+    return True
+
+
+def estado_tarea(tarea):
+    """Lo que devuelve el endpoint de avance."""
+    return {
+        'id': tarea.pk,
+        'tipo': tarea.tipo,
+        'estado': tarea.estado,
+        'progreso': tarea.progreso,
+        'total': tarea.total,
+        'porcentaje': tarea.porcentaje,
+        'mensaje': tarea.mensaje,
+        'resultado': tarea.resultado,
+        'error': tarea.error.strip().splitlines()[-1] if tarea.error else '',
+        'intentos': tarea.intentos,
+    }
+
+
+# --- TIPOS DE TAREA ---
+
+@tipo_de_tarea('exportar_causas', solo_personal=False)
+def exportar_causas(tarea, filtros=None):
+    """Exporta el listado filtrado a un CSV que luego se descarga con 'descargar_tarea'."""
+    from .listado import filtrar_causas, lineas_csv, nombre_exportacion
+
+    listado = filtrar_causas(filtros or {})
+    tarea.avanzar(0, total=listado.count(), mensaje="Exportando causas", forzar=True)
+    directorio = directorio_tarea(tarea)
+    os.makedirs(directorio, exist_ok=True)
+    nombre = f"{nombre_exportacion()}.csv"
+    with open(os.path.join(directorio, nombre), 'w', encoding='utf-8', newline='') as archivo:
+        for linea in lineas_csv(listado, al_avanzar=tarea.avanzar):
+            archivo.write(linea)
+    return {'archivo': nombre}
+
+
+@tipo_de_tarea('importar_cartera')
+def importar_cartera(tarea, ruta, cartera=None):
+    """Importa un archivo subido. Los reintentos continúan desde el último lote confirmado."""
+    from .management.commands.importar_cartera import Command
+
+    comando = Command(stdout=StringIO(), stderr=StringIO())
+    comando.al_avanzar = lambda filas: tarea.avanzar(filas, mensaje=f"{filas} filas importadas")
+    call_command(comando, ruta, cartera=cartera, reanudar=tarea.intentos > 1)
+    os.remove(ruta)
+    return {'mensaje': comando.stdout.getvalue().strip().splitlines()[-1], 'errores': comando.errores}
+
+
+@tipo_de_tarea('reconstruir_resumen')
+def reconstruir_resumen(tarea):
+    from .reportes import reconstruir_resumen
+
+    return {'filas': reconstruir_resumen()}
+
+
+@tipo_de_tarea('reconstruir_busqueda')
+def reconstruir_busqueda(tarea):
+    from .busqueda import reconstruir_indice
+
+    return {'reconstruido': reconstruir_indice()}
+
+
+@tipo_de_tarea('extraer_texto_adjuntos')
+def extraer_texto_adjuntos(tarea, reintentar=False):
+    salida = StringIO()
+    call_command('extraer_texto_adjuntos', reintentar=reintentar, stdout=salida)
+    return {'mensaje': salida.getvalue().strip().splitlines()[-1]}
@@ -1,3 +1,1477 @@
-from django.test import TestCase
+# causas/tests.py
 
-# Create your tests here.
+import datetime
+import json
+import os
+import re
+import runpy
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+from contextlib import closing
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipIf, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import acciones, analitica, auditoria, busqueda, extraccion, listado, metricas, reportes, subidas, tareas
+from .management.commands import importar_cartera, verificar_planes
+from .models import (AntecedentesCBR, AntecedentesLeasing, ArchivoAdjunto, ArchivoAlmacenado, CambioCausa,
+                     Cartera, Causa, Comentario, Deudor, Etapa, EtapaCausa, ResumenCausas, SubidaParcial, Tarea,
+                     TipoEtapa, Tribunal)
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+# Los adjuntos de las pruebas se guardan en un directorio temporal
+MEDIA_PRUEBAS = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_PRUEBAS, ignore_errors=True)
+    # Que la cola de auditoría no se vacíe al salir sobre otra base de datos
+    auditoria._cola.clear()
+
+
+class DatosDePruebaMixin:
+    """Crea una cartera pequeña con historial, comentarios y adjuntos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('abogado', 'abogado@example.com', 'clave')
+        cls.tribunal = Tribunal.objects.create(nombre='1º Juzgado Civil de Santiago')
+        cls.cartera = Cartera.objects.create(nombre='Banco Ejemplo')
+        tipo = TipoEtapa.objects.create(nombre='Discusión')
+        cls.demanda = Etapa.objects.create(tipo_etapa=tipo, nombre='Demanda')
+        cls.notificacion = Etapa.objects.create(tipo_etapa=tipo, nombre='Notificación')
+
+        cls.causas = []
+        for i in range(5):
+            deudor = Deudor.objects.create(nombres=f'Nombre {i}', apellidos='Apellido', rut=f'1111111{i}-1')
+            causa = Causa.objects.create(
+                deudor=deudor, tribunal=cls.tribunal, cartera=cls.cartera,
+                abogado_encargado=cls.usuario, rol=f'C-{i}-2024',
+                estado_causa=Causa.EstadoCausa.ACTIVO,
+            )
+            cls.causas.append(causa)
+        cls.causa = cls.causas[0]
+        AntecedentesLeasing.objects.create(causa=cls.causa, repertorio='123-2020')
+        AntecedentesCBR.objects.create(causa=cls.causa, comuna_cbr='Santiago')
+
+    def setUp(self):
+        cache.clear()
+        auditoria._cola.clear()
+        self.client.force_login(self.usuario)
+
+    def agregar_historial(self, causa, registros):
+        """Agrega 'registros' etapas, cada una con un adjunto y un comentario."""
+        for i in range(registros):
+            etapa = EtapaCausa.objects.create(
+                causa=causa, etapa=self.notificacion if i % 2 else self.demanda,
+                fecha=datetime.date(2024, 1, 1) + datetime.timedelta(days=i),
+            )
+            ArchivoAdjunto.objects.create(
+                etapa_causa=etapa, archivo=SimpleUploadedFile(f'escrito{i}.pdf', b'%PDF-1.4'),
+            )
+            Comentario.objects.create(causa=causa, autor=self.usuario, texto=f'Comentario {i}')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS)
+class PresupuestoDeConsultasTests(DatosDePruebaMixin, TestCase):
+    """
+    Cada vista tiene un número fijo de consultas, independiente del tamaño del
+    historial o de la cartera. En las vistas con @login_required, las dos primeras
+    consultas de cada petición son la sesión y el usuario autenticado.
+    """
+
+    def test_dashboard(self):
+        with self.assertNumQueries(3):
+            self.client.get(reverse('dashboard'))
+        # Con la foto de indicadores en caché, sólo quedan sesión y usuario
+        with self.assertNumQueries(2):
+            self.client.get(reverse('dashboard'))
+
+    def test_lista_causas(self):
+        # sesión, usuario, cartera y las opciones de las acciones masivas (abogados y etapas)
+        with self.assertNumQueries(5):
+            self.client.get(reverse('lista_causas'), {'cartera_id': self.cartera.pk})
+
+    def test_lista_causas_datos(self):
+        for causa in self.causas:
+            self.agregar_historial(causa, 2)
+        # sesión, usuario, total, total filtrado y la página
+        with self.assertNumQueries(5):
+            respuesta = self.client.get(reverse('lista_causas_datos'), {
+                'draw': 1, 'start': 0, 'length': 10, 'search[value]': 'C-',
+                'order[0][column]': 4, 'order[0][dir]': 'asc',
+            })
+        self.assertEqual(respuesta.json()['recordsFiltered'], 5)
+
+    def test_filtros_con_ids_no_numericos(self):
+        # Un id mal formado deja el listado vacío en lugar de un error 500
+        respuesta = self.client.get(reverse('lista_causas_datos'), {'draw': 3, 'cartera_id': 'x'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((respuesta.json()['draw'], respuesta.json()['recordsFiltered'], respuesta.json()['data']),
+                         (3, 0, []))
+        respuesta = self.client.get(reverse('api_causas'), {'etapa_id': '1 OR 1=1'})
+        self.assertEqual((respuesta.status_code, respuesta.json()['resultados']), (200, []))
+
+    def test_exportar_causas(self):
+        for causa in self.causas:
+            self.agregar_historial(causa, 2)
+        # sesión, usuario y una sola consulta para todas las filas
+        with self.assertNumQueries(3):
+            respuesta = self.client.get(reverse('exportar_causas'), {'estado': 'ACTIVO'})
+            contenido = b''.join(respuesta.streaming_content).decode('utf-8-sig')
+        lineas = contenido.splitlines()
+        self.assertEqual(len(lineas), 6)
+        self.assertIn('C-4-2024,,Activo,Banco Ejemplo,11111114-1,Nombre 4,Apellido', lineas[1])
+        self.assertIn('Notificación', lineas[1])
+
+    def test_detalle_causa_no_crece_con_el_historial(self):
+        url = reverse('detalle_causa', args=[self.causa.pk])
+        # sesión, usuario, causa (con sus uno-a-uno), etapas, adjuntos,
+        # comentarios y las opciones del formulario de etapas; la primera vez,
+        # también la versión del catálogo de etapas, que después queda en caché
+        self.agregar_historial(self.causa, 1)
+        with self.assertNumQueries(8):
+            self.client.get(url)
+        self.agregar_historial(self.causa, 10)
+        with self.assertNumQueries(7):
+            respuesta = self.client.get(url)
+        self.assertContains(respuesta, 'escrito9')
+
+    def test_detalle_causa_en_cache(self):
+        url = reverse('detalle_causa', args=[self.causa.pk])
+        self.agregar_historial(self.causa, 3)
+        self.client.get(url)
+        # Con las pestañas en caché: sesión, usuario, causa y opciones del formulario
+        with self.assertNumQueries(4):
+            self.client.get(url)
+
+    def test_detalle_causa_sin_antecedentes(self):
+        url = reverse('detalle_causa', args=[self.causas[1].pk])
+        # Sin etapas no hay adjuntos que precargar (sí la versión del catálogo, sin caché)
+        with self.assertNumQueries(7):
+            respuesta = self.client.get(url)
+        self.assertContains(respuesta, 'No hay antecedentes de Leasing o CBR')
+
+    def test_crear_causa(self):
+        # Las opciones de abogado, deudor, tribunal y cartera
+        with self.assertNumQueries(4):
+            self.client.get(reverse('crear_causa'))
+
+    def test_editar_causa(self):
+        # La causa y las opciones de sus cuatro relaciones
+        with self.assertNumQueries(5):
+            self.client.get(reverse('editar_causa', args=[self.causa.pk]))
+
+    def test_eliminar_causa(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('eliminar_causa', args=[self.causa.pk]))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS)
+class EtapaActualTests(DatosDePruebaMixin, TestCase):
+
+    def test_se_actualiza_con_el_historial(self):
+        primera = EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 1, 1))
+        segunda = EtapaCausa.objects.create(causa=self.causa, etapa=self.notificacion, fecha=datetime.date(2024, 2, 1))
+        self.causa.refresh_from_db()
+        self.assertEqual(self.causa.etapa_actual, 'Notificación')
+        self.assertEqual(self.causa.fecha_ultima_etapa, segunda.fecha)
+
+        segunda.delete()
+        self.causa.refresh_from_db()
+        self.assertEqual(self.causa.etapa_actual, 'Demanda')
+
+        primera.delete()
+        self.causa.refresh_from_db()
+        self.assertEqual(self.causa.etapa_actual, 'Sin Etapas Registradas')
+
+    def test_recalcular_etapas(self):
+        self.agregar_historial(self.causa, 3)
+        Causa.objects.update(ultima_etapa=None, fecha_ultima_etapa=None)
+        url = reverse('detalle_causa', args=[self.causa.pk])
+        self.assertContains(self.client.get(url), 'Sin Etapas Registradas')
+        self.causa.refresh_from_db()
+        revision, modificada = self.causa.revision, self.causa.fecha_modificacion
+        call_command('recalcular_etapas', stdout=StringIO())
+        self.causa.refresh_from_db()
+        self.assertEqual(self.causa.fecha_ultima_etapa, datetime.date(2024, 1, 3))
+        # La página en caché se renueva
+        self.assertEqual(self.causa.revision, revision + 1)
+        self.assertGreater(self.causa.fecha_modificacion, modificada)
+        self.assertNotContains(self.client.get(url), 'Sin Etapas Registradas')
+
+
+class PlanesDeConsultaTests(DatosDePruebaMixin, TestCase):
+
+    def test_consultas_usan_indices(self):
+        # Con historial también se revisan los adjuntos que precargan el detalle y la API
+        self.agregar_historial(self.causas[2], 2)
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('verificar_planes', stdout=StringIO())
+        self.assertTrue([c['sql'] for c in consultas.captured_queries
+                         if c['sql'].startswith('SELECT "causas_archivoadjunto"')])
+
+    def test_falla_con_una_consulta_sin_indice(self):
+        # Las consultas de las vistas vienen de las mismas funciones que usan las vistas
+        def sin_indice(causa_id, cartera_id):
+            list(listado.pagina_causas(listado.filtrar_causas({}), ['deudor__apellidos'], 0, 25))
+        with mock.patch.dict(verificar_planes.VISTAS, {'lista_causas_datos': sin_indice}):
+            with self.assertRaisesMessage(CommandError, 'sin índice'):
+                call_command('verificar_planes', stdout=StringIO(), stderr=StringIO())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS)
+class BusquedaTests(DatosDePruebaMixin, TestCase):
+
+    def test_busca_por_rol_rut_y_texto_del_historial(self):
+        EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 1, 1),
+                                  descripcion='Se notifica personalmente al <b>ejecutado</b>')
+        Comentario.objects.create(causa=self.causas[2], autor=self.usuario, texto='Llamar al receptor judicial')
+
+        self.assertEqual([r['rol'] for r in busqueda.buscar('C-3')], ['C-3-2024'])
+        self.assertEqual([r['rol'] for r in busqueda.buscar('11111114')], ['C-4-2024'])
+        self.assertEqual([r['tipo'] for r in busqueda.buscar('receptor')], ['comentario'])
+
+        resultado, = busqueda.buscar('ejecutado')
+        self.assertEqual(resultado['causa_id'], self.causa.pk)
+        self.assertIn('<mark>ejecutado</mark>', resultado['fragmento'])
+        self.assertIn('&lt;b&gt;', resultado['fragmento'])
+
+    def test_mantiene_el_indice_al_borrar_y_editar(self):
+        comentario = Comentario.objects.create(causa=self.causa, autor=self.usuario, texto='embargo trabado')
+        self.assertEqual(len(busqueda.buscar('embargo')), 1)
+        comentario.delete()
+        self.assertEqual(busqueda.buscar('embargo'), [])
+
+        deudor = self.causa.deudor
+        deudor.apellidos = 'Zamorano'
+        deudor.save()
+        self.assertEqual([r['rol'] for r in busqueda.buscar('zamorano')], ['C-0-2024'])
+
+    def test_borra_por_rowid_sin_recorrer_el_indice(self):
+        if not busqueda.fts_disponible():
+            self.skipTest("SQLite sin FTS5")
+        with CaptureQueriesContext(connection) as consultas:
+            self.causa.save()
+            comentario = Comentario.objects.create(causa=self.causa, autor=self.usuario, texto='embargo')
+            comentario.delete()
+            self.causa.deudor.save()
+        borrados = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith(f'DELETE FROM {busqueda.TABLA}')]
+        self.assertEqual(len(borrados), 4)
+        with connection.cursor() as cursor:
+            for sql in borrados:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [str(fila[-1]) for fila in cursor.fetchall()]
+                # FTS5 marca con '=' la búsqueda por rowid; sin restricción recorre toda la tabla
+                self.assertTrue(plan[0].endswith(':='), plan)
+                self.assertFalse([paso for paso in plan[1:] if paso.startswith('SCAN')], plan)
+        self.assertEqual([r['rol'] for r in busqueda.buscar('C-0')], ['C-0-2024'])
+        self.assertEqual(busqueda.buscar('embargo'), [])
+
+    def test_vista_de_busqueda(self):
+        respuesta = self.client.get(reverse('buscar_causas'), {'q': 'nombre 2'})
+        self.assertContains(respuesta, 'C-2-2024')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS)
+class AdjuntosDeduplicadosTests(DatosDePruebaMixin, TestCase):
+
+    def adjuntar(self, nombre, contenido):
+        etapa = EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 1, 1))
+        return ArchivoAdjunto.objects.create(etapa_causa=etapa, archivo=SimpleUploadedFile(nombre, contenido))
+
+    def test_un_archivo_por_contenido(self):
+        primero = self.adjuntar('Poder.PDF', b'%PDF-1.4 poder')
+        segundo = self.adjuntar('poder (1).pdf', b'%PDF-1.4 poder')
+        distinto = self.adjuntar('contrato.pdf', b'%PDF-1.4 contrato')
+
+        self.assertEqual(primero.archivo.name, segundo.archivo.name)
+        self.assertNotEqual(primero.archivo.name, distinto.archivo.name)
+        self.assertRegex(primero.archivo.name, r'^adjuntos_causas/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$')
+        self.assertEqual(segundo.nombre_visible, 'poder (1).pdf')
+
+    def test_borra_el_archivo_con_la_ultima_referencia(self):
+        primero = self.adjuntar('poder.pdf', b'%PDF-1.4 poder')
+        segundo = self.adjuntar('poder.pdf', b'%PDF-1.4 poder')
+        almacenamiento = primero.archivo.storage
+        nombre = primero.archivo.name
+
+        self.assertEqual(ArchivoAlmacenado.objects.get(pk=nombre).referencias, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            primero.delete()
+        self.assertTrue(almacenamiento.exists(nombre))
+        self.assertEqual(ArchivoAlmacenado.objects.get(pk=nombre).referencias, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            segundo.delete()
+        self.assertFalse(almacenamiento.exists(nombre))
+        self.assertFalse(ArchivoAlmacenado.objects.filter(pk=nombre).exists())
+
+    def test_reescribe_el_archivo_borrado_mientras_se_guardaba(self):
+        primero = self.adjuntar('poder.pdf', b'%PDF-1.4 poder')
+        almacenamiento, nombre = primero.archivo.storage, primero.archivo.name
+        existe = almacenamiento.exists
+
+        def otro_proceso_libera_el_archivo(buscado):
+            # Justo después de que el guardado ve el archivo en disco, se borra
+            # la última fila que lo usaba y con ella el archivo
+            encontrado = existe(buscado)
+            if encontrado and primero.pk is not None:
+                with self.captureOnCommitCallbacks(execute=True):
+                    primero.delete()
+            return encontrado
+
+        with mock.patch.object(almacenamiento, 'exists', otro_proceso_libera_el_archivo):
+            segundo = self.adjuntar('poder (1).pdf', b'%PDF-1.4 poder')
+        self.assertEqual(segundo.archivo.name, nombre)
+        self.assertTrue(almacenamiento.exists(nombre))
+        self.assertEqual(ArchivoAlmacenado.objects.get(pk=nombre).referencias, 1)
+
+
+def docx_de_prueba(*parrafos):
+    """Arma un .docx mínimo con los párrafos indicados."""
+    ns = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+    cuerpo = ''.join(f'<w:p><w:r><w:t>{p}</w:t></w:r></w:p>' for p in parrafos)
+    contenido = BytesIO()
+    with zipfile.ZipFile(contenido, 'w') as docx:
+        docx.writestr('word/document.xml', f'<w:document xmlns:w="{ns}"><w:body>{cuerpo}</w:body></w:document>')
+        docx.writestr('docProps/app.xml', '<Properties><Pages>2</Pages></Properties>')
+    return contenido.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS, CAUSAS_EXTRAER_EN_SEGUNDO_PLANO=False)
+class ExtraccionDeTextoTests(DatosDePruebaMixin, TestCase):
+
+    def test_extrae_docx_y_alimenta_la_busqueda(self):
+        etapa = EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 1, 1))
+        adjunto = ArchivoAdjunto.objects.create(etapa_causa=etapa, archivo=SimpleUploadedFile(
+            'escrito.docx', docx_de_prueba('Téngase presente', 'mandato judicial amplio')))
+        self.assertEqual(adjunto.estado_extraccion, ArchivoAdjunto.EstadoExtraccion.PENDIENTE)
+
+        extraccion.procesar(adjunto.archivo.name)
+        adjunto.refresh_from_db()
+        self.assertEqual(adjunto.estado_extraccion, ArchivoAdjunto.EstadoExtraccion.LISTO)
+        self.assertEqual(adjunto.paginas, 2)
+        self.assertIn('mandato judicial', adjunto.texto_extraido)
+        self.assertEqual([r['tipo'] for r in busqueda.buscar('mandato')], ['adjunto'])
+
+    def test_duplicado_reutiliza_el_resultado(self):
+        etapa = EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 1, 1))
+        contenido = docx_de_prueba('poder especial')
+        primero = ArchivoAdjunto.objects.create(etapa_causa=etapa, archivo=SimpleUploadedFile('a.docx', contenido))
+        extraccion.procesar(primero.archivo.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            segundo = ArchivoAdjunto.objects.create(etapa_causa=etapa, archivo=SimpleUploadedFile('b.docx', contenido))
+        segundo.refresh_from_db()
+        self.assertEqual(segundo.texto_extraido, 'poder especial')
+
+    def test_formato_no_soportado(self):
+        etapa = EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 1, 1))
+        adjunto = ArchivoAdjunto.objects.create(etapa_causa=etapa, archivo=SimpleUploadedFile('foto.jpg', b'JPEG'))
+        extraccion.procesar(adjunto.archivo.name)
+        adjunto.refresh_from_db()
+        self.assertEqual(adjunto.estado_extraccion, ArchivoAdjunto.EstadoExtraccion.NO_SOPORTADO)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS, CAUSAS_EXTRAER_EN_SEGUNDO_PLANO=False, CAUSAS_TAMANO_MAXIMO_PARTE=4)
+class SubidasPorPartesTests(DatosDePruebaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.etapa = EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 1, 1))
+
+    def parte(self, subida, numero, contenido):
+        url = reverse('subir_parte', args=[subida['id'], numero])
+        return self.client.put(url, contenido, content_type='application/octet-stream')
+
+    def test_subida_reanudable(self):
+        subida = self.client.post(reverse('iniciar_subida'), {
+            'etapa_causa': self.etapa.pk, 'nombre': 'expediente.pdf', 'tamano': 10,
+        }).json()
+        self.assertEqual(self.parte(subida, 0, b'%PDF').json()['recibido'], 4)
+        # Reenviar una parte ya recibida no la duplica
+        self.assertEqual(self.parte(subida, 0, b'%PDF').json()['recibido'], 4)
+        # Saltarse una parte se rechaza indicando cuál se espera
+        respuesta = self.parte(subida, 2, b'-1.4')
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.json()['siguiente_parte'], 1)
+        # Una parte mayor que el máximo permitido se rechaza
+        self.assertEqual(self.parte(subida, 1, b'-1.4 x').status_code, 413)
+
+        self.parte(subida, 1, b'-1.4')
+        self.assertEqual(self.client.post(reverse('completar_subida', args=[subida['id']])).status_code, 409)
+        self.parte(subida, 2, b' x')
+        respuesta = self.client.post(reverse('completar_subida', args=[subida['id']]))
+        self.assertEqual(respuesta.status_code, 201)
+
+        adjunto = ArchivoAdjunto.objects.get(pk=respuesta.json()['adjunto'])
+        self.assertEqual(adjunto.etapa_causa, self.etapa)
+        self.assertEqual(adjunto.nombre_visible, 'expediente.pdf')
+        with adjunto.archivo.open() as archivo:
+            self.assertEqual(archivo.read(), b'%PDF-1.4 x')
+        self.assertFalse(SubidaParcial.objects.exists())
+
+    def test_parte_recibida_fuera_de_la_transaccion(self):
+        subida = SubidaParcial.objects.create(etapa_causa=self.etapa, usuario=self.usuario, nombre='a.pdf', tamano=8)
+        profundidad = len(connection.atomic_blocks)
+        durante = []
+
+        class Cuerpo(BytesIO):
+            def read(cuerpo, *args):
+                durante.append(len(connection.atomic_blocks))
+                return super().read(*args)
+
+        subidas.agregar_parte(subida.pk, 0, Cuerpo(b'%PDF'))
+        # Mientras llegan los bytes no hay una transacción nuestra abierta
+        self.assertEqual(set(durante), {profundidad})
+        subida.refresh_from_db()
+        self.assertEqual((subida.recibido, subida.siguiente_parte), (4, 1))
+
+    def test_parte_agregada_por_otro_intento(self):
+        subida = SubidaParcial.objects.create(etapa_causa=self.etapa, usuario=self.usuario, nombre='a.pdf', tamano=8)
+
+        class Cuerpo(BytesIO):
+            def read(cuerpo, *args):
+                # Un reintento paralelo completa la misma parte mientras esta se recibe
+                if not cuerpo.tell():
+                    subidas.agregar_parte(subida.pk, 0, BytesIO(b'%PDF'))
+                return super().read(*args)
+
+        subidas.agregar_parte(subida.pk, 0, Cuerpo(b'%PDF'))
+        subida.refresh_from_db()
+        self.assertEqual((subida.recibido, subida.siguiente_parte), (4, 1))
+        with open(subida.ruta_temporal, 'rb') as archivo:
+            self.assertEqual(archivo.read(), b'%PDF')
+        subidas.descartar(subida)
+
+    def test_solo_el_usuario_que_la_inicio(self):
+        subida = self.client.post(reverse('iniciar_subida'), {
+            'etapa_causa': self.etapa.pk, 'nombre': 'a.pdf', 'tamano': 4,
+        }).json()
+        otro = User.objects.create_user('otro', password='clave')
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(reverse('detalle_subida', args=[subida['id']])).status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS, CAUSAS_EXTRAER_EN_SEGUNDO_PLANO=False)
+class DescargaDeAdjuntosTests(DatosDePruebaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        etapa = EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 1, 1))
+        self.adjunto = ArchivoAdjunto.objects.create(
+            etapa_causa=etapa, archivo=SimpleUploadedFile('demanda.pdf', b'0123456789'))
+        self.url = reverse('descargar_adjunto', args=[self.adjunto.pk])
+
+    def test_descarga_completa_y_condicional(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(b''.join(respuesta.streaming_content), b'0123456789')
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertEqual(respuesta['Accept-Ranges'], 'bytes')
+        self.assertIn('demanda.pdf', respuesta['Content-Disposition'])
+
+        repetida = self.client.get(self.url, headers={'If-None-Match': respuesta['ETag']})
+        self.assertEqual(repetida.status_code, 304)
+        repetida = self.client.get(self.url, headers={'If-Modified-Since': respuesta['Last-Modified']})
+        self.assertEqual(repetida.status_code, 304)
+
+    def test_rangos(self):
+        respuesta = self.client.get(self.url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(respuesta.status_code, 206)
+        self.assertEqual(respuesta['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(respuesta.streaming_content), b'2345')
+
+        respuesta = self.client.get(self.url, headers={'Range': 'bytes=-3'})
+        self.assertEqual(b''.join(respuesta.streaming_content), b'789')
+
+        respuesta = self.client.get(self.url, headers={'Range': 'bytes=20-'})
+        self.assertEqual(respuesta.status_code, 416)
+
+        # Con If-Range de otra versión se entrega el archivo completo
+        respuesta = self.client.get(self.url, headers={'Range': 'bytes=2-5', 'If-Range': '"otra"'})
+        self.assertEqual(respuesta.status_code, 200)
+
+    @override_settings(CAUSAS_DESCARGAS_SERVIDOR='x-accel-redirect')
+    def test_traspaso_al_servidor_web(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta['X-Accel-Redirect'], '/protegido/' + self.adjunto.archivo.name)
+        self.assertEqual(respuesta.content, b'')
+
+    def test_requiere_sesion(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS, CAUSAS_EXTRAER_EN_SEGUNDO_PLANO=False)
+class RevisionDeCausaTests(DatosDePruebaMixin, TestCase):
+
+    def revision(self):
+        return Causa.objects.values_list('revision', flat=True).get(pk=self.causa.pk)
+
+    def test_sube_con_cada_cambio(self):
+        inicial = self.revision()
+        etapa = EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 1, 1))
+        ArchivoAdjunto.objects.create(etapa_causa=etapa, archivo=SimpleUploadedFile('a.pdf', b'a'))
+        Comentario.objects.create(causa=self.causa, autor=self.usuario, texto='hola')
+        self.causa.antecedentescbr.save()
+        self.causa.deudor.save()
+        self.causa.save()
+        self.assertEqual(self.revision(), inicial + 6)
+        self.assertEqual(self.causa.revision, inicial + 6)
+
+    def test_la_pagina_refleja_los_cambios(self):
+        url = reverse('detalle_causa', args=[self.causa.pk])
+        self.client.get(url)
+        Comentario.objects.create(causa=self.causa, autor=self.usuario, texto='Nuevo escrito presentado')
+        self.assertContains(self.client.get(url), 'Nuevo escrito presentado')
+
+    def test_la_pagina_refleja_el_nuevo_nombre_de_la_etapa(self):
+        EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 1, 1))
+        url = reverse('detalle_causa', args=[self.causa.pk])
+        self.assertContains(self.client.get(url), '<td>Demanda</td>')
+        self.demanda.nombre = 'Demanda ejecutiva'
+        self.demanda.save()
+        respuesta = self.client.get(url)
+        self.assertContains(respuesta, '<td>Demanda ejecutiva</td>')
+        self.assertContains(respuesta, 'Etapa Actual:</strong> Demanda ejecutiva')
+
+    def test_sube_al_renombrar_tribunal_cartera_o_abogado(self):
+        inicial = self.revision()
+        self.tribunal.nombre = 'Otro tribunal'
+        self.tribunal.save()
+        self.cartera.nombre = 'Otra cartera'
+        self.cartera.save(update_fields=['nombre'])
+        self.usuario.username = 'abogada'
+        self.usuario.save()
+        self.assertEqual(self.revision(), inicial + 3)
+        # Iniciar sesión sólo guarda el último ingreso
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.revision(), inicial + 3)
+
+
+class CostasAcumuladasTests(DatosDePruebaMixin, TestCase):
+
+    def totales(self, *causas):
+        return ([Causa.objects.values_list('total_costas', flat=True).get(pk=c.pk) for c in causas]
+                + [Cartera.objects.values_list('total_costas', flat=True).get(pk=self.cartera.pk)])
+
+    def test_deltas_por_etapa(self):
+        otra = self.causas[1]
+        etapa = EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda,
+                                          fecha=datetime.date(2024, 1, 1), costas=1000)
+        EtapaCausa.objects.create(causa=self.causa, etapa=self.notificacion,
+                                  fecha=datetime.date(2024, 2, 1), costas=500)
+        self.assertEqual(self.totales(self.causa, otra), [1500, 0, 1500])
+
+        etapa.costas = 700
+        etapa.save()
+        self.assertEqual(self.totales(self.causa, otra), [1200, 0, 1200])
+
+        # Mover el registro a otra causa traslada sus costas
+        etapa = EtapaCausa.objects.get(pk=etapa.pk)
+        etapa.causa = otra
+        etapa.save()
+        self.assertEqual(self.totales(self.causa, otra), [500, 700, 1200])
+
+        etapa.delete()
+        self.assertEqual(self.totales(self.causa, otra), [500, 0, 500])
+
+    def test_cambio_de_cartera(self):
+        EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda,
+                                  fecha=datetime.date(2024, 1, 1), costas=1000)
+        nueva = Cartera.objects.create(nombre='Otra cartera')
+        causa = Causa.objects.get(pk=self.causa.pk)
+        causa.cartera = nueva
+        causa.save()
+        self.assertEqual(self.totales(self.causa), [1000, 0])
+        self.assertEqual(Cartera.objects.get(pk=nueva.pk).total_costas, 1000)
+        # Guardar la causa no pisa el total con un valor desactualizado
+        self.causa.refresh_from_db(fields=['cartera'])
+        self.causa.save()
+        self.assertEqual(Causa.objects.get(pk=self.causa.pk).total_costas, 1000)
+
+    def test_conciliar_costas(self):
+        EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda,
+                                  fecha=datetime.date(2024, 1, 1), costas=1000)
+        Causa.objects.filter(pk=self.causa.pk).update(total_costas=3)
+        salida = StringIO()
+        call_command('conciliar_costas', stdout=salida)
+        self.assertIn('C-0-2024', salida.getvalue())
+        self.assertEqual(self.totales(self.causa), [3, 1000])
+
+        call_command('conciliar_costas', '--reparar', '--lote', '2', stdout=StringIO())
+        self.assertEqual(self.totales(self.causa), [1000, 1000])
+        salida = StringIO()
+        call_command('conciliar_costas', stdout=salida)
+        self.assertIn('cuadran', salida.getvalue())
+
+
+class ResumenDeCausasTests(DatosDePruebaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        reportes.reconstruir_resumen()
+
+    def foto(self):
+        return sorted(ResumenCausas.objects.values_list(
+            'cartera', 'estado_causa', 'etapa', 'tipo_etapa', 'tribunal', 'abogado_encargado',
+            'cantidad', 'total_costas'), key=repr)
+
+    def test_se_actualiza_por_porciones(self):
+        otra = Cartera.objects.create(nombre='Otra cartera')
+        with self.captureOnCommitCallbacks(execute=True):
+            EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda,
+                                      fecha=datetime.date(2024, 1, 1), costas=1000)
+            causa = Causa.objects.get(pk=self.causas[1].pk)
+            causa.estado_causa = Causa.EstadoCausa.SUSPENDIDO
+            causa.cartera = otra
+            causa.save()
+            self.causas[2].delete()
+        incremental = self.foto()
+        reportes.reconstruir_resumen()
+        self.assertEqual(incremental, self.foto())
+        self.assertIn((self.cartera.pk, 'ACTIVO', self.demanda.pk, self.demanda.tipo_etapa_id,
+                       self.tribunal.pk, self.usuario.pk, 1, 1000), incremental)
+        self.assertEqual(sum(fila[6] for fila in incremental), 4)
+
+    def test_cambios_de_una_causa_aplican_deltas_sin_agrupar(self):
+        otra = Cartera.objects.create(nombre='Otra cartera')
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            nueva = Causa.objects.create(rol='C-99-2024', deudor=self.causa.deudor, tribunal=self.tribunal,
+                                         cartera=self.cartera, estado_causa=Causa.EstadoCausa.ACTIVO)
+            etapa = EtapaCausa.objects.create(causa=nueva, etapa=self.demanda,
+                                              fecha=datetime.date(2024, 1, 1), costas=1000)
+            etapa.costas = 1500
+            etapa.save()
+            nueva.cartera = otra
+            nueva.save()
+            etapa.etapa = self.notificacion
+            etapa.save()
+            EtapaCausa.objects.create(causa=self.causas[1], etapa=self.demanda,
+                                      fecha=datetime.date(2024, 2, 1), costas=300).delete()
+        self.assertFalse([c['sql'] for c in consultas.captured_queries if 'GROUP BY' in c['sql']])
+        incremental = self.foto()
+        reportes.reconstruir_resumen()
+        self.assertEqual(incremental, self.foto())
+        self.assertIn((otra.pk, 'ACTIVO', self.notificacion.pk, self.notificacion.tipo_etapa_id,
+                       self.tribunal.pk, None, 1, 1500), incremental)
+        self.assertEqual(sum(fila[6] for fila in incremental), 6)
+
+    def test_borrar_cartera_o_abogado_recalcula_sus_porciones(self):
+        # Las causas quedan sin cartera ni abogado sin pasar por las señales de Causa
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cartera.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.delete()
+        incremental = self.foto()
+        reportes.reconstruir_resumen()
+        self.assertEqual(incremental, self.foto())
+        self.assertEqual([(fila[0], fila[5], fila[6]) for fila in incremental], [(None, None, 5)])
+
+    def test_reporte_y_desglose(self):
+        with self.assertNumQueries(4):
+            respuesta = self.client.get(reverse('reporte_causas'), {'estado': 'ACTIVO', 'por': 'cartera'})
+        self.assertContains(respuesta, 'Banco Ejemplo')
+        self.assertEqual(respuesta.context['filas'][0]['cantidad'], 5)
+        # La fila enlaza al desglose de esa cartera por la dimensión siguiente
+        self.assertEqual(respuesta.context['filas'][0]['enlace'],
+                         f'?estado=ACTIVO&cartera={self.cartera.pk}&por=tipo_etapa')
+
+        respuesta = self.client.get(reverse('reporte_causas'), {'cartera': reportes.SIN_VALOR, 'por': 'estado'})
+        self.assertEqual(respuesta.context['filas'], [])
+
+    def test_el_dashboard_enlaza_al_reporte(self):
+        self.assertContains(self.client.get(reverse('dashboard')), reverse('reporte_causas'))
+
+
+class AnalisisDeEtapasTests(DatosDePruebaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        inicio = datetime.date(2024, 1, 1)
+        # Causa 0: Demanda 10 días, Notificación 30 días, Demanda en curso
+        for dias, etapa in [(0, self.demanda), (10, self.notificacion), (40, self.demanda)]:
+            EtapaCausa.objects.create(causa=self.causa, etapa=etapa, fecha=inicio + datetime.timedelta(days=dias))
+        # Causa 1, sin tribunal: Demanda 20 días, Notificación en curso
+        Causa.objects.filter(pk=self.causas[1].pk).update(tribunal=None)
+        for dias, etapa in [(0, self.demanda), (20, self.notificacion)]:
+            EtapaCausa.objects.create(causa=self.causas[1], etapa=etapa, fecha=inicio + datetime.timedelta(days=dias))
+
+    def test_calculo_sin_numpy(self):
+        crudo = analitica.calcular(analitica.cargar_historial(), usar_numpy=False)
+        self.assertEqual(crudo['por_etapa'][self.demanda.pk], (2, 15.0, 15.0, 19.0))
+        self.assertEqual(crudo['por_etapa'][self.notificacion.pk], (1, 30.0, 30.0, 30.0))
+        self.assertEqual(crudo['por_tribunal'][0], (1, 20.0, 20.0, 20.0))
+        self.assertEqual(crudo['en_curso'], {self.demanda.pk: 1, self.notificacion.pk: 1})
+        # Transiciones en enero (2) y febrero (1) de 2024
+        self.assertEqual(crudo['por_mes'], {2024 * 12: 2, 2024 * 12 + 1: 1})
+
+    @skipUnless(analitica.numpy, "NumPy no está instalado")
+    def test_numpy_coincide(self):
+        historial = analitica.cargar_historial()
+        self.assertEqual(analitica.calcular(historial, usar_numpy=True),
+                         analitica.calcular(historial, usar_numpy=False))
+
+    def test_vista_por_cartera_en_cache(self):
+        url = reverse('analisis_etapas')
+        respuesta = self.client.get(url, {'cartera_id': self.cartera.pk})
+        analisis = respuesta.context['analisis']
+        self.assertEqual(analisis['registros'], 5)
+        # Empatan en mediana (20 días): primero el tribunal con más etapas
+        self.assertEqual([fila['nombre'] for fila in analisis['por_tribunal']],
+                         [self.tribunal.nombre, '(sin asignar)'])
+        self.assertEqual(analisis['por_mes'], [{'mes': '2024-01', 'transiciones': 2},
+                                               {'mes': '2024-02', 'transiciones': 1}])
+        # La segunda vez sale de la caché: sólo sesión, usuario y carteras
+        with self.assertNumQueries(3):
+            self.client.get(url, {'cartera_id': self.cartera.pk})
+        self.assertEqual(self.client.get(url, {'cartera_id': 999}).context['analisis']['registros'], 0)
+
+
+class AuditoriaDeCausasTests(DatosDePruebaMixin, TestCase):
+
+    def datos_formulario(self, **cambios):
+        datos = {
+            'rol': self.causa.rol, 'operacion': '', 'estado_causa': self.causa.estado_causa, 'arbitro': '',
+            'abogado_encargado': self.usuario.pk, 'fecha_asignacion': '', 'deudor': self.causa.deudor_id,
+            'tribunal': self.tribunal.pk, 'cartera': self.cartera.pk, 'update_causa': '1',
+        }
+        datos.update(cambios)
+        return datos
+
+    def test_registra_quien_cambio_cada_campo(self):
+        otro = User.objects.create_user('procurador')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('editar_causa', args=[self.causa.pk]),
+                             self.datos_formulario(estado_causa='SUSPENDIDO', abogado_encargado=otro.pk))
+        self.assertEqual(auditoria.vaciar(), 2)
+        cambios = {c.campo: c for c in CambioCausa.objects.filter(causa=self.causa)}
+        self.assertEqual(set(cambios), {'estado_causa', 'abogado_encargado'})
+        self.assertEqual((cambios['estado_causa'].valor_anterior, cambios['estado_causa'].valor_nuevo),
+                         ('ACTIVO', 'SUSPENDIDO'))
+        self.assertEqual(cambios['abogado_encargado'].usuario, self.usuario)
+
+        # Guardar sin cambios no registra nada
+        with self.captureOnCommitCallbacks(execute=True):
+            Causa.objects.get(pk=self.causa.pk).save()
+        self.assertEqual(auditoria.pendientes(), 0)
+
+        respuesta = self.client.get(reverse('cambios_causa', args=[self.causa.pk]))
+        self.assertContains(respuesta, 'Suspendido')
+        self.assertContains(respuesta, 'procurador')
+
+    @override_settings(CAUSAS_AUDITORIA_LOTE=3)
+    def test_se_escriben_en_lotes(self):
+        for estado in ['SUSPENDIDO', 'ARCHIVADO']:
+            with self.captureOnCommitCallbacks(execute=True):
+                causa = Causa.objects.get(pk=self.causa.pk)
+                causa.estado_causa = estado
+                causa.save()
+        self.assertEqual((auditoria.pendientes(), CambioCausa.objects.count()), (2, 0))
+        causa.arbitro = 'Juez'
+        # El tercer registro completa el lote: un solo INSERT para los tres
+        with CaptureQueriesContext(connection) as consultas:
+            with self.captureOnCommitCallbacks(execute=True):
+                causa.save()
+        inserciones = [c for c in consultas.captured_queries if 'INSERT INTO "causas_cambiocausa"' in c['sql']]
+        self.assertEqual(len(inserciones), 1)
+        self.assertEqual((auditoria.pendientes(), CambioCausa.objects.count()), (0, 3))
+
+    def test_linea_de_tiempo(self):
+        CambioCausa.objects.bulk_create([
+            CambioCausa(causa=self.causa, usuario=self.usuario, campo='abogado_encargado', fecha=timezone.now(),
+                        valor_anterior=None, valor_nuevo=str(self.usuario.pk)),
+            CambioCausa(causa=self.causa, campo='cartera', fecha=timezone.now(),
+                        valor_anterior=str(self.cartera.pk), valor_nuevo=None),
+        ])
+        # Sesión, usuario, causa, conteo, cambios y una consulta por modelo relacionado
+        with self.assertNumQueries(7):
+            respuesta = self.client.get(reverse('cambios_causa', args=[self.causa.pk]))
+        self.assertContains(respuesta, 'Banco Ejemplo')
+        self.assertContains(respuesta, '(sistema)')
+
+
+@tareas.tipo_de_tarea('falla_en_pruebas')
+def _tarea_que_falla(tarea):
+    raise RuntimeError("Falla a propósito")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS, CAUSAS_TAREAS_ESPERA_REINTENTO=10)
+class TareasTests(DatosDePruebaMixin, TestCase):
+    def test_exportacion_en_segundo_plano(self):
+        respuesta = self.client.post(reverse('crear_tarea'), {'tipo': 'exportar_causas', 'estado': 'ACTIVO'})
+        self.assertEqual(respuesta.status_code, 202)
+        tarea_id = respuesta.json()['id']
+        self.assertEqual(respuesta.json()['estado'], Tarea.Estado.PENDIENTE)
+
+        self.assertEqual(tareas.tomar(5, 'prueba'), [tarea_id])
+        # Ya tomada: otro trabajador no la recibe
+        self.assertEqual(tareas.tomar(5, 'otro'), [])
+        self.assertTrue(tareas.ejecutar(tarea_id))
+
+        estado = self.client.get(respuesta.json()['url']).json()
+        self.assertEqual((estado['estado'], estado['progreso'], estado['total'], estado['porcentaje']),
+                         (Tarea.Estado.LISTA, 5, 5, 100))
+        descarga = self.client.get(estado['descarga'])
+        contenido = b''.join(descarga.streaming_content).decode('utf-8-sig')
+        self.assertEqual(len(contenido.strip().splitlines()), 6)
+        self.assertIn('C-4-2024', contenido)
+
+    def test_reintentos_con_espera_creciente(self):
+        tarea = tareas.encolar('falla_en_pruebas', max_intentos=2)
+        tareas.tomar(1, 'prueba')
+        with self.assertLogs('causas.tareas', 'ERROR'):
+            self.assertFalse(tareas.ejecutar(tarea.pk))
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), (Tarea.Estado.PENDIENTE, 1))
+        self.assertIn('Falla a propósito', tarea.error)
+        # Todavía no toca reintentarla
+        self.assertEqual(tareas.tomar(1, 'prueba'), [])
+
+        Tarea.objects.filter(pk=tarea.pk).update(ejecutar_desde=timezone.now())
+        tareas.tomar(1, 'prueba')
+        with self.assertLogs('causas.tareas', 'ERROR'):
+            self.assertFalse(tareas.ejecutar(tarea.pk))
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), (Tarea.Estado.ERROR, 2))
+        self.assertEqual(tareas.espera_reintento(3), datetime.timedelta(seconds=40))
+
+    def test_recupera_tareas_sin_latido(self):
+        tarea = tareas.encolar('reconstruir_resumen')
+        tareas.tomar(1, 'caido')
+        Tarea.objects.filter(pk=tarea.pk).update(latido=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(tareas.recuperar_abandonadas(), 1)
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.trabajador), (Tarea.Estado.PENDIENTE, ''))
+
+    def test_permisos(self):
+        otro = User.objects.create_user('procurador', password='clave')
+        tarea = tareas.encolar('exportar_causas', usuario=self.usuario)
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(reverse('estado_tarea', args=[tarea.pk])).status_code, 404)
+        # Las tareas de mantención son sólo para el personal
+        respuesta = self.client.post(reverse('crear_tarea'), {'tipo': 'reconstruir_resumen'})
+        self.assertEqual(respuesta.status_code, 403)
+        respuesta = self.client.post(reverse('crear_tarea'), {'tipo': 'desconocida'})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS)
+class TrabajadorDeTareasTests(TransactionTestCase):
+    def test_procesa_la_cola_en_hilos(self):
+        Cartera.objects.create(nombre='Banco Ejemplo')
+        pendientes = [tareas.encolar('reconstruir_resumen') for _ in range(3)]
+        salida = StringIO()
+        # Un solo hilo: la base en memoria de las pruebas bloquea las tablas entre conexiones
+        call_command('procesar_tareas', una_vez=True, hilos=1, stdout=salida)
+        self.assertIn('Tareas ejecutadas: 3, con error: 0.', salida.getvalue())
+        self.assertEqual(Tarea.objects.filter(pk__in=[t.pk for t in pendientes], estado=Tarea.Estado.LISTA).count(), 3)
+
+
+class AccionesMasivasTests(DatosDePruebaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        reportes.reconstruir_resumen()
+
+    def foto_resumen(self):
+        return sorted(ResumenCausas.objects.values_list(
+            'cartera', 'estado_causa', 'etapa', 'tribunal', 'abogado_encargado', 'cantidad', 'total_costas'), key=repr)
+
+    def accion(self, **datos):
+        return self.client.post(reverse('acciones_causas'), datos)
+
+    def test_cambio_de_estado(self):
+        marcadas = [causa.pk for causa in self.causas[:3]]
+        revisiones = dict(Causa.objects.values_list('id', 'revision'))
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.accion(accion='estado', estado_causa='SUSPENDIDO', causas=marcadas)
+        self.assertEqual(respuesta.json(), {'seleccionadas': 3, 'actualizadas': 3})
+        self.assertEqual(Causa.objects.filter(estado_causa='SUSPENDIDO').count(), 3)
+        self.assertEqual({causa_id: revision - revisiones[causa_id]
+                          for causa_id, revision in Causa.objects.values_list('id', 'revision')},
+                         {causa.pk: int(causa.pk in marcadas) for causa in self.causas})
+        # Auditoría, indicadores y resumen, como al editar cada causa
+        auditoria.vaciar()
+        self.assertEqual(CambioCausa.objects.filter(campo='estado_causa', valor_nuevo='SUSPENDIDO',
+                                                    usuario=self.usuario).count(), 3)
+        self.assertEqual(self.client.get(reverse('dashboard')).context['causas_suspendidas'], 3)
+        incremental = self.foto_resumen()
+        reportes.reconstruir_resumen()
+        self.assertEqual(incremental, self.foto_resumen())
+
+        # Las que ya estaban en ese estado no se tocan
+        respuesta = self.accion(accion='estado', estado_causa='SUSPENDIDO', causas=marcadas)
+        self.assertEqual(respuesta.json()['actualizadas'], 0)
+
+    def test_consultas_no_crecen_con_la_seleccion(self):
+        def consultas(causas):
+            with CaptureQueriesContext(connection) as capturadas:
+                self.accion(accion='abogado', abogado_encargado='', causas=[causa.pk for causa in causas])
+            return len(capturadas)
+        self.assertEqual(consultas(self.causas[:2]), consultas(self.causas[2:]))
+        self.assertFalse(Causa.objects.filter(abogado_encargado__isnull=False).exists())
+
+    def test_muchas_causas_en_pocas_consultas(self):
+        otro_tribunal = Tribunal.objects.create(nombre='Otro tribunal')
+        Causa.objects.bulk_create([
+            Causa(rol=f'C-{numero}-2025', deudor=self.causa.deudor, cartera=self.cartera,
+                  tribunal=otro_tribunal if numero % 2 else self.tribunal, abogado_encargado=self.usuario,
+                  estado_causa=Causa.EstadoCausa.ACTIVO)
+            for numero in range(1000, 1000 + 2 * acciones.LOTE)
+        ])
+        reportes.reconstruir_resumen()
+        ids = list(Causa.objects.values_list('id', flat=True))
+        for accion, maximo in [(lambda: acciones.cambiar_estado(ids, 'SUSPENDIDO'), 40),
+                               (lambda: acciones.registrar_etapa(ids, self.demanda, datetime.date(2024, 1, 1),
+                                                                 costas=10), 50)]:
+            with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+                accion()
+            # Unas pocas sentencias por lote de causas, por cada 100 cambios auditados y por
+            # fila del resumen afectada, sin recalcular porciones
+            self.assertLessEqual(len(consultas), maximo)
+            self.assertFalse([c['sql'] for c in consultas.captured_queries if 'GROUP BY' in c['sql']])
+        incremental = self.foto_resumen()
+        reportes.reconstruir_resumen()
+        self.assertEqual(incremental, self.foto_resumen())
+        self.assertEqual(sum(fila[5] for fila in incremental), len(ids))
+
+    def test_reasignar_todas_las_del_filtro(self):
+        otro = User.objects.create_user('procurador')
+        Causa.objects.filter(pk=self.causa.pk).update(estado_causa='ARCHIVADO')
+        respuesta = self.accion(accion='abogado', abogado_encargado=otro.pk, seleccion='filtro', estado='ACTIVO')
+        self.assertEqual(respuesta.json(), {'seleccionadas': 4, 'actualizadas': 4})
+        self.assertEqual(Causa.objects.filter(abogado_encargado=otro).count(), 4)
+
+    def test_registro_de_etapa(self):
+        EtapaCausa.objects.create(causa=self.causas[1], etapa=self.demanda,
+                                  fecha=datetime.date(2024, 6, 1), costas=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.accion(accion='etapa', causas=[c.pk for c in self.causas[:3]],
+                                    etapa=self.notificacion.pk, fecha='2024-03-01', costas=500)
+        self.assertEqual(respuesta.json()['actualizadas'], 3)
+        causas = Causa.objects.in_bulk([c.pk for c in self.causas[:3]])
+        self.assertEqual(causas[self.causa.pk].ultima_etapa, self.notificacion)
+        # La causa con una etapa posterior la conserva como etapa actual
+        self.assertEqual(causas[self.causas[1].pk].ultima_etapa, self.demanda)
+        self.assertEqual([causas[c.pk].total_costas for c in self.causas[:3]], [500, 600, 500])
+        self.assertEqual(Cartera.objects.get(pk=self.cartera.pk).total_costas, 1600)
+        incremental = self.foto_resumen()
+        reportes.reconstruir_resumen()
+        self.assertEqual(incremental, self.foto_resumen())
+
+        # Sin fecha no se registra nada
+        respuesta = self.accion(accion='etapa', causas=[self.causa.pk], etapa=self.notificacion.pk)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(EtapaCausa.objects.count(), 4)
+
+    def test_requiere_permiso(self):
+        self.client.force_login(User.objects.create_user('visita'))
+        respuesta = self.accion(accion='estado', estado_causa='SUSPENDIDO', causas=[self.causa.pk])
+        self.assertEqual(respuesta.status_code, 403)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS, CAUSAS_METRICAS_TOKEN='secreto')
+class MetricasTests(DatosDePruebaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        metricas.reiniciar()
+
+    def test_server_timing(self):
+        url = reverse('detalle_causa', args=[self.causa.pk])
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        cabecera = respuesta['Server-Timing']
+        self.assertIn(f'desc="{len(consultas)} consultas"', cabecera)
+        self.assertRegex(cabecera, r'plantillas;dur=\d+\.\d, total;dur=\d+\.\d')
+        self.assertIn(f'respuesta;desc="{len(respuesta.content)} bytes"', cabecera)
+
+    def test_histogramas_por_vista(self):
+        for _ in range(2):
+            self.client.get(reverse('lista_causas'))
+        texto = self.client.get(reverse('metricas')).content.decode()
+        self.assertIn('causas_peticiones_total{vista="lista_causas",estado="200"} 2', texto)
+        self.assertIn('# TYPE causas_peticion_consultas histogram', texto)
+        # Cuatro consultas por petición (sin filtro de cartera): caen en el bucket 5 y los siguientes
+        self.assertIn('causas_peticion_consultas_bucket{vista="lista_causas",le="2"} 0', texto)
+        self.assertIn('causas_peticion_consultas_bucket{vista="lista_causas",le="5"} 2', texto)
+        self.assertIn('causas_peticion_consultas_bucket{vista="lista_causas",le="+Inf"} 2', texto)
+        self.assertIn('causas_peticion_consultas_sum{vista="lista_causas"} 8', texto)
+
+    def test_solo_personal(self):
+        self.client.force_login(User.objects.create_user('procurador'))
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+        self.client.logout()
+        respuesta = self.client.get(reverse('metricas'), headers={'Authorization': 'Bearer secreto'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS)
+class PaginacionPorCursorTests(DatosDePruebaMixin, TestCase):
+
+    def recorrer(self, url, **parametros):
+        """Sigue los enlaces 'siguiente' y devuelve los ids de todas las páginas."""
+        ids, respuesta = [], self.client.get(url, parametros)
+        while True:
+            datos = respuesta.json()
+            ids += [fila['id'] for fila in datos['resultados']]
+            if not datos['siguiente']:
+                return ids
+            respuesta = self.client.get(datos['siguiente'])
+
+    def test_causas_por_id_descendente(self):
+        ids = self.recorrer(reverse('api_causas'), largo=2)
+        self.assertEqual(ids, sorted((causa.pk for causa in self.causas), reverse=True))
+
+    def test_filtros_de_la_lista(self):
+        Causa.objects.filter(pk=self.causas[1].pk).update(estado_causa='SUSPENDIDO')
+        ids = self.recorrer(reverse('api_causas'), largo=1, estado='SUSPENDIDO')
+        self.assertEqual(ids, [self.causas[1].pk])
+
+    def test_escrituras_entre_paginas(self):
+        primera = self.client.get(reverse('api_causas'), {'largo': 2}).json()
+        ids = sorted((causa.pk for causa in self.causas), reverse=True)
+        # Una causa nueva y otra borrada (la última de la página) no hacen repetir ni saltar filas
+        Causa.objects.create(deudor=self.causa.deudor, rol='C-99-2024', estado_causa='ACTIVO')
+        Causa.objects.filter(pk=ids[1]).delete()
+        resto = self.recorrer(primera['siguiente'])
+        self.assertEqual([fila['id'] for fila in primera['resultados']] + resto, ids)
+
+    def test_etapas_del_mismo_dia(self):
+        registros = [
+            EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 3, dia))
+            for dia in (1, 5, 5, 5, 9)
+        ]
+        ids = self.recorrer(reverse('api_etapas_causa', args=[self.causa.pk]), largo=2)
+        # Por fecha descendente; el id desempata las del 5 de marzo
+        self.assertEqual(ids, [registros[4].pk, registros[3].pk, registros[2].pk, registros[1].pk, registros[0].pk])
+
+    def test_comentarios_y_adjuntos(self):
+        self.agregar_historial(self.causa, 3)
+        ids = self.recorrer(reverse('api_comentarios_causa', args=[self.causa.pk]), largo=2)
+        self.assertEqual(ids, list(self.causa.comentarios.order_by('-fecha_creacion', '-id')
+                                   .values_list('id', flat=True)))
+        fila = self.client.get(reverse('api_etapas_causa', args=[self.causa.pk])).json()['resultados'][0]
+        self.assertEqual(fila['fecha'], '2024-01-03')
+        self.assertEqual(len(fila['adjuntos']), 1)
+
+    def test_consultas_constantes(self):
+        self.agregar_historial(self.causa, 6)
+        url = reverse('api_etapas_causa', args=[self.causa.pk])
+        siguiente = self.client.get(url, {'largo': 2}).json()['siguiente']
+        siguiente = self.client.get(siguiente).json()['siguiente']
+        # Sesión, usuario, causa, página y adjuntos, en cualquier página
+        with self.assertNumQueries(5):
+            self.assertEqual(len(self.client.get(siguiente).json()['resultados']), 2)
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.client.get(reverse('api_causas'), {'cursor': 'inventado'}).status_code, 400)
+        # El cursor de una lista no sirve en otra
+        cursor = self.client.get(reverse('api_causas'), {'largo': 1}).json()['cursor']
+        respuesta = self.client.get(reverse('api_comentarios_causa', args=[self.causa.pk]), {'cursor': cursor})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS)
+class PeticionesCondicionalesTests(DatosDePruebaMixin, TestCase):
+
+    def test_detalle_no_modificado(self):
+        url = reverse('detalle_causa', args=[self.causa.pk])
+        # La primera visita entrega la cookie CSRF, que es parte de la versión de la página
+        self.client.get(url)
+        primera = self.client.get(url)
+        self.assertEqual(primera['Cache-Control'], 'private, no-cache')
+        # Sesión, usuario y causa: ni pestañas ni plantilla
+        with self.assertNumQueries(3):
+            respuesta = self.client.get(url, headers={'If-None-Match': primera['ETag']})
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], primera['ETag'])
+        self.assertEqual(respuesta['Last-Modified'], primera['Last-Modified'])
+
+    def test_cambios_en_registros_asociados(self):
+        url = reverse('api_causa', args=[self.causa.pk])
+        etag = self.client.get(url)['ETag']
+        antes = Causa.objects.get(pk=self.causa.pk).fecha_modificacion
+        # Dos cambios en el mismo segundo dan versiones distintas
+        Comentario.objects.create(causa=self.causa, autor=self.usuario, texto='Nuevo')
+        segunda = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(segunda.status_code, 200)
+        EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 5, 1))
+        tercera = self.client.get(url, headers={'If-None-Match': segunda['ETag']})
+        self.assertEqual(tercera.status_code, 200)
+        self.assertGreater(Causa.objects.get(pk=self.causa.pk).fecha_modificacion, antes)
+        self.assertEqual(tercera.json()['etapa_actual'], 'Demanda')
+
+    def test_cambios_en_el_catalogo_de_etapas(self):
+        # Los nombres de las etapas están en el <select> del historial
+        url = reverse('detalle_causa', args=[self.causa.pk])
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.notificacion.nombre = 'Notificación personal'
+        self.notificacion.save()
+        respuesta = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'Notificación personal')
+        Etapa.objects.create(tipo_etapa=self.demanda.tipo_etapa, nombre='Excepciones')
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': respuesta['ETag']}).status_code, 200)
+
+    def test_if_modified_since(self):
+        url = reverse('api_causa', args=[self.causa.pk])
+        modificada = self.client.get(url)['Last-Modified']
+        respuesta = self.client.get(url, headers={'If-Modified-Since': modificada})
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_paginas_de_historial(self):
+        self.agregar_historial(self.causa, 3)
+        url = reverse('api_etapas_causa', args=[self.causa.pk])
+        etag = self.client.get(url, {'largo': 2})['ETag']
+        # Sesión, usuario y causa, sin consultar la página
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(url, {'largo': 2}, headers={'If-None-Match': etag}).status_code, 304)
+        # Otra página es otra representación
+        self.assertEqual(self.client.get(url, {'largo': 1}, headers={'If-None-Match': etag}).status_code, 200)
+        ArchivoAdjunto.objects.create(etapa_causa=self.causa.etapas.first(),
+                                      archivo=SimpleUploadedFile('otro.pdf', b'%PDF-1.4'))
+        self.assertEqual(self.client.get(url, {'largo': 2}, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_lista_de_causas(self):
+        url = reverse('api_causas')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('acciones_causas'),
+                             {'accion': 'estado', 'estado_causa': 'SUSPENDIDO', 'causas': [self.causas[2].pk]})
+        respuesta = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS)
+class AdministracionTests(DatosDePruebaMixin, TestCase):
+
+    def consultas(self, url, **parametros):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url, parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas)
+
+    def test_listados_sin_consultas_por_fila(self):
+        for causa in self.causas[:2]:
+            self.agregar_historial(causa, 2)
+        urls = [reverse(f'admin:causas_{modelo}_changelist')
+                for modelo in ('causa', 'etapacausa', 'archivoadjunto', 'comentario', 'etapa')]
+        antes = [self.consultas(url) for url in urls]
+        for causa in self.causas[2:]:
+            self.agregar_historial(causa, 3)
+        for i in range(3):
+            deudor = Deudor.objects.create(nombres=f'Otro {i}', apellidos='Apellido', rut=f'2222222{i}-2')
+            Causa.objects.create(deudor=deudor, tribunal=self.tribunal, cartera=self.cartera,
+                                 abogado_encargado=self.usuario, ultima_etapa=self.demanda, rol=f'C-{10 + i}-2024',
+                                 estado_causa=Causa.EstadoCausa.ACTIVO)
+        Etapa.objects.create(tipo_etapa=TipoEtapa.objects.create(nombre='Apremio'), nombre='Embargo')
+        self.assertEqual([self.consultas(url) for url in urls], antes)
+
+    def test_busqueda_por_prefijo(self):
+        respuesta = self.client.get(reverse('admin:causas_causa_changelist'), {'q': '11111113'})
+        self.assertEqual([causa.pk for causa in respuesta.context['cl'].result_list], [self.causas[3].pk])
+        # Sin el segundo COUNT de la tabla completa
+        self.assertFalse(respuesta.context['cl'].show_full_result_count)
+
+        # En minúsculas también encuentra el rol, que se guarda en mayúsculas
+        respuesta = self.client.get(reverse('admin:causas_causa_changelist'), {'q': 'c-2'})
+        self.assertEqual([causa.pk for causa in respuesta.context['cl'].result_list], [self.causas[2].pk])
+
+    @skipUnless(connection.vendor == 'sqlite', "El plan de consulta es de SQLite")
+    def test_busqueda_por_prefijo_usa_los_indices(self):
+        # Un rango sobre el índice del rol y del RUT, no LIKE sobre la tabla entera
+        url = reverse('admin:causas_causa_changelist')
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(url, {'q': 'C-2'})
+        listado = next(c['sql'] for c in consultas.captured_queries
+                       if c['sql'].startswith('SELECT "causas_causa"."id"') and 'ORDER BY' in c['sql'])
+        self.assertNotIn('LIKE', listado)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {listado}')
+            plan = ' '.join(str(fila[-1]) for fila in cursor.fetchall())
+        self.assertNotIn('SCAN causas_causa', plan)
+        self.assertIn('(rol>? AND rol<?)', plan)
+
+    def test_formulario_con_historial(self):
+        self.agregar_historial(self.causa, 2)
+        url = reverse('admin:causas_causa_change', args=[self.causa.pk])
+        # La primera petición además llena la caché de ContentType
+        self.consultas(url)
+        antes = self.consultas(url)
+        self.agregar_historial(self.causa, 6)
+        self.assertEqual(self.consultas(url), antes)
+        contenido = self.client.get(url).content.decode()
+        # El deudor se elige con autocompletado: no se listan los demás deudores
+        self.assertNotIn(str(self.causas[1].deudor), contenido)
+        self.assertIn('Antecedentes Leasing', contenido)
+
+    def test_autocompletado_de_deudor(self):
+        respuesta = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'causas', 'model_name': 'causa', 'field_name': 'deudor', 'term': '11111112',
+        })
+        self.assertEqual([fila['text'] for fila in respuesta.json()['results']], [str(self.causas[2].deudor)])
+
+
+class ImportarCarteraTests(DatosDePruebaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+
+    def archivo_csv(self, lineas, nombre='cartera.csv'):
+        ruta = f'{self.directorio}/{nombre}'
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write('\n'.join(lineas) + '\n')
+        return ruta
+
+    def importar(self, ruta, *argumentos, comando='importar_cartera'):
+        salida, errores = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(comando, ruta, *argumentos, stdout=salida, stderr=errores)
+        return salida.getvalue(), errores.getvalue()
+
+    def test_cambio_de_cartera_mueve_las_costas(self):
+        EtapaCausa.objects.create(causa=self.causa, etapa=self.demanda, fecha=datetime.date(2024, 1, 1), costas=100)
+        ruta = self.archivo_csv(['rut,rol,nombres,apellidos', '11111110-1,C-0-2024,Nombre 0,Apellido'])
+        self.importar(ruta, '--cartera', 'Banco Nuevo')
+        nueva = Cartera.objects.get(nombre='Banco Nuevo')
+        self.assertEqual(Causa.objects.get(pk=self.causa.pk).cartera_id, nueva.pk)
+        self.assertEqual(Cartera.objects.get(pk=self.cartera.pk).total_costas, 0)
+        self.assertEqual(nueva.total_costas, 100)
+        salida = StringIO()
+        call_command('conciliar_costas', stdout=salida)
+        self.assertIn('cuadran', salida.getvalue())
+
+    def test_actualiza_por_rut_y_rol_y_crea_lo_nuevo(self):
+        deudores, causas = Deudor.objects.count(), Causa.objects.count()
+        ruta = self.archivo_csv([
+            'rut;rol;nombres;apellidos;estado_causa;tribunal;fecha_asignacion',
+            '11111110-1;C-0-2024;Nombre Corregido;Apellido;suspendido;3º Juzgado Civil;15/03/2024',
+            '22222222-2;C-100-2024;Deudor;Nuevo;;3º Juzgado Civil;',
+        ])
+        salida, errores = self.importar(ruta)
+        self.assertIn('Importación terminada: 2 filas', salida)
+        self.assertEqual(errores, '')
+
+        # El deudor y la causa existentes se actualizan en su lugar
+        self.assertEqual(Deudor.objects.count(), deudores + 1)
+        self.assertEqual(Causa.objects.count(), causas + 1)
+        causa = Causa.objects.select_related('deudor', 'tribunal').get(pk=self.causa.pk)
+        self.assertEqual(causa.deudor.nombres, 'Nombre Corregido')
+        self.assertEqual(causa.estado_causa, Causa.EstadoCausa.SUSPENDIDO)
+        self.assertEqual(causa.fecha_asignacion, datetime.date(2024, 3, 15))
+        # El tribunal nuevo se crea una sola vez y lo comparten las dos causas
+        tribunal = Tribunal.objects.get(nombre='3º Juzgado Civil')
+        self.assertEqual(causa.tribunal, tribunal)
+        nueva = Causa.objects.get(rol='C-100-2024')
+        self.assertEqual((nueva.tribunal_id, nueva.deudor.rut, nueva.estado_causa),
+                         (tribunal.pk, '22222222-2', Causa.EstadoCausa.ACTIVO))
+
+    def test_omite_y_cuenta_las_filas_con_errores(self):
+        ruta = self.archivo_csv([
+            'rut,rol,estado_causa,fecha_asignacion',
+            '22222222-2,,,',
+            '22222222-2,C-100-2024,EN TRAMITE,',
+            '22222222-2,C-101-2024,,31/02/2024',
+            '22222222-2,C-102-2024,,',
+        ])
+        salida, errores = self.importar(ruta)
+        self.assertIn('3 filas con errores fueron omitidas', salida)
+        self.assertIn("Fila 2: faltan 'rut' o 'rol'", errores)
+        self.assertIn("Fila 3: estado inválido 'EN TRAMITE'", errores)
+        self.assertIn("Fila 4: fecha inválida '31/02/2024'", errores)
+        self.assertEqual(list(Causa.objects.filter(rol__startswith='C-10').values_list('rol', flat=True)),
+                         ['C-102-2024'])
+
+    def test_reanuda_desde_el_archivo_de_control(self):
+        ruta = self.archivo_csv(['rut,rol'] + [f'2222222{n}-2,C-10{n}-2024' for n in range(5)])
+        control = f'{ruta}.checkpoint'
+
+        # Se corta después del segundo lote de dos filas
+        def cortar(procesadas):
+            if procesadas == 4:
+                raise KeyboardInterrupt
+        comando = importar_cartera.Command()
+        comando.al_avanzar = cortar
+        with self.assertRaises(KeyboardInterrupt):
+            self.importar(ruta, '--lote', '2', comando=comando)
+        with open(control) as archivo:
+            self.assertEqual(archivo.read(), '4')
+        # Las filas ya confirmadas no se vuelven a importar
+        Causa.objects.filter(rol__in=['C-100-2024', 'C-101-2024']).update(operacion='editada')
+
+        salida, _ = self.importar(ruta, '--reanudar', '--lote', '2')
+        self.assertIn('Reanudando desde la fila 5.', salida)
+        self.assertIn('Importación terminada: 5 filas', salida)
+        self.assertEqual(Causa.objects.filter(rol__startswith='C-10').count(), 5)
+        self.assertEqual(Causa.objects.filter(operacion='editada').count(), 2)
+        self.assertFalse(Path(control).exists())
+
+    @skipUnless(openpyxl, "openpyxl no está instalado")
+    def test_importa_xlsx(self):
+        libro = openpyxl.Workbook()
+        hoja = libro.active
+        hoja.append(['RUT', 'Rol', 'Nombres', 'Fecha_Asignacion'])
+        hoja.append(['22222222-2', 'C-100-2024', 'Desde Excel', datetime.datetime(2024, 3, 15)])
+        ruta = f'{self.directorio}/cartera.xlsx'
+        libro.save(ruta)
+        self.importar(ruta, '--cartera', 'Banco Ejemplo')
+        causa = Causa.objects.select_related('deudor').get(rol='C-100-2024')
+        self.assertEqual((causa.deudor.nombres, causa.fecha_asignacion, causa.cartera_id),
+                         ('Desde Excel', datetime.date(2024, 3, 15), self.cartera.pk))
+
+    @skipIf(openpyxl, "openpyxl está instalado")
+    def test_xlsx_sin_openpyxl(self):
+        ruta = f'{self.directorio}/cartera.xlsx'
+        Path(ruta).write_bytes(b'')
+        with self.assertRaisesMessage(CommandError, "hay que instalar 'openpyxl'"):
+            self.importar(ruta)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS)
+class MedicionDeRendimientoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        self.addCleanup(auditoria._cola.clear)
+
+    def test_generar_datos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('generar_datos', '--causas', '40', '--etapas', '3', '--comentarios', '1',
+                         '--adjuntos', '0.2', '--carteras', '2', '--tribunales', '3', '--abogados', '2',
+                         '--lote', '15', '--semilla', '7', stdout=StringIO())
+        self.assertEqual(Causa.objects.filter(rol__startswith='SINT-').count(), 40)
+        registros = EtapaCausa.objects.count()
+        self.assertGreater(registros, 0)
+        # Un promedio menor que 0,5 también genera adjuntos, aproximadamente en esa proporción
+        adjuntos = ArchivoAdjunto.objects.count()
+        self.assertTrue(0 < adjuntos < registros / 2, (adjuntos, registros))
+        archivo = ArchivoAdjunto.objects.values_list('archivo', flat=True).first()
+        self.assertEqual(ArchivoAlmacenado.objects.get(pk=archivo).referencias, adjuntos)
+        # Los totales derivados cuadran con el historial
+        salida = StringIO()
+        call_command('conciliar_costas', stdout=salida)
+        self.assertIn('cuadran', salida.getvalue())
+        self.assertEqual(sum(ResumenCausas.objects.values_list('cantidad', flat=True)), 40)
+
+    def test_medir_vistas_contra_la_linea_base(self):
+        call_command('generar_datos', '--causas', '10', '--semilla', '7', '--carteras', '1', '--tribunales', '2',
+                     '--abogados', '1', stdout=StringIO())
+        linea_base = f'{self.directorio}/linea_base.json'
+        medir = ['medir_vistas', '--repeticiones', '2', '--calentamiento', '1', '--linea-base', linea_base,
+                 '--escenarios', 'lista_causas_datos', 'detalle_causa', 'editar_causa']
+
+        with self.assertRaisesMessage(CommandError, 'No hay línea base'):
+            call_command(*medir, stdout=StringIO())
+        call_command(*medir, '--guardar', stdout=StringIO())
+        with open(linea_base) as archivo:
+            guardada = json.load(archivo)
+        self.assertEqual(guardada['causas'], 10)
+        self.assertGreater(guardada['escenarios']['detalle_causa']['consultas'], 0)
+
+        salida = StringIO()
+        call_command(*medir, '--tolerancia', '1000', stdout=salida)
+        self.assertIn('Sin regresiones', salida.getvalue())
+        # Más consultas que en la línea base es una regresión
+        guardada['escenarios']['detalle_causa']['consultas'] = 0
+        with open(linea_base, 'w') as archivo:
+            json.dump(guardada, archivo)
+        with self.assertRaisesMessage(CommandError, 'detalle_causa:'):
+            call_command(*medir, '--tolerancia', '1000', stdout=StringIO())
+        # La medición borra lo que creó
+        self.assertEqual(Causa.objects.count(), 10)
+
+
+@skipUnless(connection.vendor == 'sqlite', "Perfil SQLite")
+class PerfilesDeBaseDeDatosTests(TransactionTestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+
+    def perfil(self, **variables):
+        with mock.patch.dict(os.environ, variables):
+            return runpy.run_path(str(Path(settings.BASE_DIR) / 'config' / 'settings.py'))
+
+    def test_el_perfil_se_elige_por_variable_de_entorno(self):
+        ruta = f'{self.directorio}/otra.sqlite3'
+        base = self.perfil(CAUSAS_BASE_DATOS='sqlite', CAUSAS_SQLITE_ARCHIVO=ruta)['DATABASES']['default']
+        self.assertEqual((base['ENGINE'], base['NAME']), ('django.db.backends.sqlite3', ruta))
+        base = self.perfil(CAUSAS_BASE_DATOS='postgresql', CAUSAS_PG_POOL_MAXIMO='4')['DATABASES']['default']
+        self.assertEqual((base['ENGINE'], base['CONN_MAX_AGE']), ('django.db.backends.postgresql', 0))
+        self.assertEqual(base['OPTIONS']['pool']['max_size'], 4)
+        with self.assertRaises(ImproperlyConfigured):
+            self.perfil(CAUSAS_BASE_DATOS='oracle')
+
+    def test_conexiones_nuevas_en_modo_wal(self):
+        # Una conexión nueva con la configuración del perfil, sobre un archivo (la base
+        # de las pruebas está en memoria, donde no hay WAL)
+        nueva = DatabaseWrapper({**connection.settings_dict, 'NAME': f'{self.directorio}/wal.sqlite3'})
+        try:
+            with nueva.cursor() as cursor:
+                pragmas = {}
+                for pragma in ('journal_mode', 'busy_timeout', 'synchronous'):
+                    cursor.execute(f'PRAGMA {pragma}')
+                    pragmas[pragma] = cursor.fetchone()[0]
+        finally:
+            nueva.close()
+        # synchronous=1 es NORMAL; busy_timeout en milisegundos
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'busy_timeout': 20000, 'synchronous': 1})
+
+    def test_medir_concurrencia(self):
+        # Los procesos de la medición no ven la base en memoria: se copia a un archivo
+        ruta = f'{self.directorio}/concurrencia.sqlite3'
+        connection.ensure_connection()
+        with closing(sqlite3.connect(ruta)) as destino:
+            connection.connection.backup(destino)
+        memoria = connection.settings_dict['NAME']
+        # Esta conexión mantiene viva la base en memoria mientras la de Django apunta al archivo
+        with closing(sqlite3.connect(memoria, uri=True)), mock.patch.dict(os.environ, CAUSAS_SQLITE_ARCHIVO=ruta):
+            connection.settings_dict['NAME'] = ruta
+            connection.close()
+            try:
+                salida = StringIO()
+                call_command('medir_concurrencia', '--procesos', '2', '--escrituras', '5', stdout=salida)
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT COUNT(*) FROM causas_comentario')
+                    comentarios, = cursor.fetchone()
+            finally:
+                connection.close()
+                connection.settings_dict['NAME'] = memoria
+                connection.ensure_connection()
+        salida = salida.getvalue()
+        self.assertIn('journal_mode=wal', salida)
+        self.assertIn('2 procesos x 5 escrituras = 10 en', salida)
+        self.assertGreater(int(re.search(r'\((\d+) confirmadas/s\)', salida).group(1)), 0)
+        self.assertIn('Errores por bloqueo: 0', salida)
+        # Los comentarios se borran junto con las causas de la medición
+        self.assertEqual(comentarios, 0)
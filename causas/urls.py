@@ -4,7 +4,26 @@ from django.urls import path
 # Ahora importamos la nueva vista también
 from .views import (
     lista_causas, 
+    lista_causas_datos,
+    exportar_causas,
+    acciones_causas,
+    buscar_causas,
+    reporte_causas,
+    analisis_etapas,
+    api_causas,
+    api_causa,
+    api_etapas_causa,
+    api_comentarios_causa,
+    iniciar_subida,
+    detalle_subida,
+    subir_parte,
+    completar_subida,
+    descargar_adjunto,
+    crear_tarea,
+    estado_tarea,
+    descargar_tarea,
     detalle_causa, 
+    cambios_causa,
     CausaCreateView, 
     CausaUpdateView, 
     CausaDeleteView
@@ -16,10 +35,51 @@ urlpatterns = [
     # Le damos un nombre 'lista_causas' para poder referenciarla fácilmente más tarde.
     path('', lista_causas, name='lista_causas'),
 
+    # Endpoint JSON que alimenta la tabla en modo 'serverSide' de DataTables.
+    path('datos/', lista_causas_datos, name='lista_causas_datos'),
+
+    # Exportación del listado filtrado a CSV o Excel.
+    path('exportar/', exportar_causas, name='exportar_causas'),
+
+    # Acciones masivas sobre las causas seleccionadas (estado, abogado, etapa).
+    path('acciones/', acciones_causas, name='acciones_causas'),
+
+    # Búsqueda de texto completo en causas, deudores, etapas y comentarios.
+    path('buscar/', buscar_causas, name='buscar_causas'),
+
+    # Reporte por cartera, estado, etapa, tribunal y abogado, desde la tabla de resumen.
+    path('reportes/', reporte_causas, name='reporte_causas'),
+
+    # Duración de las etapas, transiciones por mes y tribunales lentos.
+    path('reportes/etapas/', analisis_etapas, name='analisis_etapas'),
+
+    # API JSON de sólo lectura, paginada por cursor: causas y el historial y comentarios de cada una.
+    path('api/causas/', api_causas, name='api_causas'),
+    path('api/causas/<int:pk>/', api_causa, name='api_causa'),
+    path('api/causas/<int:pk>/etapas/', api_etapas_causa, name='api_etapas_causa'),
+    path('api/causas/<int:pk>/comentarios/', api_comentarios_causa, name='api_comentarios_causa'),
+
     # Esta URL captura un número entero (int) de la dirección
     # y lo pasa a la vista como una variable llamada 'pk'.
     path('<int:pk>/', detalle_causa, name='detalle_causa'),
 
+    # Línea de tiempo de los cambios de la causa (auditoría por campo).
+    path('<int:pk>/cambios/', cambios_causa, name='cambios_causa'),
+
+    # Subidas reanudables por partes para archivos adjuntos grandes.
+    path('subidas/', iniciar_subida, name='iniciar_subida'),
+    path('subidas/<uuid:subida_id>/', detalle_subida, name='detalle_subida'),
+    path('subidas/<uuid:subida_id>/partes/<int:numero>/', subir_parte, name='subir_parte'),
+    path('subidas/<uuid:subida_id>/completar/', completar_subida, name='completar_subida'),
+
+    # Descarga autenticada de adjuntos (con rangos, ETag y X-Sendfile/X-Accel-Redirect).
+    path('adjuntos/<int:pk>/', descargar_adjunto, name='descargar_adjunto'),
+
+    # Tareas en segundo plano: encolar, consultar el avance y descargar el resultado.
+    path('tareas/', crear_tarea, name='crear_tarea'),
+    path('tareas/<int:pk>/', estado_tarea, name='estado_tarea'),
+    path('tareas/<int:pk>/archivo/', descargar_tarea, name='descargar_tarea'),
+
     path('nueva/', CausaCreateView.as_view(), name='crear_causa'),
     path('<int:pk>/editar/', CausaUpdateView.as_view(), name='editar_causa'),
     path('<int:pk>/eliminar/', CausaDeleteView.as_view(), name='eliminar_causa'),
@@ -1,11 +1,36 @@
 # causas/views.py
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+
 from django import forms
 from django.shortcuts import render, get_object_or_404, redirect 
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
-from .models import Causa, Cartera
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.template.loader import render_to_string
+from .models import ArchivoAdjunto, CambioCausa, Causa, Cartera, Comentario, Etapa, EtapaCausa, ResumenCausas, SubidaParcial, Tarea
+from . import acciones, analitica, auditoria, metricas, paginacion, reportes, subidas, tareas
+from .busqueda import buscar
+from .catalogo import version_catalogo
+from .kpis import obtener_kpis
+from .listado import (FormatoNoDisponible, escribir_xlsx, filtrar_causas, lineas_csv, nombre_exportacion,
+                      pagina_causas)
 from .forms import ArchivoAdjuntoForm, ComentarioForm, EtapaCausaForm
-from django.http import HttpResponseRedirect
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import content_disposition_header, http_date, urlencode
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import require_http_methods, require_POST
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import PermissionRequiredMixin
 
@@ -14,18 +39,22 @@ def dashboard_view(request):
     """
     Esta vista calcula las métricas principales (KPIs) y prepara los datos para el gráfico.
     """
-    # Los cálculos que ya teníamos se mantienen
-    total_causas = Causa.objects.count()
-    activos = Causa.objects.filter(estado_causa='ACTIVO').count()
-    recuperados = Causa.objects.filter(estado_causa='RECUPERADO').count()
-    suspendidos = Causa.objects.filter(estado_causa='SUSPENDIDO').count()
-    archivados = Causa.objects.filter(estado_causa='ARCHIVADO').count()
+    # Los conteos vienen de una sola consulta agregada, guardada en caché
+    # e invalidada por las señales de Causa (ver causas/kpis.py).
+    kpis = obtener_kpis()
+    total_causas = kpis['total']
+    activos = kpis['ACTIVO']
+    recuperados = kpis['RECUPERADO']
+    suspendidos = kpis['SUSPENDIDO']
+    archivados = kpis['ARCHIVADO']
 
     # --- NUEVO CÓDIGO PARA EL GRÁFICO ---
     # Preparamos las etiquetas (los nombres de cada "quesito" del pastel)
     chart_labels = ['Activas', 'Recuperadas', 'Suspendidas', 'Archivadas']
     # Preparamos los datos (los números de cada "quesito")
     chart_data = [activos, recuperados, suspendidos, archivados]
+    # Estado de cada quesito, para profundizar en el reporte al hacer clic
+    chart_estados = ['ACTIVO', 'RECUPERADO', 'SUSPENDIDO', 'ARCHIVADO']
 
     # Preparamos el contexto para enviarlo a la plantilla
     contexto = {
@@ -36,8 +65,10 @@ def dashboard_view(request):
         'causas_archivadas': archivados,
         
         # Añadimos los nuevos datos del gráfico al contexto
-        'chart_labels': chart_labels,
-        'chart_data': chart_data,
+        # Como JSON, para leerlos desde los atributos data-* del gráfico
+        'chart_labels': json.dumps(chart_labels),
+        'chart_data': json.dumps(chart_data),
+        'chart_estados': json.dumps(chart_estados),
     }
 
     # Renderizamos la plantilla del dashboard
@@ -45,43 +76,805 @@ def dashboard_view(request):
 
 @login_required
 def lista_causas(request):
-    # Obtenemos los posibles filtros de la URL
-    estado_filtro = request.GET.get('estado', None)
+    # Obtenemos el posible filtro de cartera de la URL
     cartera_filtro_id = request.GET.get('cartera_id', None)
 
-    # Empezamos con todas las causas
-    listado = Causa.objects.all()
     # 1. Inicializamos una variable para la cartera activa
     cartera_activa = None
 
-    # Aplicamos el filtro de estado si existe
-    if estado_filtro:
-        listado = listado.filter(estado_causa=estado_filtro)
-
-    # Aplicamos el filtro de cartera si existe
     if cartera_filtro_id:
-        listado = listado.filter(cartera__id=cartera_filtro_id)
         # 2. Si filtramos, obtenemos el objeto Cartera para saber su nombre
         try:
             cartera_activa = Cartera.objects.get(id=cartera_filtro_id)
-        except Cartera.DoesNotExist:
+        except (Cartera.DoesNotExist, ValueError):
             cartera_activa = None # Por si alguien pone un ID que no existe en la URL
 
-    # Ordenamos el resultado final
-    listado_ordenado = listado.order_by('-id')
-
-    # 3. Añadimos la cartera_activa al contexto que enviamos a la plantilla
+    # Las filas ya no se renderizan aquí: DataTables las pide página a página
+    # a 'lista_causas_datos' (modo serverSide), con los mismos filtros de la URL.
     contexto = {
-        'causas': listado_ordenado,
         'cartera_activa': cartera_activa,
+        'filtros': request.GET.urlencode(),
+        # Opciones de las acciones masivas
+        'estados': Causa.EstadoCausa.choices,
+        'abogados': get_user_model().objects.filter(is_active=True).order_by('username'),
+        'etapas': Etapa.objects.select_related('tipo_etapa').order_by('tipo_etapa__nombre', 'nombre'),
     }
     return render(request, 'causas/lista_causas.html', contexto)
 
-# causas/views.py
+
+# Columnas de la tabla, en el mismo orden que en la plantilla, y el campo por el
+# que se ordena cada una. None significa que la columna no se puede ordenar.
+COLUMNAS_LISTA_CAUSAS = [
+    None,  # casilla de selección para las acciones masivas
+    'rol',
+    'deudor__apellidos',
+    'tribunal__nombre',
+    'ultima_etapa__nombre',
+    'estado_causa',
+]
+
+LARGO_PAGINA_MAXIMO = 100
+
+
+def _entero(valor, por_defecto):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return por_defecto
+
+
+@login_required
+def lista_causas_datos(request):
+    """
+    Endpoint JSON para el modo 'serverSide' de DataTables.
+    Devuelve una sola página de filas, el total de registros y el total filtrado,
+    de modo que el trabajo por petición depende del largo de la página y no del
+    tamaño de la cartera.
+    """
+    draw = _entero(request.GET.get('draw'), 0)
+    inicio = max(_entero(request.GET.get('start'), 0), 0)
+    largo = _entero(request.GET.get('length'), 10)
+    if largo < 1 or largo > LARGO_PAGINA_MAXIMO:
+        largo = LARGO_PAGINA_MAXIMO
+    busqueda = request.GET.get('search[value]', '').strip()
+
+    listado = filtrar_causas(request.GET)
+    total = listado.count()
+
+    # Búsqueda global de DataTables sobre las columnas visibles
+    if busqueda:
+        listado = listado.filter(
+            Q(rol__icontains=busqueda)
+            | Q(deudor__nombres__icontains=busqueda)
+            | Q(deudor__apellidos__icontains=busqueda)
+            | Q(deudor__rut__icontains=busqueda)
+            | Q(tribunal__nombre__icontains=busqueda)
+        )
+        total_filtrado = listado.count()
+    else:
+        total_filtrado = total
+
+    # Ordenamiento pedido por DataTables; por defecto, las más nuevas primero
+    orden = ['-id']
+    columna = _entero(request.GET.get('order[0][column]'), -1)
+    if 0 <= columna < len(COLUMNAS_LISTA_CAUSAS) and COLUMNAS_LISTA_CAUSAS[columna]:
+        campo = COLUMNAS_LISTA_CAUSAS[columna]
+        if request.GET.get('order[0][dir]') == 'desc':
+            campo = '-' + campo
+        orden = [campo, '-id']
+
+    pagina = pagina_causas(listado, orden, inicio, largo)
+
+    filas = []
+    for causa in pagina:
+        filas.append({
+            'id': causa.pk,
+            'rol': causa.rol,
+            'url': reverse('detalle_causa', args=[causa.pk]),
+            'deudor': str(causa.deudor),
+            'tribunal': causa.tribunal.nombre if causa.tribunal else '',
+            'etapa_actual': causa.etapa_actual,
+            'estado': causa.get_estado_causa_display(),
+        })
+
+    return JsonResponse({
+        'draw': draw,
+        'recordsTotal': total,
+        'recordsFiltered': total_filtrado,
+        'data': filas,
+    })
+
+@login_required
+@permission_required('causas.change_causa', raise_exception=True)
+@require_POST
+def acciones_causas(request):
+    """
+    Acciones masivas desde 'lista_causas' (ver causas/acciones.py): cambio de
+    estado, reasignación de abogado o registro de una etapa. Se aplican a las
+    causas marcadas ('causas', uno o más ids) o, con seleccion=filtro, a todas
+    las que cumplen los filtros del listado.
+    """
+    if request.POST.get('seleccion') == 'filtro':
+        ids = list(filtrar_causas(request.POST).values_list('id', flat=True))
+    else:
+        ids = [causa_id for causa_id in (_entero(valor, 0) for valor in request.POST.getlist('causas')) if causa_id > 0]
+    if not ids:
+        return JsonResponse({'error': "No hay causas seleccionadas."}, status=400)
+
+    accion = request.POST.get('accion')
+    if accion == 'estado':
+        estado = request.POST.get('estado_causa', '')
+        if estado not in Causa.EstadoCausa.values:
+            return JsonResponse({'error': f"Estado inválido: '{estado}'."}, status=400)
+        actualizadas = acciones.cambiar_estado(ids, estado)
+    elif accion == 'abogado':
+        abogado_id = request.POST.get('abogado_encargado') or None
+        if abogado_id is not None and not get_user_model().objects.filter(pk=_entero(abogado_id, 0)).exists():
+            return JsonResponse({'error': "El abogado indicado no existe."}, status=400)
+        actualizadas = acciones.reasignar(ids, abogado_id and int(abogado_id))
+    elif accion == 'etapa':
+        if not request.user.has_perm('causas.add_etapacausa'):
+            raise PermissionDenied
+        form = EtapaCausaForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({'error': "Datos de la etapa inválidos.", 'errores': form.errors}, status=400)
+        actualizadas = acciones.registrar_etapa(ids, **form.cleaned_data)
+    else:
+        return JsonResponse({'error': "Acción desconocida."}, status=400)
+    return JsonResponse({'seleccionadas': len(ids), 'actualizadas': actualizadas})
+
+@login_required
+def exportar_causas(request):
+    """
+    Exporta el listado filtrado (mismos filtros que 'lista_causas') a CSV o XLSX.
+
+    El CSV se transmite a medida que se leen las filas. El XLSX no: un libro es un
+    ZIP que openpyxl arma al guardarlo, así que se escribe completo en un archivo
+    temporal (la memoria no crece con las filas, pero el primer byte sale recién
+    al terminar) y después se envía por bloques. Para carteras grandes conviene el
+    CSV o la exportación en segundo plano (tarea 'exportar_causas').
+    """
+    listado = filtrar_causas(request.GET)
+    nombre = nombre_exportacion()
+
+    if request.GET.get('formato') == 'xlsx':
+        temporal = tempfile.TemporaryFile()
+        try:
+            escribir_xlsx(temporal, listado)
+        except FormatoNoDisponible as error:
+            temporal.close()
+            return HttpResponse(str(error), status=501)
+        temporal.seek(0)
+        return FileResponse(temporal, as_attachment=True, filename=f"{nombre}.xlsx")
+
+    respuesta = StreamingHttpResponse(lineas_csv(listado), content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+    return respuesta
+
+@login_required
+def buscar_causas(request):
+    """
+    Búsqueda de texto completo sobre rol, deudor, RUT, descripciones de etapas y
+    comentarios, con resultados ordenados por relevancia (ver causas/busqueda.py).
+    """
+    consulta = request.GET.get('q', '').strip()
+    contexto = {
+        'consulta': consulta,
+        'resultados': buscar(consulta),
+    }
+    return render(request, 'causas/busqueda.html', contexto)
+
+@login_required
+def reporte_causas(request):
+    """
+    Desglose de la cartera por cartera, estado, etapa, tribunal y abogado. Lee sólo
+    la tabla de resumen (ver causas/reportes.py). Cada fila enlaza al desglose de
+    esa fila por la siguiente dimensión, como hace el gráfico del dashboard.
+    """
+    filtros = {}
+    for dimension in reportes.DIMENSIONES:
+        valor = request.GET.get(dimension, '')
+        valido = valor in Causa.EstadoCausa.values if dimension == 'estado' else valor.isdigit()
+        if valor == reportes.SIN_VALOR or valido:
+            filtros[dimension] = valor
+    # Por defecto se agrupa por la primera dimensión que no esté filtrada
+    libres = [d for d in reportes.DIMENSIONES if d not in filtros]
+    agrupar_por = [d for d in request.GET.getlist('por') if d in libres] or libres[:1]
+
+    # La siguiente dimensión para profundizar desde una fila
+    restantes = [d for d in reportes.DIMENSIONES if d not in filtros and d not in agrupar_por]
+    filas = reportes.consultar(agrupar_por, filtros)
+    for fila in filas:
+        parametros = dict(filtros)
+        for dimension, valor, _ in fila['valores']:
+            parametros[dimension] = reportes.SIN_VALOR if valor is None else valor
+        if restantes:
+            parametros['por'] = restantes[0]
+            fila['enlace'] = '?' + urlencode(parametros)
+
+    # Filtros activos con su nombre y el enlace para quitarlos
+    activos = []
+    for dimension, valor in filtros.items():
+        campo, nombre, etiqueta = reportes.DIMENSIONES[dimension]
+        if valor == reportes.SIN_VALOR:
+            texto = '(sin asignar)'
+        else:
+            texto = (ResumenCausas.objects.filter(**{campo: valor}).values_list(nombre, flat=True).first()
+                     or valor)
+        sin_este = {d: v for d, v in filtros.items() if d != dimension}
+        sin_este['por'] = dimension
+        activos.append({'etiqueta': etiqueta, 'texto': texto, 'quitar': '?' + urlencode(sin_este)})
+
+    contexto = {
+        'filas': filas,
+        'columnas': [reportes.DIMENSIONES[d][2] for d in agrupar_por],
+        'filtros_activos': activos,
+        'agrupar_por': agrupar_por,
+        'dimensiones': [(d, etiqueta) for d, (_, _, etiqueta) in reportes.DIMENSIONES.items() if d not in filtros],
+        'filtros': filtros,
+        'total_cantidad': sum(fila['cantidad'] for fila in filas),
+        'total_costas': sum(fila['costas'] or 0 for fila in filas),
+    }
+    return render(request, 'causas/reporte_causas.html', contexto)
+
+@login_required
+def analisis_etapas(request):
+    """
+    Duración de las causas en cada etapa y tipo de etapa, transiciones por mes y
+    tribunales más lentos, para toda la cartera o una sola (ver causas/analitica.py).
+    """
+    cartera_id = _entero(request.GET.get('cartera_id'), None)
+    contexto = {
+        'analisis': analitica.obtener_analisis(cartera_id),
+        'carteras': Cartera.objects.order_by('nombre'),
+        'cartera_id': cartera_id,
+    }
+    return render(request, 'causas/analisis_etapas.html', contexto)
+
+# --- PETICIONES CONDICIONALES ---
+# detalle_causa y la API envían ETag y Last-Modified a partir de la revisión y la
+# fecha de modificación de la causa, que suben también con los cambios en su
+# historial, comentarios, adjuntos, antecedentes y deudor y con los nombres de su
+# tribunal, cartera y abogado (ver causas/signals.py), y de la versión del
+# catálogo de etapas cuyos nombres se muestran. Un cliente que ya tiene
+# la versión actual recibe un 304 sin cuerpo: sin consultar el historial ni
+# renderizar nada. Last-Modified sólo tiene precisión de segundos; el ETag
+# distingue dos cambios dentro del mismo segundo.
+
+def _validadores(partes, ultima_modificacion):
+    """(ETag débil, Last-Modified en segundos) para la representación descrita por 'partes'."""
+    resumen = hashlib.sha256(repr(partes).encode()).hexdigest()[:32]
+    return f'W/"{resumen}"', int(ultima_modificacion.timestamp()) if ultima_modificacion else None
+
+
+def _validadores_causa(causa, variante=''):
+    cantidad, catalogo = version_catalogo()
+    return _validadores(
+        (causa.pk, causa.revision, causa.fecha_modificacion.isoformat(), cantidad, catalogo, variante),
+        max(filter(None, [causa.fecha_modificacion, catalogo])),
+    )
+
+
+def _con_validadores(respuesta, etag, ultima_modificacion):
+    respuesta['ETag'] = etag
+    if ultima_modificacion is not None:
+        respuesta['Last-Modified'] = http_date(ultima_modificacion)
+    # El navegador puede guardarla, pero debe revalidarla en cada uso
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
+def _no_modificada(request, etag, ultima_modificacion):
+    """La respuesta 304 si el cliente ya tiene esta versión (sólo GET y HEAD), o None."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    respuesta = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+    if respuesta is None:
+        return None
+    return _con_validadores(respuesta, etag, ultima_modificacion)
+
+# --- API DE CONSULTA CON PAGINACIÓN POR CURSOR ---
+# Listas JSON de sólo lectura para integraciones (bancos, aplicación móvil), paginadas
+# por cursor (ver causas/paginacion.py); cada respuesta trae la URL de la página siguiente:
+#   GET api/causas/                      -> causas, de la más nueva a la más antigua (filtros de filtrar_causas)
+#   GET api/causas/<id>/                 -> una causa
+#   GET api/causas/<id>/etapas/          -> historial de la causa, de la etapa más reciente a la más antigua
+#   GET api/causas/<id>/comentarios/     -> comentarios de la causa, del más nuevo al más antiguo
+# Parámetros: 'cursor' (el de la respuesta anterior) y 'largo' (hasta LARGO_PAGINA_MAXIMO).
+# Todas aceptan If-None-Match / If-Modified-Since (ver PETICIONES CONDICIONALES).
+
+LARGO_PAGINA_API = 25
+
+# Lo que la API lee de la causa antes de decidir si responde 304
+CAMPOS_VERSION_CAUSA = ['id', 'revision', 'fecha_modificacion']
+
+
+def _pagina_api(request, queryset, lista, orden, serializar, causa=None):
+    """
+    Una página de la lista. Con 'causa' (historial y comentarios) la versión es
+    la de la causa y el 304 se decide antes de consultar la página; sin ella (la
+    lista de causas) se calcula con las causas de la página.
+    """
+    validadores = _validadores_causa(causa, request.GET.urlencode()) if causa else None
+    if validadores and (no_modificada := _no_modificada(request, *validadores)):
+        return no_modificada
+
+    largo = _entero(request.GET.get('largo'), LARGO_PAGINA_API)
+    if largo < 1 or largo > LARGO_PAGINA_MAXIMO:
+        largo = LARGO_PAGINA_MAXIMO
+    try:
+        filas, cursor = paginacion.paginar(queryset, lista, orden, request.GET.get('cursor'), largo)
+    except paginacion.CursorInvalido as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    if validadores is None:
+        cantidad, catalogo = version_catalogo()
+        validadores = _validadores(
+            ([(fila.pk, fila.revision, fila.fecha_modificacion.isoformat()) for fila in filas],
+             cantidad, catalogo, request.GET.urlencode()),
+            max(filter(None, [*(fila.fecha_modificacion for fila in filas), catalogo]), default=None),
+        )
+        if no_modificada := _no_modificada(request, *validadores):
+            return no_modificada
+
+    siguiente = None
+    if cursor:
+        parametros = request.GET.copy()
+        parametros['cursor'] = cursor
+        siguiente = request.build_absolute_uri(f"{request.path}?{parametros.urlencode()}")
+    respuesta = JsonResponse({'resultados': [serializar(fila) for fila in filas], 'cursor': cursor,
+                              'siguiente': siguiente})
+    return _con_validadores(respuesta, *validadores)
+
+
+def _causa_api(causa):
+    return {
+        'id': causa.pk,
+        'rol': causa.rol,
+        'operacion': causa.operacion,
+        'estado': causa.estado_causa,
+        'deudor': {'rut': causa.deudor.rut, 'nombre': str(causa.deudor)},
+        'tribunal': causa.tribunal.nombre if causa.tribunal else None,
+        'cartera': causa.cartera.nombre if causa.cartera else None,
+        'etapa_actual': causa.ultima_etapa.nombre if causa.ultima_etapa else None,
+        'fecha_etapa_actual': causa.fecha_ultima_etapa,
+        'total_costas': causa.total_costas,
+        'fecha_modificacion': causa.fecha_modificacion,
+        'url': reverse('detalle_causa', args=[causa.pk]),
+    }
+
+
+# Consultas de las listas de la API; también las revisa 'verificar_planes'
+
+def consulta_api_causas(parametros):
+    # Con los filtros de estado y cartera, el orden por -id sale del índice causa_estado_cartera_idx
+    return filtrar_causas(parametros).select_related('deudor', 'tribunal', 'cartera', 'ultima_etapa')
+
+
+def consulta_api_etapas(causa):
+    # Sobre el índice (causa, -fecha); el id desempata las etapas del mismo día
+    return EtapaCausa.objects.filter(causa=causa).select_related('etapa__tipo_etapa').prefetch_related(
+        Prefetch('archivos', queryset=ArchivoAdjunto.objects.order_by('id'))
+    )
+
+
+def consulta_api_comentarios(causa):
+    return Comentario.objects.filter(causa=causa).select_related('autor')
+
+
+@login_required
+def api_causas(request):
+    return _pagina_api(request, consulta_api_causas(request.GET), 'causas', ['id'], _causa_api)
+
+
+@login_required
+def api_causa(request, pk):
+    causa = get_object_or_404(Causa.objects.select_related('deudor', 'tribunal', 'cartera', 'ultima_etapa'), pk=pk)
+    validadores = _validadores_causa(causa)
+    if no_modificada := _no_modificada(request, *validadores):
+        return no_modificada
+    return _con_validadores(JsonResponse(_causa_api(causa)), *validadores)
+
+
+@login_required
+def api_etapas_causa(request, pk):
+    causa = get_object_or_404(Causa.objects.only(*CAMPOS_VERSION_CAUSA), pk=pk)
+    return _pagina_api(request, consulta_api_etapas(causa), f'etapas.{causa.pk}', ['fecha', 'id'], lambda registro: {
+        'id': registro.pk,
+        'fecha': registro.fecha,
+        'etapa': registro.etapa.nombre,
+        'tipo_etapa': registro.etapa.tipo_etapa.nombre,
+        'descripcion': registro.descripcion,
+        'costas': registro.costas,
+        'adjuntos': [
+            {'id': adjunto.pk, 'nombre': adjunto.nombre_visible,
+             'url': reverse('descargar_adjunto', args=[adjunto.pk])}
+            for adjunto in registro.archivos.all()
+        ],
+    }, causa=causa)
+
+
+@login_required
+def api_comentarios_causa(request, pk):
+    causa = get_object_or_404(Causa.objects.only(*CAMPOS_VERSION_CAUSA), pk=pk)
+    return _pagina_api(request, consulta_api_comentarios(causa), f'comentarios.{causa.pk}', ['fecha_creacion', 'id'], lambda comentario: {
+        'id': comentario.pk,
+        'fecha_creacion': comentario.fecha_creacion,
+        'autor': comentario.autor.get_username(),
+        'texto': comentario.texto,
+    }, causa=causa)
+
+# --- SUBIDAS REANUDABLES POR PARTES ---
+# API JSON para subir expedientes grandes en partes numeradas (ver causas/subidas.py):
+#   POST   subidas/                        -> crea la subida (etapa_causa, nombre, tamano, descripcion)
+#   GET    subidas/<id>/                   -> bytes recibidos y parte siguiente, para reanudar
+#   PUT    subidas/<id>/partes/<n>/        -> cuerpo crudo con los bytes de la parte n
+#   POST   subidas/<id>/completar/         -> crea el ArchivoAdjunto
+#   DELETE subidas/<id>/                   -> cancela la subida
+
+def _subida_del_usuario(request, subida_id):
+    return get_object_or_404(SubidaParcial, pk=subida_id, usuario=request.user)
+
+
+@login_required
+@require_POST
+def iniciar_subida(request):
+    etapa_causa = get_object_or_404(EtapaCausa, pk=_entero(request.POST.get('etapa_causa'), 0))
+    nombre = os.path.basename(request.POST.get('nombre', '').strip())
+    tamano = _entero(request.POST.get('tamano'), 0)
+    if not nombre or tamano <= 0:
+        return JsonResponse({'error': "Hay que indicar 'nombre' y un 'tamano' mayor que cero."}, status=400)
+    subida = SubidaParcial.objects.create(
+        etapa_causa=etapa_causa, usuario=request.user, nombre=nombre[:255], tamano=tamano,
+        descripcion=request.POST.get('descripcion', '')[:255],
+    )
+    return JsonResponse(subidas.estado_subida(subida), status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'DELETE'])
+def detalle_subida(request, subida_id):
+    subida = _subida_del_usuario(request, subida_id)
+    if request.method == 'DELETE':
+        subidas.descartar(subida)
+        return HttpResponse(status=204)
+    return JsonResponse(subidas.estado_subida(subida))
+
+
+@login_required
+@require_http_methods(['PUT', 'POST'])
+def subir_parte(request, subida_id, numero):
+    subida = _subida_del_usuario(request, subida_id)
+    try:
+        # Leemos el cuerpo como flujo, sin cargar la parte completa en memoria
+        subida = subidas.agregar_parte(subida.pk, numero, request)
+    except subidas.ErrorSubida as error:
+        return JsonResponse({'error': str(error), **subidas.estado_subida(SubidaParcial.objects.get(pk=subida.pk))},
+                            status=error.estado)
+    return JsonResponse(subidas.estado_subida(subida))
+
+
+@login_required
+@require_POST
+def completar_subida(request, subida_id):
+    subida = _subida_del_usuario(request, subida_id)
+    try:
+        adjunto = subidas.completar(subida.pk)
+    except subidas.ErrorSubida as error:
+        return JsonResponse({'error': str(error), **subidas.estado_subida(subida)}, status=error.estado)
+    return JsonResponse({'adjunto': adjunto.pk, 'nombre': adjunto.nombre_visible}, status=201)
+
+# --- DESCARGA DE ADJUNTOS ---
+
+RANGO_BYTES = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _etag_adjunto(adjunto, estado_archivo):
+    """
+    ETag fuerte: los adjuntos se guardan con el SHA-256 de su contenido en el
+    nombre (causas/storage.py); para los antiguos usamos tamaño y fecha.
+    """
+    nombre = os.path.splitext(os.path.basename(adjunto.archivo.name))[0]
+    if re.fullmatch(r'[0-9a-f]{64}', nombre):
+        return f'"{nombre}"'
+    return f'"{estado_archivo.st_size:x}-{int(estado_archivo.st_mtime):x}"'
+
+
+def _rango_pedido(cabecera, tamano):
+    """
+    Interpreta una cabecera Range de un solo rango. Devuelve (inicio, fin) inclusivo,
+    None si no hay rango válido que aplicar, o False si no se puede satisfacer.
+    """
+    encontrado = RANGO_BYTES.match(cabecera.strip()) if cabecera else None
+    if not encontrado or encontrado.groups() == ('', ''):
+        return None
+    desde, hasta = encontrado.groups()
+    if desde == '':
+        # "bytes=-500": los últimos 500 bytes
+        inicio, fin = max(tamano - int(hasta), 0), tamano - 1
+    else:
+        inicio = int(desde)
+        fin = min(int(hasta), tamano - 1) if hasta else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return False
+    return inicio, fin
+
+
+def _leer_rango(archivo, inicio, largo, bloque=64 * 1024):
+    with archivo:
+        archivo.seek(inicio)
+        while largo > 0:
+            datos = archivo.read(min(bloque, largo))
+            if not datos:
+                break
+            largo -= len(datos)
+            yield datos
+
+
+@login_required
+def descargar_adjunto(request, pk):
+    """
+    Descarga autenticada de un adjunto, con soporte para:
+    - peticiones condicionales (ETag / Last-Modified -> 304),
+    - rangos de bytes (206), para reanudar descargas y visores de PDF,
+    - traspaso del envío al servidor web con X-Sendfile o X-Accel-Redirect
+      (ajuste CAUSAS_DESCARGAS_SERVIDOR), sin ocupar un proceso de Python.
+    """
+    adjunto = get_object_or_404(ArchivoAdjunto, pk=pk)
+    almacenamiento = adjunto.archivo.storage
+    try:
+        ruta = almacenamiento.path(adjunto.archivo.name)
+        estado_archivo = os.stat(ruta)
+    except (FileNotFoundError, NotImplementedError):
+        raise Http404("El archivo no está disponible.")
+
+    etag = _etag_adjunto(adjunto, estado_archivo)
+    modificado = http_date(estado_archivo.st_mtime)
+    tipo = mimetypes.guess_type(adjunto.nombre_visible)[0] or 'application/octet-stream'
+
+    # 304 si el cliente ya tiene esta versión
+    no_modificado = get_conditional_response(
+        request, etag=etag, last_modified=int(estado_archivo.st_mtime),
+    )
+    if no_modificado is not None:
+        if no_modificado.status_code == 304:
+            no_modificado['ETag'] = etag
+            no_modificado['Last-Modified'] = modificado
+        return no_modificado
+
+    servidor = getattr(settings, 'CAUSAS_DESCARGAS_SERVIDOR', None)
+    if servidor:
+        respuesta = HttpResponse(content_type=tipo)
+        if servidor == 'x-accel-redirect':
+            # Nginx: una 'location internal' que apunte a MEDIA_ROOT
+            prefijo = getattr(settings, 'CAUSAS_X_ACCEL_PREFIJO', '/protegido/')
+            respuesta['X-Accel-Redirect'] = prefijo + adjunto.archivo.name
+        else:
+            # Apache (mod_xsendfile) y Lighttpd
+            respuesta['X-Sendfile'] = ruta
+    else:
+        tamano = estado_archivo.st_size
+        rango = None
+        # If-Range: sólo se respeta el rango si el cliente tiene la misma versión
+        if_range = request.headers.get('If-Range')
+        if not if_range or if_range in (etag, modificado):
+            rango = _rango_pedido(request.headers.get('Range'), tamano)
+        if rango is False:
+            respuesta = HttpResponse(status=416)
+            respuesta['Content-Range'] = f'bytes */{tamano}'
+            return respuesta
+        if rango:
+            inicio, fin = rango
+            respuesta = StreamingHttpResponse(
+                _leer_rango(almacenamiento.open(adjunto.archivo.name), inicio, fin - inicio + 1),
+                status=206, content_type=tipo,
+            )
+            respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+            respuesta['Content-Length'] = str(fin - inicio + 1)
+        else:
+            respuesta = FileResponse(almacenamiento.open(adjunto.archivo.name), content_type=tipo)
+        respuesta['Accept-Ranges'] = 'bytes'
+
+    respuesta['ETag'] = etag
+    respuesta['Last-Modified'] = modificado
+    # El archivo nunca cambia bajo el mismo nombre, pero exige sesión: sólo caché privada
+    respuesta['Cache-Control'] = 'private, max-age=86400'
+    respuesta['Content-Disposition'] = content_disposition_header(
+        request.GET.get('descargar') == '1', adjunto.nombre_visible,
+    )
+    return respuesta
+
+# --- TAREAS EN SEGUNDO PLANO ---
+# Las operaciones largas se encolan y responden de inmediato (ver causas/tareas.py);
+# el comando 'procesar_tareas' las ejecuta y la página consulta su avance:
+#   POST tareas/                 -> encola (tipo + parámetros), 202 con la URL de estado
+#   GET  tareas/<id>/            -> estado, progreso y resultado
+#   GET  tareas/<id>/archivo/    -> descarga el archivo que dejó la tarea, si lo hay
+
+def _tarea_visible(request, pk):
+    tarea = get_object_or_404(Tarea, pk=pk)
+    if tarea.usuario_id != request.user.pk and not request.user.is_staff:
+        raise Http404("La tarea no existe.")
+    return tarea
+
+
+@login_required
+@require_POST
+def crear_tarea(request):
+    tipo = request.POST.get('tipo', '')
+    if tipo not in tareas.TIPOS:
+        return JsonResponse({'error': f"Tipo de tarea desconocido: '{tipo}'."}, status=400)
+    if tareas.TIPOS[tipo][1] and not request.user.is_staff:
+        return JsonResponse({'error': "Esta tarea está reservada al personal."}, status=403)
+
+    parametros = {}
+    if tipo == 'exportar_causas':
+        parametros['filtros'] = {clave: request.POST[clave] for clave in ('estado', 'cartera_id', 'etapa_id')
+                                 if request.POST.get(clave)}
+    elif tipo == 'importar_cartera':
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            return JsonResponse({'error': "Hay que adjuntar el 'archivo' a importar."}, status=400)
+        # El trabajador puede estar en otro proceso: el archivo se deja en disco
+        directorio = os.path.join(settings.MEDIA_ROOT, 'importaciones')
+        os.makedirs(directorio, exist_ok=True)
+        descriptor, ruta = tempfile.mkstemp(suffix=os.path.splitext(archivo.name)[1].lower(), dir=directorio)
+        with os.fdopen(descriptor, 'wb') as destino:
+            for bloque in archivo.chunks():
+                destino.write(bloque)
+        parametros.update(ruta=ruta, cartera=request.POST.get('cartera') or None)
+    elif tipo == 'extraer_texto_adjuntos':
+        parametros['reintentar'] = request.POST.get('reintentar') == '1'
+
+    tarea = tareas.encolar(tipo, usuario=request.user, **parametros)
+    respuesta = JsonResponse({**tareas.estado_tarea(tarea), 'url': reverse('estado_tarea', args=[tarea.pk])},
+                             status=202)
+    respuesta['Location'] = reverse('estado_tarea', args=[tarea.pk])
+    return respuesta
+
+
+@login_required
+def estado_tarea(request, pk):
+    tarea = _tarea_visible(request, pk)
+    datos = tareas.estado_tarea(tarea)
+    if tarea.estado == Tarea.Estado.LISTA and (tarea.resultado or {}).get('archivo'):
+        datos['descarga'] = reverse('descargar_tarea', args=[tarea.pk])
+    respuesta = JsonResponse(datos)
+    respuesta['Cache-Control'] = 'no-store'
+    return respuesta
+
+
+@login_required
+def descargar_tarea(request, pk):
+    tarea = _tarea_visible(request, pk)
+    nombre = (tarea.resultado or {}).get('archivo') if tarea.estado == Tarea.Estado.LISTA else None
+    if not nombre:
+        raise Http404("La tarea no dejó ningún archivo.")
+    ruta = os.path.join(tareas.directorio_tarea(tarea), os.path.basename(nombre))
+    try:
+        return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=nombre)
+    except FileNotFoundError:
+        raise Http404("El archivo ya no está disponible.")
+
+# --- MÉTRICAS ---
+
+def metricas_prometheus(request):
+    """
+    Histogramas por vista de MetricasMiddleware, en el formato de texto de
+    Prometheus (ver causas/metricas.py). Sólo para el personal o con el token
+    de CAUSAS_METRICAS_TOKEN.
+    """
+    autorizado = request.user.is_authenticated and request.user.is_staff
+    token = getattr(settings, 'CAUSAS_METRICAS_TOKEN', '')
+    if not autorizado and token:
+        autorizado = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not autorizado:
+        return HttpResponse("Sólo para el personal.", status=403, content_type='text/plain; charset=utf-8')
+    return HttpResponse(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Pestañas de detalle_causa que se guardan en caché por revisión de la causa
+FRAGMENTOS_DETALLE = ['resumen', 'detalles', 'historial', 'antecedentes']
+
+
+# Consultas de detalle_causa; también las revisa 'verificar_planes'
+
+def consulta_detalle_causa():
+    # Las relaciones uno-a-uno vienen en el mismo JOIN; las colecciones sólo se
+    # cargan si alguna pestaña no está en caché (ver _fragmentos_detalle).
+    return Causa.objects.select_related(
+        'deudor', 'abogado_encargado', 'ultima_etapa', 'antecedentesleasing', 'antecedentescbr',
+    )
+
+
+def precargar_pestanas(causa):
+    """Carga lo que muestran las pestañas: un número fijo de consultas, sin importar el largo del historial."""
+    prefetch_related_objects(
+        [causa],
+        Prefetch('etapas', queryset=EtapaCausa.objects.select_related('etapa__tipo_etapa').prefetch_related(
+            Prefetch('archivos', queryset=ArchivoAdjunto.objects.order_by('id'))
+        )),
+        Prefetch('comentarios', queryset=Comentario.objects.select_related('autor')),
+    )
+
+
+def _fragmentos_detalle(causa):
+    """
+    Devuelve el HTML de cada pestaña de la causa. Cada fragmento se guarda en
+    caché bajo la revisión actual de la causa y la versión del catálogo de
+    etapas (el historial muestra sus nombres), así que mientras no cambien se
+    sirve sin consultar su historial ni renderizar la plantilla.
+    """
+    cantidad, catalogo = version_catalogo()
+    version = f'{causa.revision}:{cantidad}:{catalogo.timestamp() if catalogo else 0}'
+    claves = {nombre: f'causas:detalle:{causa.pk}:{version}:{nombre}' for nombre in FRAGMENTOS_DETALLE}
+    en_cache = cache.get_many(claves.values())
+    faltantes = [nombre for nombre, clave in claves.items() if clave not in en_cache]
+
+    if faltantes:
+        precargar_pestanas(causa)
+        nuevos = {
+            claves[nombre]: render_to_string(f'causas/fragmentos/{nombre}.html', {'causa': causa})
+            for nombre in faltantes
+        }
+        cache.set_many(nuevos, timeout=getattr(settings, 'CAUSAS_CACHE_FRAGMENTOS_SEGUNDOS', 86400))
+        en_cache.update(nuevos)
+
+    return {nombre: mark_safe(en_cache[clave]) for nombre, clave in claves.items()}
+
+CAMBIOS_POR_PAGINA = 50
+
+
+def _mostrar_cambios(cambios):
+    """
+    Agrega a cada cambio 'anterior' y 'nuevo' legibles: el nombre del objeto en las
+    claves foráneas (una consulta por modelo) y la etiqueta en los campos con opciones.
+    """
+    campos = {campo.name: campo for campo in Causa._meta.concrete_fields}
+    ids_por_campo = {}
+    for cambio in cambios:
+        campo = campos.get(cambio.campo)
+        if campo is not None and campo.is_relation:
+            ids_por_campo.setdefault(campo.name, set()).update(
+                int(valor) for valor in (cambio.valor_anterior, cambio.valor_nuevo) if valor)
+    objetos = {
+        nombre: campos[nombre].related_model._default_manager.in_bulk(ids)
+        for nombre, ids in ids_por_campo.items()
+    }
+    for cambio in cambios:
+        campo = campos.get(cambio.campo)
+        cambio.etiqueta = campo.verbose_name if campo is not None else cambio.campo
+        opciones = dict(campo.flatchoices) if campo is not None and campo.choices else {}
+        for origen, destino in (('valor_anterior', 'anterior'), ('valor_nuevo', 'nuevo')):
+            valor = getattr(cambio, origen)
+            if valor and cambio.campo in objetos:
+                valor = objetos[cambio.campo].get(int(valor), valor)
+            setattr(cambio, destino, opciones.get(valor, valor))
+
+
+@login_required
+def cambios_causa(request, pk):
+    """Línea de tiempo de los cambios de una causa, sobre el índice (causa, -fecha)."""
+    causa = get_object_or_404(Causa.objects.only('id', 'rol'), pk=pk)
+    # Lo que aún esté en la cola de auditoría también debe aparecer
+    auditoria.vaciar()
+    pagina = Paginator(
+        CambioCausa.objects.filter(causa=causa).select_related('usuario').order_by('-fecha', '-id'),
+        CAMBIOS_POR_PAGINA,
+    ).get_page(request.GET.get('pagina'))
+    _mostrar_cambios(pagina.object_list)
+    return render(request, 'causas/cambios_causa.html', {'causa': causa, 'pagina': pagina})
+
 
 @login_required
 def detalle_causa(request, pk):
-    causa_especifica = get_object_or_404(Causa, pk=pk)
+    causa_especifica = get_object_or_404(consulta_detalle_causa(), pk=pk)
+    # La página lleva el token CSRF y el usuario en los formularios: la versión
+    # depende también de ellos, no sólo de la causa
+    validadores = _validadores_causa(
+        causa_especifica, (request.user.pk, request.META.get('CSRF_COOKIE', '')),
+    )
+    if no_modificada := _no_modificada(request, *validadores):
+        return no_modificada
     
     # Identificamos el formulario que se está enviando
     if request.method == 'POST':
@@ -115,17 +908,22 @@ def detalle_causa(request, pk):
 
     contexto = {
         'causa': causa_especifica,
+        'fragmentos': _fragmentos_detalle(causa_especifica),
         'comment_form': comment_form,
         'etapa_form': etapa_form,
         'attachment_form': attachment_form,
     }
-    return render(request, 'causas/detalle_causa.html', contexto)
+    respuesta = render(request, 'causas/detalle_causa.html', contexto)
+    if request.method == 'POST':
+        # Un formulario con errores no es la versión de la causa que identifican los validadores
+        return respuesta
+    return _con_validadores(respuesta, *validadores)
 
 
 class CausaCreateView(CreateView):
     permission_required = 'causas.add_causa'
     model = Causa
-    fields = ['rol', 'operacion', 'estado_causa', 'total_costas', 
+    fields = ['rol', 'operacion', 'estado_causa',
               'arbitro', 'abogado_encargado', 'fecha_asignacion', 'deudor', 'tribunal', 'cartera']
     template_name = 'causas/causa_form.html'
     success_url = reverse_lazy('lista_causas')
@@ -156,7 +954,7 @@ class CausaCreateView(CreateView):
 
 class CausaUpdateView(UpdateView):
     model = Causa
-    fields = ['rol', 'operacion', 'estado_causa', 'total_costas', 
+    fields = ['rol', 'operacion', 'estado_causa',
               'arbitro', 'abogado_encargado', 'fecha_asignacion', 'deudor', 'tribunal', 'cartera']
     template_name = 'causas/causa_form.html'
 
@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,11 +47,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para medir la petición completa (ver causas/metricas.py)
+    'causas.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'causas.middleware.AuditoriaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -56,7 +63,8 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # El backend de Django, midiendo el tiempo de render para MetricasMiddleware
+        'BACKEND': 'causas.metricas.PlantillasMedidas',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -75,13 +83,100 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# El perfil se elige con la variable de entorno CAUSAS_BASE_DATOS:
+#   'sqlite' (por defecto) -> un archivo SQLite en modo WAL, para un servidor con pocos trabajadores
+#   'postgresql'           -> PostgreSQL con pool de conexiones (requiere 'psycopg[pool]')
+# 'python manage.py medir_concurrencia' compara los perfiles con muchos escritores en paralelo.
+PERFIL_BASE_DATOS = os.environ.get('CAUSAS_BASE_DATOS', 'sqlite')
+
+if PERFIL_BASE_DATOS == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('CAUSAS_SQLITE_ARCHIVO', BASE_DIR / 'db.sqlite3'),
+            # Conexiones persistentes: no abrir el archivo ni repetir los PRAGMA en cada petición
+            'CONN_MAX_AGE': int(os.environ.get('CAUSAS_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Segundos que una escritura espera a que se libere el bloqueo antes
+                # de fallar con "database is locked" (el busy timeout de SQLite)
+                'timeout': int(os.environ.get('CAUSAS_SQLITE_ESPERA', 20)),
+                # La transacción toma el bloqueo de escritura al empezar, así que espera
+                # con el timeout en vez de fallar al pasar de lectura a escritura
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    # WAL: los lectores no bloquean al que escribe ni al revés
+                    'PRAGMA journal_mode=WAL;'
+                    # Con WAL, NORMAL no corrompe la base si el proceso se cae y
+                    # se ahorra un fsync por commit
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
+    }
+elif PERFIL_BASE_DATOS == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('CAUSAS_PG_NOMBRE', 'sistema_legal'),
+            'USER': os.environ.get('CAUSAS_PG_USUARIO', 'sistema_legal'),
+            'PASSWORD': os.environ.get('CAUSAS_PG_CLAVE', ''),
+            'HOST': os.environ.get('CAUSAS_PG_SERVIDOR', 'localhost'),
+            'PORT': os.environ.get('CAUSAS_PG_PUERTO', '5432'),
+            # Las conexiones las reutiliza el pool; con pool, CONN_MAX_AGE debe ser 0
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('CAUSAS_PG_POOL_MINIMO', 2)),
+                    'max_size': int(os.environ.get('CAUSAS_PG_POOL_MAXIMO', 10)),
+                    # Segundos que una petición espera una conexión libre del pool
+                    'timeout': 10,
+                },
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(
+        f"CAUSAS_BASE_DATOS='{PERFIL_BASE_DATOS}' no es válido: use 'sqlite' o 'postgresql'."
+    )
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# La usamos para la foto de indicadores del dashboard (causas/kpis.py) y para
+# las pestañas de detalle_causa, guardadas por revisión de la causa.
+# Va en archivos para que la compartan todos los procesos del servidor: con una
+# caché en memoria, borrar los indicadores en un proceso no los borra en los demás.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CAUSAS_CACHE_DIRECTORIO',
+                                   os.path.join(tempfile.gettempdir(), 'sistema-legal-cache')),
     }
 }
 
+# Tiempo máximo que se usa la foto de indicadores del dashboard. Las señales de
+# Causa la borran con cada cambio; esto acota lo que dura si algún cambio no pasa
+# por ellas (un update() masivo, o un proceso que no comparte la caché).
+CAUSAS_CACHE_KPIS_SEGUNDOS = 5 * 60
+
+# Tiempo que se guarda cada pestaña de detalle_causa. Las revisiones viejas
+# dejan de usarse solas, así que esto sólo limita cuánto ocupan en la caché.
+CAUSAS_CACHE_FRAGMENTOS_SEGUNDOS = 60 * 60 * 24
+
+# Tiempo que se guarda el análisis de duración de etapas de cada cartera
+# (causas/analitica.py). Se recalcula al vencer, no con cada cambio.
+CAUSAS_CACHE_ANALITICA_SEGUNDOS = 15 * 60
+
+# --- AUDITORÍA DE CAUSAS ---
+# Los cambios se escriben en lotes (causas/auditoria.py): cuando se juntan
+# CAUSAS_AUDITORIA_LOTE registros o el más antiguo espera más de estos segundos.
+# Un proceso que muere sin cerrarse pierde lo encolado; con lote 1 no hay cola.
+CAUSAS_AUDITORIA_LOTE = 100
+CAUSAS_AUDITORIA_ESPERA_MAXIMA = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -139,3 +234,36 @@ LOGOUT_REDIRECT_URL = 'login'
 
 # Le dice a Django CUÁL es la página de login.
 LOGIN_URL = '/cuentas/login/'
+
+# --- EXTRACCIÓN DE TEXTO DE ADJUNTOS ---
+# Al subir un PDF o DOCX se extrae su texto en un pool de procesos (causas/extraccion.py).
+CAUSAS_EXTRAER_EN_SEGUNDO_PLANO = True
+CAUSAS_PROCESOS_EXTRACCION = 2
+
+# --- SUBIDAS POR PARTES ---
+# Tamaño máximo de cada parte de una subida reanudable (causas/subidas.py).
+CAUSAS_TAMANO_MAXIMO_PARTE = 16 * 1024 * 1024
+
+# --- DESCARGA DE ADJUNTOS ---
+# En producción, el envío de los archivos se puede traspasar al servidor web:
+#   None                -> Django envía el archivo (con soporte de rangos)
+#   'x-sendfile'        -> Apache con mod_xsendfile o Lighttpd
+#   'x-accel-redirect'  -> Nginx, con una 'location internal' en CAUSAS_X_ACCEL_PREFIJO
+#                          que apunte a MEDIA_ROOT
+CAUSAS_DESCARGAS_SERVIDOR = None
+CAUSAS_X_ACCEL_PREFIJO = '/protegido/'
+
+# --- TAREAS EN SEGUNDO PLANO ---
+# Las ejecuta 'python manage.py procesar_tareas' (causas/tareas.py). Una tarea que
+# falla se reintenta tras CAUSAS_TAREAS_ESPERA_REINTENTO segundos (el doble en cada
+# intento); una en curso sin latido por más de estos segundos vuelve a la cola.
+CAUSAS_TAREAS_ESPERA_REINTENTO = 30
+CAUSAS_TAREAS_SIN_LATIDO_SEGUNDOS = 300
+
+# --- MÉTRICAS DE RENDIMIENTO ---
+# MetricasMiddleware informa consultas, tiempo de SQL y de plantillas en la
+# cabecera Server-Timing (se puede apagar) y los acumula por vista para /metrics
+# (formato Prometheus, sólo personal). Un recolector sin sesión se autentica con
+# 'Authorization: Bearer <CAUSAS_METRICAS_TOKEN>'; vacío, sólo entra el personal.
+CAUSAS_SERVER_TIMING = True
+CAUSAS_METRICAS_TOKEN = os.environ.get('CAUSAS_METRICAS_TOKEN', '')
@@ -2,7 +2,7 @@
 
 from django.contrib import admin
 from django.urls import path, include
-from causas.views import dashboard_view
+from causas.views import dashboard_view, metricas_prometheus
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -11,6 +11,8 @@ urlpatterns = [
     path('cuentas/', include('django.contrib.auth.urls')),
     path('causas/', include('causas.urls')),
     path('', dashboard_view, name='dashboard'),
+    # Métricas de rendimiento por vista para Prometheus (sólo personal)
+    path('metrics', metricas_prometheus, name='metricas'),
 ]
 
 if settings.DEBUG: